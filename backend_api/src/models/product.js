@@ -7,6 +7,14 @@ const productSchema = new mongoose.Schema({
     trim: true,
   },
   p_images: { type: [String], default: [] },
+  p_image_derivatives: [
+    {
+      _id: false,
+      thumb: { type: String },
+      medium: { type: String },
+      index: { type: String },
+    },
+  ],
   p_stock_quantity: {
     type: Number,
     required: true,
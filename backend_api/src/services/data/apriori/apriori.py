@@ -1,69 +1,206 @@
+from collections import defaultdict
+
+import numpy as np
 import pandas as pd
 from mlxtend.frequent_patterns import apriori, association_rules
 from mlxtend.preprocessing import TransactionEncoder
 from tabulate import tabulate
 
 # Đọc và tiền xử lý dữ liệu
-df = pd.read_csv("../dataset.csv")
-
-# Kiểm tra dữ liệu
-print(f"Số lượng giao dịch: {len(df)}")
+def load_transactions(file_path="../dataset.csv"):
+    df = pd.read_csv(file_path)
 
-# Bỏ cột Transaction ID
-df = df.drop(columns=["Transaction ID"])
+    # Bỏ cột Transaction ID
+    df = df.drop(columns=["Transaction ID"])
 
-# Gộp các sản phẩm theo từng giao dịch thành 1 danh sách
-transactions = df.values.tolist()
-transactions = [[item for item in transaction if pd.notnull(item)] for transaction in transactions]
+    # Gộp các sản phẩm theo từng giao dịch thành 1 danh sách
+    transactions = df.values.tolist()
+    return [[item for item in transaction if pd.notnull(item)] for transaction in transactions]
 
 # Dùng TransactionEncoder để chuyển đổi dữ liệu về dạng one-hot
-te = TransactionEncoder()
-te_ary = te.fit(transactions).transform(transactions)
-df_encoded = pd.DataFrame(te_ary, columns=te.columns_)
-
-# Áp dụng thuật toán Apriori với min_support thấp hơn để tìm thêm luật
-frequent_itemsets = apriori(df_encoded, min_support=0.001, use_colnames=True)  # Giảm min_support
-frequent_itemsets['length'] = frequent_itemsets['itemsets'].apply(lambda x: len(x))
-
-# Lọc các tập hợp có độ dài <= 3
-frequent_itemsets = frequent_itemsets[frequent_itemsets['length'] <= 3]
-
-# Hiển thị thống kê độ dài tập hợp
-print("\nThống kê độ dài:")
-print(frequent_itemsets.groupby('length').size())
-
-# Hiển thị toàn bộ Frequent Itemsets
-print("\nFrequent Itemsets:")
-pd.set_option('display.max_rows', 200)
-pd.set_option('display.max_colwidth', 200)
-print(frequent_itemsets)
-pd.reset_option('display.max_rows')
-pd.reset_option('display.max_colwidth')
-
-# Tạo luật kết hợp với ngưỡng confidence cao hơn
-rules = association_rules(frequent_itemsets, metric="confidence", min_threshold=0.8)
-
-# Lọc các luật có lift > 5.0
-rules = rules[rules['lift'] > 5.0]
-
-# Kiểm tra xem có luật nào được tạo ra không
-if not rules.empty:
-    print("\nAssociation Rules (sắp xếp theo lift):")
-    df_rules = rules.sort_values(by='lift', ascending=False)
-    print(tabulate(df_rules[['antecedents', 'consequents', 'support', 'confidence', 'lift']].values,
-                   headers=df_rules[['antecedents', 'consequents', 'support', 'confidence', 'lift']].columns,
-                   tablefmt='fancy_grid'))
-
-    # Trung bình độ tin cậy
-    avg_confidence = df_rules['confidence'].mean()
-    print(f"Trung bình độ tin cậy (Confidence): {avg_confidence:.2f}")
-
-    # Trung bình lift
-    avg_lift = df_rules['lift'].mean()
-    print(f"Trung bình Lift: {avg_lift:.2f}")
-
-    # Tính số lượng luật có độ tin cậy cao (> 60%)
-    high_conf_rules = df_rules[df_rules['confidence'] > 0.6]
-    print(f"Số luật có độ tin cậy > 60%: {len(high_conf_rules)} / {len(df_rules)}")
-else:
-    print("\nKhông có luật kết hợp nào được tạo ra. Vui lòng giảm ngưỡng min_support hoặc kiểm tra dữ liệu.")
+def encode_transactions(transactions):
+    te = TransactionEncoder()
+    te_ary = te.fit(transactions).transform(transactions)
+    return pd.DataFrame(te_ary, columns=te.columns_)
+
+# Áp dụng thuật toán Apriori (mlxtend) với min_support thấp hơn để tìm thêm luật;
+# max_len được truyền vào thuật toán để không phải sinh rồi mới lọc các tập dài hơn
+def mine_frequent_itemsets(df_encoded, min_support=0.001, max_length=3):
+    frequent_itemsets = apriori(df_encoded, min_support=min_support, use_colnames=True, max_len=max_length)
+    frequent_itemsets['length'] = frequent_itemsets['itemsets'].apply(lambda x: len(x))
+    return frequent_itemsets
+
+# Tạo luật kết hợp với ngưỡng confidence cao hơn, lọc các luật có lift > min_lift
+def mine_rules(frequent_itemsets, min_confidence=0.8, min_lift=5.0):
+    rules = association_rules(frequent_itemsets, metric="confidence", min_threshold=min_confidence)
+    return rules[rules['lift'] > min_lift]
+
+# ---- Apriori gốc trên bitmap ----
+# Mỗi item là một dòng bitmap uint64 (bit t = giao dịch t có item), support = popcount(AND các bitmap).
+# Ứng viên k-itemset được ghép từ các (k-1)-itemset cùng tiền tố, loại ngay nếu có tập con không phổ biến;
+# max_length và min_support được áp dụng trong lúc sinh ứng viên nên không phải đếm các tập bị bỏ đi.
+
+if hasattr(np, 'bitwise_count'):
+    def popcount_rows(bitmaps):
+        return np.bitwise_count(bitmaps).sum(axis=-1, dtype=np.int64)
+else:  # numpy < 2.0
+    _POPCOUNT_TABLE = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+    def popcount_rows(bitmaps):
+        as_bytes = bitmaps.view(np.uint8).reshape(bitmaps.shape[:-1] + (-1,))
+        return _POPCOUNT_TABLE[as_bytes].sum(axis=-1, dtype=np.int64)
+
+def build_bitmaps(transactions):
+    """Trả về (danh sách item đã sắp xếp, mảng bitmap uint64 kích thước n_items x ceil(n_transactions/64))."""
+    items = sorted({item for transaction in transactions for item in transaction})
+    index = {item: i for i, item in enumerate(items)}
+    item_idx, tids = [], []
+    for tid, transaction in enumerate(transactions):
+        for item in set(transaction):
+            item_idx.append(index[item])
+            tids.append(tid)
+    item_idx = np.asarray(item_idx, dtype=np.int64)
+    tids = np.asarray(tids, dtype=np.uint64)
+    bitmaps = np.zeros((len(items), (len(transactions) + 63) // 64), dtype=np.uint64)
+    np.bitwise_or.at(bitmaps, (item_idx, (tids >> np.uint64(6)).astype(np.int64)),
+                     np.left_shift(np.uint64(1), tids & np.uint64(63)))
+    return items, bitmaps
+
+def apriori_bitmap(transactions, min_support=0.001, max_length=3):
+    """Apriori trên bitmap; trả về (items, dict tuple chỉ số item đã sắp xếp -> support)."""
+    items, item_bitmaps = build_bitmaps(transactions)
+    n_transactions = len(transactions)
+    min_count = min_support * n_transactions
+    supports = {}
+    if not n_transactions:
+        return items, supports
+
+    counts = popcount_rows(item_bitmaps)
+    current = {}
+    for i in np.flatnonzero(counts >= min_count):
+        current[(int(i),)] = item_bitmaps[i]
+        supports[(int(i),)] = counts[i] / n_transactions
+
+    k = 2
+    while current and (max_length is None or k <= max_length):
+        # Gom các (k-1)-itemset theo tiền tố k-2 phần tử; đếm cả lớp ứng viên cùng tiền tố một lần
+        classes = defaultdict(list)
+        for itemset in current:
+            classes[itemset[:-1]].append(itemset)
+        next_level = {}
+        for members in classes.values():
+            for i, left in enumerate(members[:-1]):
+                candidates = []
+                for right in members[i + 1:]:
+                    candidate = left + right[-1:]
+                    if all(candidate[:j] + candidate[j + 1:] in current for j in range(k - 2)):
+                        candidates.append(candidate)
+                if not candidates:
+                    continue
+                last_items = np.fromiter((candidate[-1] for candidate in candidates), dtype=np.int64)
+                bitmaps = current[left][None, :] & item_bitmaps[last_items]
+                candidate_counts = popcount_rows(bitmaps)
+                for candidate, bitmap, count in zip(candidates, bitmaps, candidate_counts):
+                    if count >= min_count:
+                        next_level[candidate] = bitmap
+                        supports[candidate] = count / n_transactions
+        current = next_level
+        k += 1
+    return items, supports
+
+def _merge_consequents(consequents):
+    merged = []
+    for i, left in enumerate(consequents):
+        for right in consequents[i + 1:]:
+            if left[:-1] == right[:-1]:
+                merged.append(left + right[-1:])
+    return merged
+
+def iter_rules(items, supports, min_confidence=0.8, min_lift=None):
+    """Sinh luật dần dần theo kiểu ap-genrules: hậu quả được mở rộng chỉ khi luật hiện tại đạt min_confidence;
+    lift được lọc ngay khi sinh luật (luật có lift <= min_lift không được trả về)."""
+    for itemset, support in supports.items():
+        if len(itemset) < 2:
+            continue
+        consequents = [(item,) for item in itemset]
+        while consequents:
+            passed = []
+            for consequent in consequents:
+                antecedent = tuple(item for item in itemset if item not in consequent)
+                confidence = support / supports[antecedent]
+                if confidence < min_confidence:
+                    continue
+                passed.append(consequent)
+                lift = confidence / supports[consequent]
+                if min_lift is None or lift > min_lift:
+                    yield {
+                        'antecedents': frozenset(items[i] for i in antecedent),
+                        'consequents': frozenset(items[i] for i in consequent),
+                        'support': support,
+                        'confidence': confidence,
+                        'lift': lift
+                    }
+            consequents = [c for c in _merge_consequents(passed) if len(c) < len(itemset)]
+
+# Cùng định dạng DataFrame với mlxtend (support, itemsets, length) để dùng chung phần hiển thị
+def mine_frequent_itemsets_native(transactions, min_support=0.001, max_length=3):
+    items, supports = apriori_bitmap(transactions, min_support, max_length)
+    frequent_itemsets = pd.DataFrame({
+        'support': list(supports.values()),
+        'itemsets': [frozenset(items[i] for i in itemset) for itemset in supports]
+    })
+    frequent_itemsets['length'] = frequent_itemsets['itemsets'].apply(len)
+    return frequent_itemsets, items, supports
+
+def mine_rules_native(items, supports, min_confidence=0.8, min_lift=5.0):
+    return pd.DataFrame(list(iter_rules(items, supports, min_confidence, min_lift)),
+                        columns=['antecedents', 'consequents', 'support', 'confidence', 'lift'])
+
+def main(file_path="../dataset.csv", min_support=0.001, min_confidence=0.8, min_lift=5.0, max_length=3):
+    transactions = load_transactions(file_path)
+
+    # Kiểm tra dữ liệu
+    print(f"Số lượng giao dịch: {len(transactions)}")
+
+    frequent_itemsets, items, supports = mine_frequent_itemsets_native(transactions, min_support, max_length)
+
+    # Hiển thị thống kê độ dài tập hợp
+    print("\nThống kê độ dài:")
+    print(frequent_itemsets.groupby('length').size())
+
+    # Hiển thị toàn bộ Frequent Itemsets
+    print("\nFrequent Itemsets:")
+    pd.set_option('display.max_rows', 200)
+    pd.set_option('display.max_colwidth', 200)
+    print(frequent_itemsets)
+    pd.reset_option('display.max_rows')
+    pd.reset_option('display.max_colwidth')
+
+    rules = mine_rules_native(items, supports, min_confidence, min_lift)
+
+    # Kiểm tra xem có luật nào được tạo ra không
+    if not rules.empty:
+        print("\nAssociation Rules (sắp xếp theo lift):")
+        df_rules = rules.sort_values(by='lift', ascending=False)
+        print(tabulate(df_rules[['antecedents', 'consequents', 'support', 'confidence', 'lift']].values,
+                       headers=df_rules[['antecedents', 'consequents', 'support', 'confidence', 'lift']].columns,
+                       tablefmt='fancy_grid'))
+
+        # Trung bình độ tin cậy
+        avg_confidence = df_rules['confidence'].mean()
+        print(f"Trung bình độ tin cậy (Confidence): {avg_confidence:.2f}")
+
+        # Trung bình lift
+        avg_lift = df_rules['lift'].mean()
+        print(f"Trung bình Lift: {avg_lift:.2f}")
+
+        # Tính số lượng luật có độ tin cậy cao (> 60%)
+        high_conf_rules = df_rules[df_rules['confidence'] > 0.6]
+        print(f"Số luật có độ tin cậy > 60%: {len(high_conf_rules)} / {len(df_rules)}")
+    else:
+        print("\nKhông có luật kết hợp nào được tạo ra. Vui lòng giảm ngưỡng min_support hoặc kiểm tra dữ liệu.")
+
+    return frequent_itemsets, rules
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,288 @@
+import argparse
+import json
+import math
+import multiprocessing as mp
+import os
+import platform
+import random
+import sys
+import time
+from datetime import datetime, timezone
+from itertools import accumulate, product
+from queue import Empty
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Benchmark các thuật toán khai thác luật kết hợp (apriori, apriori_native, fp_growth, pairwise, eclat)
+# trên dữ liệu giỏ hàng tổng hợp kiểu IBM Quest.
+#
+# Ví dụ (chạy trong thư mục data/):
+#   python benchmark.py --transactions 1000,10000 --basket-lengths 3,5 \
+#       --min-supports 0.01,0.005 --vocab-sizes 69,500 --output bench.json
+#   python benchmark.py ... --baseline bench_main.json --max-regression 0.25
+
+# Lấy mẫu Poisson (thuật toán Knuth, đủ nhanh với kỳ vọng nhỏ)
+def poisson(rng, mean):
+    limit = math.exp(-mean)
+    k, p = 0, 1.0
+    while True:
+        p *= rng.random()
+        if p <= limit:
+            return k
+        k += 1
+
+# Tập từ vựng: 69 subcategory_keys, mở rộng thêm item_i nếu cần nhiều hơn
+def build_vocabulary(size):
+    from fp_growth import subcategory_keys
+    if size <= len(subcategory_keys):
+        return subcategory_keys[:size]
+    return subcategory_keys + [f"item_{i}" for i in range(size - len(subcategory_keys))]
+
+# Sinh giao dịch tổng hợp theo mô hình IBM Quest (Agrawal & Srikant, 1994):
+# một tập các mẫu "potentially large" có trọng số, mỗi giao dịch được ghép từ các mẫu
+# này (có làm nhiễu) cho tới khi đạt độ dài Poisson(avg_basket_length).
+def generate_quest_transactions(vocabulary, n_transactions, avg_basket_length,
+                                n_patterns=None, avg_pattern_length=3,
+                                correlation=0.5, corruption=0.5, seed=0):
+    rng = random.Random(seed)
+    n_patterns = n_patterns or max(10, len(vocabulary) // 2)
+
+    patterns = []
+    previous = []
+    for _ in range(n_patterns):
+        size = min(max(1, poisson(rng, avg_pattern_length)), len(vocabulary))
+        # Một phần mẫu được lấy lại từ mẫu trước để các mẫu có tương quan
+        reused = min(len(previous), size, int(rng.expovariate(1 / correlation) * size)) if previous else 0
+        items = set(rng.sample(previous, reused)) if reused else set()
+        while len(items) < size:
+            items.add(rng.choice(vocabulary))
+        pattern = sorted(items)
+        patterns.append(pattern)
+        previous = pattern
+
+    cum_weights = list(accumulate(rng.expovariate(1) for _ in patterns))
+    corruption_levels = [min(1.0, max(0.0, rng.gauss(corruption, math.sqrt(0.1)))) for _ in patterns]
+
+    transactions = []
+    for _ in range(n_transactions):
+        target = max(1, poisson(rng, avg_basket_length))
+        basket = set()
+        while len(basket) < target:
+            index = rng.choices(range(n_patterns), cum_weights=cum_weights)[0]
+            pattern = list(patterns[index])
+            while pattern and rng.random() < corruption_levels[index]:
+                pattern.pop(rng.randrange(len(pattern)))
+            basket.update(pattern)
+            if len(basket) >= target or rng.random() < 0.5:
+                break
+        if basket:
+            transactions.append(sorted(basket))
+    return transactions
+
+# Các engine được benchmark; mỗi engine trả về (số frequent itemsets, số luật)
+# với luật có confidence >= min_confidence và lift > 1, itemset tối đa max_len item (None: không giới hạn).
+# Mọi engine dùng cùng max_len để số itemset / luật so được với nhau (mặc định riêng của từng module khác nhau:
+# apriori 3, fp_growth 4, eclat không giới hạn).
+DEFAULT_MAX_LEN = 3
+# Engine chỉ tính được itemset có kích thước cố định: max_len thực tế ghi vào kết quả
+FIXED_MAX_LEN = {'pairwise': 2}
+
+def run_apriori(transactions, min_support, min_confidence, max_len):
+    from apriori.apriori import encode_transactions, mine_frequent_itemsets, mine_rules
+    frequent_itemsets = mine_frequent_itemsets(encode_transactions(transactions), min_support, max_len)
+    if frequent_itemsets.empty:
+        return 0, 0
+    return len(frequent_itemsets), len(mine_rules(frequent_itemsets, min_confidence, min_lift=1.0))
+
+def run_apriori_native(transactions, min_support, min_confidence, max_len):
+    from apriori.apriori import apriori_bitmap, iter_rules
+    items, supports = apriori_bitmap(transactions, min_support, max_len)
+    return len(supports), sum(1 for _ in iter_rules(items, supports, min_confidence, min_lift=1.0))
+
+# Chỉ tính các itemset 1-2 item và luật 1 -> 1, nên số liệu không so trực tiếp được với các engine khác
+def run_pairwise(transactions, min_support, min_confidence, max_len):
+    from pairwise import cooccurrence_counts, pairwise_rules
+    counts, total, vocabulary = cooccurrence_counts([transactions], vocabulary=[])
+    min_count = min_support * total
+    n_items = int((counts.diagonal() >= min_count).sum())
+    n_pairs = int((counts.data >= min_count).sum() - n_items) // 2
+    rules = pairwise_rules(counts, total, vocabulary, min_support, min_confidence, min_lift=1.0)
+    return n_items + n_pairs, len(rules)
+
+def run_fp_growth(transactions, min_support, min_confidence, max_len):
+    from fp_growth import encode_transactions, mine_fp_growth
+    frequent_itemsets, rules = mine_fp_growth(encode_transactions(transactions), min_support, min_confidence, max_len)
+    return len(frequent_itemsets), 0 if rules is None else len(rules)
+
+def run_eclat(transactions, min_support, min_confidence, max_len):
+    from eclat.eclat import to_vertical_format, eclat, generate_association_rules
+    frequent_itemsets = eclat(to_vertical_format(transactions), min_support, len(transactions), max_length=max_len)
+    rules = generate_association_rules(frequent_itemsets, min_confidence)
+    return len(frequent_itemsets), sum(1 for rule in rules if rule['lift'] > 1.0)
+
+ENGINES = {
+    'apriori': run_apriori,
+    'apriori_native': run_apriori_native,
+    'fp_growth': run_fp_growth,
+    'pairwise': run_pairwise,
+    'eclat': run_eclat,
+}
+
+# Peak RSS của tiến trình hiện tại (MB), None nếu không đo được
+def peak_rss_mb():
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+    try:
+        import psutil
+        info = psutil.Process().memory_info()
+        return getattr(info, 'peak_wset', info.rss) / (1024 * 1024)
+    except ImportError:
+        return None
+
+def case_key(case):
+    return (case['engine'], case['vocab_size'], case['n_transactions'],
+            case['avg_basket_length'], case['min_support'], case.get('max_len'))
+
+# Chạy một case trong tiến trình con để peak RSS không bị lẫn giữa các case
+def run_case(case, min_confidence, seed, queue):
+    result = dict(case)
+    try:
+        vocabulary = build_vocabulary(case['vocab_size'])
+        transactions = generate_quest_transactions(
+            vocabulary, case['n_transactions'], case['avg_basket_length'], seed=seed
+        )
+        result['rss_before_mb'] = peak_rss_mb()
+        start_time = time.perf_counter()
+        n_itemsets, n_rules = ENGINES[case['engine']](transactions, case['min_support'], min_confidence,
+                                                      case['max_len'])
+        result['wall_time_s'] = time.perf_counter() - start_time
+        result['peak_rss_mb'] = peak_rss_mb()
+        result['n_itemsets'] = n_itemsets
+        result['n_rules'] = n_rules
+        result['status'] = 'ok'
+    except Exception as e:
+        result['status'] = 'error'
+        result['error'] = str(e)
+    queue.put(result)
+
+def run_benchmark(cases, min_confidence=0.5, seed=0, timeout=600):
+    ctx = mp.get_context('spawn')
+    results = []
+    for case in cases:
+        queue = ctx.Queue()
+        process = ctx.Process(target=run_case, args=(case, min_confidence, seed, queue))
+        process.start()
+        process.join(timeout)
+        if process.is_alive():
+            process.terminate()
+            process.join()
+            result = dict(case, status='timeout', wall_time_s=None)
+        else:
+            try:
+                result = queue.get(timeout=5)
+            except Empty:
+                result = dict(case, status='error', error=f"exit code {process.exitcode}")
+        print(format_result(result))
+        results.append(result)
+    return results
+
+def format_max_len(max_len):
+    return '-' if max_len is None else str(max_len)
+
+def format_result(result):
+    if result['status'] != 'ok':
+        return (f"{result['engine']:<14} vocab={result['vocab_size']:<6} n={result['n_transactions']:<8} "
+                f"len={result['avg_basket_length']:<4} sup={result['min_support']:<8} "
+                f"max_len={format_max_len(result.get('max_len')):<4} {result['status'].upper()} "
+                f"{result.get('error', '')}")
+    rss = result['peak_rss_mb']
+    return (f"{result['engine']:<14} vocab={result['vocab_size']:<6} n={result['n_transactions']:<8} "
+            f"len={result['avg_basket_length']:<4} sup={result['min_support']:<8} "
+            f"max_len={format_max_len(result.get('max_len')):<4} time={result['wall_time_s']:.3f}s rss={'n/a' if rss is None else f'{rss:.1f}MB'} "
+            f"itemsets={result['n_itemsets']} rules={result['n_rules']}")
+
+# So sánh với kết quả lần chạy trước, trả về danh sách case bị chậm hơn ngưỡng cho phép
+def find_regressions(results, baseline_results, max_regression):
+    baseline = {case_key(r): r for r in baseline_results if r.get('status') == 'ok'}
+    regressions = []
+    for result in results:
+        previous = baseline.get(case_key(result))
+        if previous is None:
+            continue
+        if result['status'] != 'ok':
+            regressions.append((result, previous, None))
+            continue
+        ratio = result['wall_time_s'] / previous['wall_time_s'] if previous['wall_time_s'] else 1.0
+        if ratio > 1 + max_regression:
+            regressions.append((result, previous, ratio))
+    return regressions
+
+def parse_list(value, cast):
+    return [cast(v) for v in value.split(',') if v.strip()]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark apriori / fp_growth / eclat trên dữ liệu tổng hợp")
+    parser.add_argument('--engines', default=','.join(ENGINES))
+    parser.add_argument('--vocab-sizes', default='69')
+    parser.add_argument('--transactions', default='1000,10000')
+    parser.add_argument('--basket-lengths', default='3,5')
+    parser.add_argument('--min-supports', default='0.01,0.005')
+    parser.add_argument('--min-confidence', type=float, default=0.5)
+    parser.add_argument('--max-len', type=int, default=DEFAULT_MAX_LEN,
+                        help="Số item tối đa của itemset, dùng chung cho mọi engine (0: không giới hạn)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--timeout', type=float, default=600, help="Giới hạn thời gian mỗi case (giây)")
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--baseline', help="File kết quả trước đó để phát hiện regression")
+    parser.add_argument('--max-regression', type=float, default=0.25,
+                        help="Tỷ lệ chậm hơn tối đa so với baseline (0.25 = 25%%)")
+    args = parser.parse_args(argv)
+
+    engines = parse_list(args.engines, str)
+    unknown = [engine for engine in engines if engine not in ENGINES]
+    if unknown:
+        parser.error(f"Engine không hợp lệ: {', '.join(unknown)}")
+
+    max_len = args.max_len if args.max_len > 0 else None
+    cases = [
+        {'engine': engine, 'vocab_size': vocab_size, 'n_transactions': n_transactions,
+         'avg_basket_length': basket_length, 'min_support': min_support,
+         'max_len': FIXED_MAX_LEN.get(engine, max_len)}
+        for vocab_size, n_transactions, basket_length, min_support, engine in product(
+            parse_list(args.vocab_sizes, int), parse_list(args.transactions, int),
+            parse_list(args.basket_lengths, float), parse_list(args.min_supports, float), engines)
+    ]
+    print(f"Chạy {len(cases)} case benchmark (max_len={format_max_len(max_len)}, pairwise luôn là 2)...")
+    results = run_benchmark(cases, args.min_confidence, args.seed, args.timeout)
+
+    report = {
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'min_confidence': args.min_confidence,
+        'max_len': max_len,
+        'seed': args.seed,
+        'results': results,
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"Đã lưu kết quả benchmark vào {args.output}")
+
+    failed = [r for r in results if r['status'] != 'ok']
+    if args.baseline and os.path.exists(args.baseline):
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline_results = json.load(f).get('results', [])
+        regressions = find_regressions(results, baseline_results, args.max_regression)
+        for result, previous, ratio in regressions:
+            detail = result['status'] if ratio is None else f"chậm hơn {ratio:.2f}x ({previous['wall_time_s']:.3f}s → {result['wall_time_s']:.3f}s)"
+            print(f"REGRESSION {case_key(result)}: {detail}")
+        if regressions:
+            return 1
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,229 @@
+import json
+import os
+from collections import defaultdict
+from datetime import datetime, timezone
+
+try:
+    import ijson
+except ImportError:  # không có ijson thì dùng bộ đọc tăng dần bằng json.JSONDecoder.raw_decode
+    ijson = None
+
+# Đọc các file dump ecommerce.*.json (mongoexport --jsonArray, extended JSON với $oid/$date)
+# theo kiểu streaming để các công cụ offline (miner, image indexer, test) không cần MongoDB.
+#
+#   from catalog import Catalog, iter_products
+#   catalog = Catalog.load()
+#   catalog.products_by_subcategory[subcategory_id]   # -> list product_id
+#   for product in iter_products(): ...               # không giữ toàn bộ catalog trong bộ nhớ
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..', '..'))
+PRODUCTS_FILE = os.path.join(PROJECT_ROOT, 'ecommerce.products.json')
+CATEGORIES_FILE = os.path.join(PROJECT_ROOT, 'ecommerce.categories.json')
+BRANDS_FILE = os.path.join(PROJECT_ROOT, 'ecommerce.brands.json')
+
+READ_CHUNK_SIZE = 1 << 16
+
+def iter_json_array(file_path, chunk_size=READ_CHUNK_SIZE):
+    """Duyệt lần lượt từng phần tử của mảng JSON ở mức ngoài cùng mà không nạp cả file."""
+    if ijson is not None:
+        with open(file_path, 'rb') as f:
+            yield from ijson.items(f, 'item', use_float=True)
+        return
+
+    with open(file_path, 'r', encoding='utf-8') as f:
+        decoder = json.JSONDecoder()
+        buffer = ''
+        pos = 0
+        eof = False
+        started = False
+        while True:
+            # Bỏ khoảng trắng và các ký tự phân cách của mảng ngoài cùng
+            while pos < len(buffer) and (buffer[pos].isspace() or buffer[pos] in ',]' or (buffer[pos] == '[' and not started)):
+                started = started or buffer[pos] == '['
+                pos += 1
+            if pos < len(buffer):
+                try:
+                    value, end = decoder.raw_decode(buffer, pos)
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                    end = None
+                # Giá trị chạm cuối buffer có thể chưa đầy đủ (ví dụ số bị cắt), đọc thêm rồi thử lại
+                if end is not None and (end < len(buffer) or eof):
+                    yield value
+                    pos = end
+                    continue
+            if eof:
+                return
+            chunk = f.read(chunk_size)
+            eof = not chunk
+            buffer = buffer[pos:] + chunk
+            pos = 0
+
+def parse_oid(value):
+    """{"$oid": "..."} hoặc chuỗi -> chuỗi ObjectId hex; None nếu không có."""
+    if isinstance(value, dict):
+        value = value.get('$oid')
+    return str(value) if value is not None else None
+
+def parse_date(value):
+    """{"$date": "2025-06-11T14:09:51.458Z"} hoặc {"$date": {"$numberLong": ms}} -> datetime UTC."""
+    if isinstance(value, dict):
+        value = value.get('$date')
+    if isinstance(value, dict):
+        value = int(value.get('$numberLong'))
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return datetime.fromtimestamp(value / 1000, tz=timezone.utc)
+    return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+def parse_number(value):
+    """Giải mã $numberInt/$numberLong/$numberDouble/$numberDecimal, giữ nguyên số thường."""
+    if isinstance(value, dict):
+        for key, cast in (('$numberInt', int), ('$numberLong', int), ('$numberDouble', float), ('$numberDecimal', float)):
+            if key in value:
+                return cast(value[key])
+        return None
+    return value
+
+def parse_specifications(specs):
+    """Thông số kỹ thuật -> tuple (key, value), bỏ _id của từng dòng.
+
+    Một số sản phẩm trong dump có p_specifications là ['[', ']'] (chuỗi lỗi từ lần import cũ), bỏ qua.
+    """
+    return tuple((spec.get('key'), spec.get('value')) for spec in specs or () if isinstance(spec, dict))
+
+class Product:
+    __slots__ = ('id', 'name', 'images', 'stock_quantity', 'price', 'description',
+                 'category_id', 'subcategory_id', 'brand_id', 'specifications', 'created_at')
+
+    def __init__(self, id, name, images=(), stock_quantity=0, price=0, description='',
+                 category_id=None, subcategory_id=None, brand_id=None, specifications=(), created_at=None):
+        self.id = id
+        self.name = name
+        self.images = images
+        self.stock_quantity = stock_quantity
+        self.price = price
+        self.description = description
+        self.category_id = category_id
+        self.subcategory_id = subcategory_id
+        self.brand_id = brand_id
+        self.specifications = specifications
+        self.created_at = created_at
+
+    @classmethod
+    def from_document(cls, doc):
+        return cls(
+            id=parse_oid(doc['_id']),
+            name=doc.get('p_name', ''),
+            images=tuple(doc.get('p_images') or ()),
+            stock_quantity=parse_number(doc.get('p_stock_quantity', 0)),
+            price=parse_number(doc.get('p_price', 0)),
+            description=doc.get('p_description', ''),
+            category_id=parse_oid(doc.get('p_category')),
+            subcategory_id=parse_oid(doc.get('p_subcategory')),
+            brand_id=parse_oid(doc.get('p_brand')),
+            specifications=parse_specifications(doc.get('p_specifications')),
+            created_at=parse_date(doc.get('p_created_at'))
+        )
+
+    def __repr__(self):
+        return f"Product({self.id!r}, {self.name!r})"
+
+class Category:
+    __slots__ = ('id', 'name', 'parent_id', 'description', 'created_at')
+
+    def __init__(self, id, name, parent_id=None, description='', created_at=None):
+        self.id = id
+        self.name = name
+        self.parent_id = parent_id
+        self.description = description
+        self.created_at = created_at
+
+    @classmethod
+    def from_document(cls, doc):
+        return cls(
+            id=parse_oid(doc['_id']),
+            name=doc.get('cate_name', ''),
+            parent_id=parse_oid(doc.get('parent_category_id')),
+            description=doc.get('cate_description', ''),
+            created_at=parse_date(doc.get('cate_created_at'))
+        )
+
+    def __repr__(self):
+        return f"Category({self.id!r}, {self.name!r})"
+
+class Brand:
+    __slots__ = ('id', 'name', 'image', 'created_at')
+
+    def __init__(self, id, name, image='', created_at=None):
+        self.id = id
+        self.name = name
+        self.image = image
+        self.created_at = created_at
+
+    @classmethod
+    def from_document(cls, doc):
+        return cls(
+            id=parse_oid(doc['_id']),
+            name=doc.get('br_name', ''),
+            image=doc.get('br_image', ''),
+            created_at=parse_date(doc.get('created_at'))
+        )
+
+    def __repr__(self):
+        return f"Brand({self.id!r}, {self.name!r})"
+
+def iter_products(file_path=PRODUCTS_FILE):
+    return (Product.from_document(doc) for doc in iter_json_array(file_path))
+
+def iter_categories(file_path=CATEGORIES_FILE):
+    return (Category.from_document(doc) for doc in iter_json_array(file_path))
+
+def iter_brands(file_path=BRANDS_FILE):
+    return (Brand.from_document(doc) for doc in iter_json_array(file_path))
+
+class Catalog:
+    """Catalog offline dựng từ các file dump: index id -> record và danh mục/thương hiệu -> danh sách product_id."""
+
+    def __init__(self, products=(), categories=(), brands=()):
+        self.categories = {category.id: category for category in categories}
+        self.brands = {brand.id: brand for brand in brands}
+        self.products = {}
+        self.products_by_category = defaultdict(list)
+        self.products_by_subcategory = defaultdict(list)
+        self.products_by_brand = defaultdict(list)
+        for product in products:
+            self.add_product(product)
+
+    @classmethod
+    def load(cls, products_file=PRODUCTS_FILE, categories_file=CATEGORIES_FILE, brands_file=BRANDS_FILE):
+        """Đọc streaming cả ba file dump; bỏ qua file nào được truyền None."""
+        return cls(
+            iter_products(products_file) if products_file else (),
+            iter_categories(categories_file) if categories_file else (),
+            iter_brands(brands_file) if brands_file else ()
+        )
+
+    def add_product(self, product):
+        self.products[product.id] = product
+        category_id = product.category_id or self.parent_of(product.subcategory_id)
+        if category_id:
+            self.products_by_category[category_id].append(product.id)
+        if product.subcategory_id:
+            self.products_by_subcategory[product.subcategory_id].append(product.id)
+        if product.brand_id:
+            self.products_by_brand[product.brand_id].append(product.id)
+
+    def parent_of(self, category_id):
+        category = self.categories.get(category_id)
+        return category.parent_id if category else None
+
+    def category_path(self, product_id):
+        """(category_id, subcategory_id) của sản phẩm, category suy ra từ subcategory nếu thiếu."""
+        product = self.products[product_id]
+        return product.category_id or self.parent_of(product.subcategory_id), product.subcategory_id
+
+    def __len__(self):
+        return len(self.products)
@@ -1,5 +1,4 @@
 import pandas as pd
-from itertools import combinations
 from collections import defaultdict
 import statistics
 
@@ -16,99 +15,148 @@ def load_data(file_path):
         print(f"Lỗi khi đọc file: {e}")
         return []
 
+# Đếm số bit 1 của bitmap (int.bit_count có từ Python 3.10)
+def popcount(bitmap):
+    return bitmap.bit_count() if hasattr(bitmap, 'bit_count') else bin(bitmap).count('1')
+
 # Chuyển dữ liệu sang định dạng dọc
+# Mỗi item ánh xạ tới một bitmap (int), bit thứ tid bật nếu giao dịch tid chứa item
+# Gom tid của từng item trước rồi dựng bitmap một lần qua bytearray: OR lặp lại vào int lớn
+# sẽ cấp phát lại cả số nguyên mỗi lần (O(T²/64) cho T giao dịch).
 def to_vertical_format(transactions):
-    vertical = defaultdict(set)
-    for tid, transaction in enumerate(transactions, 1):
+    item_tids = defaultdict(list)
+    for tid, transaction in enumerate(transactions):
         for item in transaction:
-            vertical[item].add(tid)
+            item_tids[item].append(tid)
+    vertical = defaultdict(int)
+    for item, tids in item_tids.items():
+        buffer = bytearray(tids[-1] // 8 + 1)
+        for tid in tids:
+            buffer[tid >> 3] |= 1 << (tid & 7)
+        vertical[item] = int.from_bytes(buffer, 'little')
     return vertical
 
 # Tính support của một tập hợp mục
 def calculate_support(itemset, vertical, total_transactions):
     if not itemset:
         return 1.0
-    tids = vertical[itemset[0]].copy()
+    tids = vertical[itemset[0]]
     for item in itemset[1:]:
         tids &= vertical[item]
-    return len(tids) / total_transactions
+    return popcount(tids) / total_transactions
 
-# Thuật toán ECLAT
-def eclat(vertical, min_support, total_transactions):
-    frequent_itemsets = []
-    single_items = {frozenset([item]): vertical[item] for item in vertical}
-    frequent_singles = {
-        itemset: tids for itemset, tids in single_items.items()
-        if len(tids) / total_transactions >= min_support
+# Thống kê chất lượng được tích lũy trong lúc khai thác
+def new_mining_stats():
+    return {
+        'covered': 0,                       # OR các bitmap của mọi frequent itemset
+        'count': 0,
+        'support_sum': 0.0,
+        'max_support': 0.0,
+        'min_support': 1.0,
+        'length_counts': defaultdict(int)
     }
-    for itemset, tids in frequent_singles.items():
-        support = len(tids) / total_transactions
-        frequent_itemsets.append((itemset, support))
+
+def update_mining_stats(stats, itemset, tids, support):
+    stats['covered'] |= tids
+    stats['count'] += 1
+    stats['support_sum'] += support
+    stats['max_support'] = max(stats['max_support'], support)
+    stats['min_support'] = min(stats['min_support'], support)
+    stats['length_counts'][len(itemset)] += 1
+
+# Thuật toán ECLAT; max_length giới hạn kích thước itemset (None: không giới hạn)
+def eclat(vertical, min_support, total_transactions, stats=None, max_length=None):
+    frequent_itemsets = []
+    frequent_singles = {}
+    for item, tids in vertical.items():
+        count = popcount(tids)
+        if count / total_transactions >= min_support:
+            itemset = frozenset([item])
+            frequent_singles[itemset] = tids
+            support = count / total_transactions
+            frequent_itemsets.append((itemset, support))
+            if stats is not None:
+                update_mining_stats(stats, itemset, tids, support)
     
     k = 2
     current_frequent = frequent_singles
-    while current_frequent:
+    while current_frequent and (max_length is None or k <= max_length):
         candidates = {}
         items = list(current_frequent.keys())
         for i in range(len(items)):
             for j in range(i + 1, len(items)):
                 union_set = items[i] | items[j]
-                if len(union_set) == k:
+                if len(union_set) == k and union_set not in candidates:
                     tids = current_frequent[items[i]] & current_frequent[items[j]]
-                    if len(tids) / total_transactions >= min_support:
+                    count = popcount(tids)
+                    if count / total_transactions >= min_support:
                         candidates[union_set] = tids
-        for itemset, tids in candidates.items():
-            support = len(tids) / total_transactions
-            frequent_itemsets.append((itemset, support))
+                        support = count / total_transactions
+                        frequent_itemsets.append((union_set, support))
+                        if stats is not None:
+                            update_mining_stats(stats, union_set, tids, support)
         current_frequent = candidates
         k += 1
     
     return frequent_itemsets
 
-# Tính độ bao phủ của frequent itemsets
-def calculate_coverage(frequent_itemsets, transactions, total_transactions):
-    covered_tids = set()
-    for itemset, _ in frequent_itemsets:
-        tids = set()
-        for item in itemset:
-            if not tids:
-                tids = vertical[item].copy()
-            else:
-                tids &= vertical[item]
-        covered_tids.update(tids)
-    coverage = len(covered_tids) / total_transactions
-    return coverage
+# Tính độ bao phủ của frequent itemsets từ bitmap đã tích lũy trong lúc khai thác
+def calculate_coverage(stats, total_transactions):
+    return popcount(stats['covered']) / total_transactions
+
+# Sinh các hậu quả (consequent) kích thước k+1 từ các hậu quả kích thước k đã đạt confidence
+def next_consequents(consequents, canonical):
+    valid = set(consequents)
+    candidates = set()
+    for i in range(len(consequents)):
+        for j in range(i + 1, len(consequents)):
+            union_set = consequents[i] | consequents[j]
+            if len(union_set) != len(consequents[i]) + 1 or union_set in candidates:
+                continue
+            # Mọi tập con kích thước k phải là hậu quả hợp lệ ở mức trước
+            if all(union_set - {item} in valid for item in union_set):
+                candidates.add(canonical.get(union_set, union_set))
+    # Sắp xếp để thứ tự luật không phụ thuộc thứ tự duyệt set (hash chuỗi ngẫu nhiên theo tiến trình)
+    return sorted(candidates, key=sorted)
 
 # Tạo luật kết hợp và tính confidence, lift
+# Hậu quả được mở rộng theo từng mức (ap-genrules): confidence của X - H → H giảm khi H lớn dần,
+# nên chỉ mở rộng những hậu quả mà luật cha đã đạt min_confidence.
 def generate_association_rules(frequent_itemsets, min_confidence=0.5):
     rules = []
     support_dict = {itemset: support for itemset, support in frequent_itemsets}
+    # Dùng lại đúng đối tượng frozenset đã có trong support_dict (hash đã được cache)
+    canonical = {itemset: itemset for itemset in support_dict}
     
     for itemset, support in frequent_itemsets:
         if len(itemset) < 2:
             continue
-        items = list(itemset)
-        for r in range(1, len(items)):
-            for antecedent in combinations(items, r):
-                antecedent = frozenset(antecedent)
-                consequent = itemset - antecedent
-                if antecedent in support_dict and consequent in support_dict:
-                    confidence = support / support_dict[antecedent]
-                    if confidence >= min_confidence:
-                        lift = confidence / support_dict[consequent]
-                        rules.append({
-                            'antecedent': set(antecedent),
-                            'consequent': set(consequent),
-                            'support': support,
-                            'confidence': confidence,
-                            'lift': lift
-                        })
+        consequents = [canonical.get(frozenset([item]), frozenset([item])) for item in sorted(itemset)]
+        while consequents and len(consequents[0]) < len(itemset):
+            passed = []
+            for consequent in consequents:
+                antecedent = itemset - consequent
+                antecedent_support = support_dict.get(antecedent)
+                consequent_support = support_dict.get(consequent)
+                if antecedent_support is None or consequent_support is None:
+                    continue
+                confidence = support / antecedent_support
+                if confidence >= min_confidence:
+                    lift = confidence / consequent_support
+                    rules.append({
+                        'antecedent': set(antecedent),
+                        'consequent': set(consequent),
+                        'support': support,
+                        'confidence': confidence,
+                        'lift': lift
+                    })
+                    passed.append(consequent)
+            consequents = next_consequents(passed, canonical)
     
     return rules
 
 # Chạy thuật toán
 def main(file_path, min_support=0.003, min_confidence=0.6):
-    global vertical
     transactions = load_data(file_path)
     if not transactions:
         print("Không có giao dịch nào được đọc từ file.")
@@ -116,7 +164,8 @@ def main(file_path, min_support=0.003, min_confidence=0.6):
     total_transactions = len(transactions)
     
     vertical = to_vertical_format(transactions)
-    frequent_itemsets = eclat(vertical, min_support, total_transactions)
+    stats = new_mining_stats()
+    frequent_itemsets = eclat(vertical, min_support, total_transactions, stats)
     frequent_itemsets.sort(key=lambda x: x[1], reverse=True)
     
     # In frequent itemsets
@@ -126,14 +175,16 @@ def main(file_path, min_support=0.003, min_confidence=0.6):
         print(f"Itemset: {set(itemset)}, Support: {support*100:.2f}%")
     
     # Thống kê chất lượng frequent itemsets
-    supports = [support for _, support in frequent_itemsets]
-    print("\nFrequent Itemsets Statistics:")
-    print(f"Max Support: {max(supports)*100:.2f}%")
-    print(f"Min Support: {min(supports)*100:.2f}%")
-    print(f"Average Support: {statistics.mean(supports)*100:.2f}%")
+    if stats['count']:
+        print("\nFrequent Itemsets Statistics:")
+        print(f"Max Support: {stats['max_support']*100:.2f}%")
+        print(f"Min Support: {stats['min_support']*100:.2f}%")
+        print(f"Average Support: {stats['support_sum'] / stats['count']*100:.2f}%")
+        for length, count in sorted(stats['length_counts'].items()):
+            print(f"Itemsets of length {length}: {count}")
     
     # Tính độ bao phủ
-    coverage = calculate_coverage(frequent_itemsets, transactions, total_transactions)
+    coverage = calculate_coverage(stats, total_transactions)
     print(f"Coverage: {coverage*100:.2f}% (tỷ lệ giao dịch được bao phủ bởi frequent itemsets)")
     
     # Tạo và in tất cả association rules
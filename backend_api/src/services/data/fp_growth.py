@@ -96,104 +96,125 @@ name_mapping = {
     "Tu van phong": "tu_van_phong"
 }
 
-df = pd.read_csv('dataset.csv')
-df = df.replace(name_mapping)
-
-transactions = df.iloc[:, 1:].apply(lambda row: [item for item in row if pd.notna(item)], axis=1).tolist()
-print(f"\nSố lượng giao dịch: {len(transactions)}")
-print("Sample transactions (first 5):")
-print(transactions[:5])
-
-# Tính tần suất sản phẩm
-all_items = [item for transaction in transactions for item in transaction]
-item_counts = Counter(all_items)
-print(f"\nSố lượng sản phẩm duy nhất trong dữ liệu: {len(item_counts)}")
-print("Top 5 sản phẩm phổ biến nhất:")
-for item, count in item_counts.most_common(5):
-    print(f"{item}: {count} giao dịch (support: {count/len(transactions):.6f})")
-
-# Kiểm tra sản phẩm bị thiếu trong dữ liệu
-missing_in_data = [item for item in subcategory_keys if item not in item_counts]
-print("Sản phẩm không có trong dataset.csv:", missing_in_data)
-print("Số sản phẩm bị thiếu trong dữ liệu:", len(missing_in_data))
+# Đọc dataset và ánh xạ tên sản phẩm sang subcategory_keys
+def load_transactions(file_path='dataset.csv'):
+    df = pd.read_csv(file_path)
+    df = df.replace(name_mapping)
+    return df.iloc[:, 1:].apply(lambda row: [item for item in row if pd.notna(item)], axis=1).tolist()
+
+# Chuyển đổi dữ liệu thành one-hot encoding
+def encode_transactions(transactions):
+    te = TransactionEncoder()
+    te_ary = te.fit(transactions).transform(transactions)
+    return pd.DataFrame(te_ary, columns=te.columns_)
 
 # Tạo luật đơn cho tất cả 69 sản phẩm
-single_rules = []
-for item in subcategory_keys:
-    count = item_counts.get(item, 0)
-    support = count / len(transactions) if count > 0 else 0.0001
-    single_rules.append({
-        'antecedents': [item],
-        'consequents': [item],
-        'support': support,
-        'confidence': 1.0,
-        'lift': 1.0
-    })
+def build_single_rules(item_counts, total_transactions):
+    single_rules = []
+    for item in subcategory_keys:
+        count = item_counts.get(item, 0)
+        support = count / total_transactions if count > 0 else 0.0001
+        single_rules.append({
+            'antecedents': [item],
+            'consequents': [item],
+            'support': support,
+            'confidence': 1.0,
+            'lift': 1.0
+        })
+    return single_rules
 
-# Chuyển đổi dữ liệu thành one-hot encoding
-te = TransactionEncoder()
-te_ary = te.fit(transactions).transform(transactions)
-df_encoded = pd.DataFrame(te_ary, columns=te.columns_)
-
-# Danh sách các giá trị min_support và min_threshold
-min_support_values = [0.0001, 0.0002, 0.0003, 0.0005, 0.001, 0.002, 0.003, 0.004, 0.005]
-min_threshold_values = [0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9]
-
-all_rules = single_rules.copy()
-seen_rules = set()
-
-# Tạo luật kết hợp bằng FP-Growth
-for min_support, min_threshold in product(min_support_values, min_threshold_values):
-    print(f"\nChạy FP-Growth với min_support={min_support}, min_threshold={min_threshold}")
-    
-    frequent_itemsets = fpgrowth(df_encoded, min_support=min_support, use_colnames=True, max_len=4)
-    
+# Chạy FP-Growth với một cặp ngưỡng, trả về (frequent_itemsets, rules) đã lọc lift > 1
+def mine_fp_growth(df_encoded, min_support, min_threshold, max_len=4):
+    frequent_itemsets = fpgrowth(df_encoded, min_support=min_support, use_colnames=True, max_len=max_len)
     if frequent_itemsets.empty:
-        print(f"Không tìm thấy tập hợp thường xuyên với min_support={min_support}.")
-        continue
-    else:
-        print(f"Số tập hợp thường xuyên: {len(frequent_itemsets)}")
-        multi_itemsets = frequent_itemsets[frequent_itemsets['itemsets'].apply(lambda x: len(x) > 1)]
-        print(f"Tập hợp thường xuyên có nhiều hơn 1 sản phẩm: {len(multi_itemsets)}")
-
+        return frequent_itemsets, None
     rules = association_rules(frequent_itemsets, metric="confidence", min_threshold=min_threshold)
     rules = rules[rules['lift'] > 1.0]
-    
-    if rules.empty:
-        print(f"Không tìm thấy luật kết hợp với min_threshold={min_threshold}.")
-        continue
-    else:
-        print(f"Số luật kết hợp: {len(rules)}")
-    
-    for _, rule in rules.iterrows():
-        antecedents = tuple(sorted(rule['antecedents']))
-        consequents = tuple(sorted(rule['consequents']))
-        rule_key = (antecedents, consequents)
-        if rule_key not in seen_rules:
-            seen_rules.add(rule_key)
-            all_rules.append({
-                'antecedents': list(antecedents),
-                'consequents': list(consequents),
-                'support': rule['support'],
-                'confidence': rule['confidence'],
-                'lift': rule['lift']
-            })
-
-# Loại bỏ các luật đơn trùng lặp từ FP-Growth (nếu có)
-all_rules = [rule for rule in all_rules if rule['antecedents'] != rule['consequents']] + single_rules
-
-# Kiểm tra độ bao phủ sản phẩm
-covered_products = set()
-for rule in all_rules:
-    covered_products.update(rule['antecedents'])
-    covered_products.update(rule['consequents'])
-missing_products = [item for item in subcategory_keys if item not in covered_products]
-print("\nSản phẩm bị thiếu trong các luật:", missing_products)
-print("Số sản phẩm bị thiếu:", len(missing_products))
-
-# Lưu các luật vào file
-with open('rules.json', 'w', encoding='utf-8') as f:
-    json.dump(all_rules, f, ensure_ascii=False, indent=2)
-print(f"\nĐã lưu {len(all_rules)} luật vào rules.json")
-print(f"Số luật đơn: {len(single_rules)}")
-print(f"Số luật kết hợp: {len(all_rules) - len(single_rules)}")
\ No newline at end of file
+    return frequent_itemsets, rules
+
+# Lưới min_support và min_threshold mặc định; luật của mọi cặp giá trị được gộp lại
+MIN_SUPPORT_VALUES = [0.0001, 0.0002, 0.0003, 0.0005, 0.001, 0.002, 0.003, 0.004, 0.005]
+MIN_THRESHOLD_VALUES = [0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9]
+
+def main(file_path='dataset.csv', output_file='rules.json',
+         min_support_values=MIN_SUPPORT_VALUES, min_threshold_values=MIN_THRESHOLD_VALUES):
+    transactions = load_transactions(file_path)
+    print(f"\nSố lượng giao dịch: {len(transactions)}")
+    print("Sample transactions (first 5):")
+    print(transactions[:5])
+
+    # Tính tần suất sản phẩm
+    all_items = [item for transaction in transactions for item in transaction]
+    item_counts = Counter(all_items)
+    print(f"\nSố lượng sản phẩm duy nhất trong dữ liệu: {len(item_counts)}")
+    print("Top 5 sản phẩm phổ biến nhất:")
+    for item, count in item_counts.most_common(5):
+        print(f"{item}: {count} giao dịch (support: {count/len(transactions):.6f})")
+
+    # Kiểm tra sản phẩm bị thiếu trong dữ liệu
+    missing_in_data = [item for item in subcategory_keys if item not in item_counts]
+    print("Sản phẩm không có trong dataset.csv:", missing_in_data)
+    print("Số sản phẩm bị thiếu trong dữ liệu:", len(missing_in_data))
+
+    single_rules = build_single_rules(item_counts, len(transactions))
+    df_encoded = encode_transactions(transactions)
+
+    all_rules = single_rules.copy()
+    seen_rules = set()
+
+    # Tạo luật kết hợp bằng FP-Growth
+    for min_support, min_threshold in product(min_support_values, min_threshold_values):
+        print(f"\nChạy FP-Growth với min_support={min_support}, min_threshold={min_threshold}")
+        
+        frequent_itemsets, rules = mine_fp_growth(df_encoded, min_support, min_threshold)
+        
+        if frequent_itemsets.empty:
+            print(f"Không tìm thấy tập hợp thường xuyên với min_support={min_support}.")
+            continue
+        else:
+            print(f"Số tập hợp thường xuyên: {len(frequent_itemsets)}")
+            multi_itemsets = frequent_itemsets[frequent_itemsets['itemsets'].apply(lambda x: len(x) > 1)]
+            print(f"Tập hợp thường xuyên có nhiều hơn 1 sản phẩm: {len(multi_itemsets)}")
+        
+        if rules.empty:
+            print(f"Không tìm thấy luật kết hợp với min_threshold={min_threshold}.")
+            continue
+        else:
+            print(f"Số luật kết hợp: {len(rules)}")
+        
+        for _, rule in rules.iterrows():
+            antecedents = tuple(sorted(rule['antecedents']))
+            consequents = tuple(sorted(rule['consequents']))
+            rule_key = (antecedents, consequents)
+            if rule_key not in seen_rules:
+                seen_rules.add(rule_key)
+                all_rules.append({
+                    'antecedents': list(antecedents),
+                    'consequents': list(consequents),
+                    'support': rule['support'],
+                    'confidence': rule['confidence'],
+                    'lift': rule['lift']
+                })
+
+    # Loại bỏ các luật đơn trùng lặp từ FP-Growth (nếu có)
+    all_rules = [rule for rule in all_rules if rule['antecedents'] != rule['consequents']] + single_rules
+
+    # Kiểm tra độ bao phủ sản phẩm
+    covered_products = set()
+    for rule in all_rules:
+        covered_products.update(rule['antecedents'])
+        covered_products.update(rule['consequents'])
+    missing_products = [item for item in subcategory_keys if item not in covered_products]
+    print("\nSản phẩm bị thiếu trong các luật:", missing_products)
+    print("Số sản phẩm bị thiếu:", len(missing_products))
+
+    # Lưu các luật vào file
+    with open(output_file, 'w', encoding='utf-8') as f:
+        json.dump(all_rules, f, ensure_ascii=False, indent=2)
+    print(f"\nĐã lưu {len(all_rules)} luật vào {output_file}")
+    print(f"Số luật đơn: {len(single_rules)}")
+    print(f"Số luật kết hợp: {len(all_rules) - len(single_rules)}")
+    return all_rules
+
+if __name__ == "__main__":
+    main()
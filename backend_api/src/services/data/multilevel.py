@@ -0,0 +1,184 @@
+import argparse
+import csv
+import json
+import os
+from collections import defaultdict
+
+from catalog import PRODUCTS_FILE, CATEGORIES_FILE, iter_products, iter_categories
+from eclat.eclat import popcount, to_vertical_format, generate_association_rules
+
+# Khai thác luật kết hợp đa mức trên sản phẩm (SKU) theo cây danh mục:
+#   mức 0: danh mục cha (p_category), mức 1: danh mục con (p_subcategory), mức 2: sản phẩm (_id).
+# Mỗi mức có min_support riêng; ở mức sâu hơn chỉ giữ các item có cha phổ biến ở mức trên
+# và chỉ sinh ứng viên k-itemset khi tập cha tương ứng đã phổ biến ở mức trên.
+
+LEVEL_NAMES = ['category', 'subcategory', 'product']
+DEFAULT_MIN_SUPPORTS = (0.02, 0.005, 0.001)
+OUTPUT_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'rules_sku.json')
+
+def load_taxonomy(products_file=PRODUCTS_FILE, categories_file=CATEGORIES_FILE):
+    """Trả về dict product_id -> (category_id, subcategory_id, product_id) từ các file dump."""
+    parent_of = {category.id: category.parent_id for category in iter_categories(categories_file)}
+    taxonomy = {}
+    for product in iter_products(products_file):
+        category_id = product.category_id or parent_of.get(product.subcategory_id)
+        if not category_id:
+            continue
+        # Sản phẩm không có danh mục con được gom vào một nút con riêng của danh mục cha
+        taxonomy[product.id] = (category_id, product.subcategory_id or f"{category_id}/_", product.id)
+    return taxonomy
+
+def load_sku_transactions_csv(file_path):
+    """Đọc giao dịch dạng dataset.csv (Transaction ID, các cột sản phẩm) với giá trị là product _id."""
+    transactions = []
+    with open(file_path, 'r', encoding='utf-8', newline='') as f:
+        reader = csv.reader(f)
+        next(reader, None)
+        for row in reader:
+            items = [item.strip() for item in row[1:] if item.strip()]
+            if items:
+                transactions.append(items)
+    return transactions
+
+def load_sku_transactions_mongo(mongo_uri="mongodb://localhost:27017", db_name="ecommerce"):
+    """Gom p_id trong orderdetails theo đơn hàng (bỏ đơn đã hủy)."""
+    from pymongo import MongoClient
+    client = MongoClient(mongo_uri)
+    try:
+        db = client[db_name]
+        canceled = [order['_id'] for order in db['orders'].find({'o_status': 'canceled'}, {'_id': 1})]
+        pipeline = [
+            {'$match': {'p_id': {'$ne': None}, 'o_id': {'$nin': canceled}}},
+            {'$group': {'_id': '$o_id', 'items': {'$addToSet': '$p_id'}}},
+        ]
+        return [[str(p_id) for p_id in doc['items']] for doc in db['orderdetails'].aggregate(pipeline)]
+    finally:
+        client.close()
+
+def roll_up(transactions, taxonomy, level, allowed_parents=None):
+    """Chuyển giao dịch SKU lên mức `level`; bỏ item có cha (mức level-1) không phổ biến."""
+    rolled = []
+    for transaction in transactions:
+        items = set()
+        for sku in transaction:
+            path = taxonomy.get(sku)
+            if path is None:
+                continue
+            if allowed_parents is not None and path[level - 1] not in allowed_parents:
+                continue
+            items.add(path[level])
+        rolled.append(sorted(items))
+    return rolled
+
+def mine_level(vertical, total_transactions, min_support, parent_of=None, parent_frequent=None, max_len=None):
+    """ECLAT theo lớp tương đương tiền tố; ứng viên bị loại nếu tập cha không nằm trong parent_frequent."""
+    frequent_itemsets = []
+    current = {}
+    for item in sorted(vertical):
+        tids = vertical[item]
+        support = popcount(tids) / total_transactions
+        if support >= min_support:
+            current[(item,)] = tids
+            frequent_itemsets.append((frozenset([item]), support))
+
+    k = 2
+    while current and (max_len is None or k <= max_len):
+        # Gom các itemset có cùng tiền tố k-2 phần tử để ghép
+        classes = defaultdict(list)
+        for itemset in current:
+            classes[itemset[:-1]].append(itemset)
+        candidates = {}
+        for members in classes.values():
+            for i in range(len(members)):
+                for j in range(i + 1, len(members)):
+                    union = members[i] + members[j][-1:]
+                    if parent_frequent is not None:
+                        parents = frozenset(parent_of[item] for item in union)
+                        if parents not in parent_frequent:
+                            continue
+                    tids = current[members[i]] & current[members[j]]
+                    support = popcount(tids) / total_transactions
+                    if support >= min_support:
+                        candidates[union] = tids
+                        frequent_itemsets.append((frozenset(union), support))
+        current = candidates
+        k += 1
+
+    return frequent_itemsets
+
+def mine_multilevel(transactions, taxonomy, min_supports=DEFAULT_MIN_SUPPORTS, min_confidence=0.3, max_len=3):
+    """Khai thác lần lượt từ mức danh mục xuống mức sản phẩm, trả về dict mức -> (itemsets, rules)."""
+    total_transactions = len(transactions)
+    results = {}
+    parent_frequent = None
+    parent_items = None
+    for level, min_support in enumerate(min_supports):
+        rolled = roll_up(transactions, taxonomy, level, parent_items if level else None)
+        vertical = to_vertical_format(rolled)
+        parent_of = None
+        if level:
+            parent_of = {path[level]: path[level - 1] for path in taxonomy.values()}
+        frequent_itemsets = mine_level(vertical, total_transactions, min_support,
+                                       parent_of, parent_frequent, max_len)
+        rules = generate_association_rules(frequent_itemsets, min_confidence)
+        results[LEVEL_NAMES[level]] = (frequent_itemsets, rules)
+        print(f"Mức {LEVEL_NAMES[level]} (min_support={min_support}): "
+              f"{len(vertical)} item, {len(frequent_itemsets)} frequent itemsets, {len(rules)} luật")
+
+        parent_frequent = {itemset for itemset, _ in frequent_itemsets}
+        parent_items = {item for itemset in parent_frequent if len(itemset) == 1 for item in itemset}
+    return results
+
+def to_rules_json(results):
+    """Chuyển kết quả sang cùng định dạng với rules.json, thêm trường level."""
+    output = []
+    for level, (_, rules) in results.items():
+        for rule in rules:
+            output.append({
+                'antecedents': sorted(rule['antecedent']),
+                'consequents': sorted(rule['consequent']),
+                'support': rule['support'],
+                'confidence': rule['confidence'],
+                'lift': rule['lift'],
+                'level': level
+            })
+    return output
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Khai thác luật kết hợp đa mức (danh mục → sản phẩm)")
+    parser.add_argument('--transactions-csv', help="File giao dịch theo product _id; mặc định đọc orderdetails từ MongoDB")
+    parser.add_argument('--mongo-uri', default="mongodb://localhost:27017")
+    parser.add_argument('--products', default=PRODUCTS_FILE)
+    parser.add_argument('--categories', default=CATEGORIES_FILE)
+    parser.add_argument('--min-supports', default=','.join(map(str, DEFAULT_MIN_SUPPORTS)),
+                        help="min_support cho từng mức: danh mục,danh mục con,sản phẩm")
+    parser.add_argument('--min-confidence', type=float, default=0.3)
+    parser.add_argument('--max-len', type=int, default=3)
+    parser.add_argument('--output', default=OUTPUT_FILE)
+    args = parser.parse_args(argv)
+
+    min_supports = [float(v) for v in args.min_supports.split(',')]
+    if len(min_supports) != len(LEVEL_NAMES):
+        parser.error(f"Cần {len(LEVEL_NAMES)} giá trị min_support")
+
+    taxonomy = load_taxonomy(args.products, args.categories)
+    if args.transactions_csv:
+        transactions = load_sku_transactions_csv(args.transactions_csv)
+    else:
+        transactions = load_sku_transactions_mongo(args.mongo_uri)
+    if not transactions:
+        print("Không có giao dịch nào được đọc.")
+        return None
+    unknown = {sku for transaction in transactions for sku in transaction if sku not in taxonomy}
+    print(f"Số lượng giao dịch: {len(transactions)}, số sản phẩm: {len(taxonomy)}, "
+          f"sản phẩm không có trong catalog: {len(unknown)}")
+
+    results = mine_multilevel(transactions, taxonomy, min_supports, args.min_confidence, args.max_len)
+    rules = to_rules_json(results)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(rules, f, ensure_ascii=False, indent=2)
+    print(f"Đã lưu {len(rules)} luật vào {args.output}")
+    return rules
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+import argparse
+import csv
+import json
+import os
+import time
+
+import numpy as np
+from scipy import sparse
+
+from fp_growth import name_mapping, subcategory_keys
+
+# Luật một item -> một item tính trực tiếp từ ma trận đồng xuất hiện C = Xᵀ·X của ma trận giao dịch thưa X
+# (n giao dịch x m item): C[i, i] là số giao dịch chứa i, C[i, j] là số giao dịch chứa cả i và j.
+# X được dựng và cộng dồn theo từng khối dòng nên đọc được log lớn hơn bộ nhớ.
+# Kết quả cùng định dạng rules.json; chỉ luật có từ 3 item trở lên mới cần FP-Growth.
+#
+#   python pairwise.py --input dataset.csv --output rules_pairwise.json
+#   python pairwise.py --merge-into rules.json     # thay các luật 1 -> 1 trong rules.json bằng kết quả mới
+
+# Mặc định theo thư mục module để chạy được từ bất kỳ đâu (kể cả qua offline_jobs.py mine pairwise)
+DATA_DIR = os.path.dirname(os.path.abspath(__file__))
+DATASET_FILE = os.path.join(DATA_DIR, 'dataset.csv')
+OUTPUT_FILE = os.path.join(DATA_DIR, 'rules_pairwise.json')
+CHUNK_SIZE = 100000
+
+def iter_transaction_chunks(file_path=DATASET_FILE, chunk_size=CHUNK_SIZE):
+    """Đọc dataset.csv theo từng khối, ánh xạ tên sản phẩm sang subcategory_keys như fp_growth.load_transactions."""
+    with open(file_path, 'r', encoding='utf-8', newline='') as f:
+        reader = csv.reader(f)
+        next(reader, None)
+        chunk = []
+        for row in reader:
+            chunk.append([name_mapping.get(value, value) for value in row[1:] if value])
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+def encode_sparse(transactions, index):
+    """Ma trận CSR 0/1 (giao dịch x item); item không có trong index bị bỏ qua, item lặp lại chỉ tính một lần."""
+    rows, cols = [], []
+    for row, transaction in enumerate(transactions):
+        for col in {index[item] for item in transaction if item in index}:
+            rows.append(row)
+            cols.append(col)
+    data = np.ones(len(rows), dtype=np.int32)
+    return sparse.csr_matrix((data, (rows, cols)), shape=(len(transactions), len(index)))
+
+def cooccurrence_counts(chunks, vocabulary=None):
+    """Cộng dồn Xᵀ·X qua các khối giao dịch trong một lượt đọc.
+
+    vocabulary mặc định là subcategory_keys; item mới gặp được thêm vào cuối và ma trận được mở rộng.
+    Trả về (C dạng CSR int64, tổng số giao dịch, vocabulary).
+    """
+    vocabulary = list(subcategory_keys if vocabulary is None else vocabulary)
+    index = {item: i for i, item in enumerate(vocabulary)}
+    counts = sparse.csr_matrix((len(vocabulary), len(vocabulary)), dtype=np.int64)
+    total = 0
+    for transactions in chunks:
+        for transaction in transactions:
+            for item in transaction:
+                if item not in index:
+                    index[item] = len(vocabulary)
+                    vocabulary.append(item)
+        matrix = encode_sparse(transactions, index)
+        counts.resize((len(vocabulary), len(vocabulary)))
+        counts = counts + (matrix.T @ matrix).astype(np.int64)
+        total += matrix.shape[0]
+    return counts.tocsr(), total, vocabulary
+
+def pairwise_rules(counts, total_transactions, vocabulary, min_support=0.0001, min_confidence=0.1, min_lift=1.0):
+    """Tính support / confidence / lift cho mọi cặp (a -> b) cùng lúc, giữ luật có lift > min_lift."""
+    if not total_transactions:
+        return []
+    item_counts = counts.diagonal().astype(np.float64)
+    pairs = sparse.triu(counts, k=1).tocoo()
+    keep = pairs.data >= min_support * total_transactions
+    a, b, pair_counts = pairs.row[keep], pairs.col[keep], pairs.data[keep].astype(np.float64)
+
+    # Mỗi cặp sinh hai luật a -> b và b -> a
+    antecedents = np.concatenate([a, b])
+    consequents = np.concatenate([b, a])
+    pair_counts = np.concatenate([pair_counts, pair_counts])
+    support = pair_counts / total_transactions
+    confidence = pair_counts / item_counts[antecedents]
+    lift = confidence / (item_counts[consequents] / total_transactions)
+    selected = np.flatnonzero((confidence >= min_confidence) & (lift > min_lift))
+    selected = selected[np.lexsort((-confidence[selected], -lift[selected]))]
+    return [
+        {
+            'antecedents': [vocabulary[antecedents[i]]],
+            'consequents': [vocabulary[consequents[i]]],
+            'support': float(support[i]),
+            'confidence': float(confidence[i]),
+            'lift': float(lift[i])
+        }
+        for i in selected
+    ]
+
+def merge_rules(existing_rules, new_pairwise_rules):
+    """Giữ luật đơn (a -> a) và luật từ 3 item trở lên của rules.json, thay toàn bộ luật 1 -> 1 bằng kết quả mới."""
+    kept = [rule for rule in existing_rules
+            if rule['antecedents'] == rule['consequents']
+            or len(rule['antecedents']) + len(rule['consequents']) > 2]
+    single_rules = [rule for rule in kept if rule['antecedents'] == rule['consequents']]
+    multi_rules = [rule for rule in kept if rule['antecedents'] != rule['consequents']]
+    # Cùng thứ tự với fp_growth.main: luật kết hợp trước, luật đơn ở cuối
+    return new_pairwise_rules + multi_rules + single_rules
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Tính luật kết hợp 1 -> 1 từ ma trận đồng xuất hiện thưa")
+    parser.add_argument('--input', default=DATASET_FILE)
+    parser.add_argument('--output', default=OUTPUT_FILE)
+    parser.add_argument('--merge-into', help="Cập nhật luật 1 -> 1 trong file rules.json này (giữ luật 3+ item)")
+    parser.add_argument('--min-support', type=float, default=0.0001)
+    parser.add_argument('--min-confidence', type=float, default=0.1)
+    parser.add_argument('--min-lift', type=float, default=1.0)
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    args = parser.parse_args(argv)
+
+    start_time = time.perf_counter()
+    counts, total, vocabulary = cooccurrence_counts(iter_transaction_chunks(args.input, args.chunk_size))
+    rules = pairwise_rules(counts, total, vocabulary, args.min_support, args.min_confidence, args.min_lift)
+    print(f"Số lượng giao dịch: {total}, số item: {len(vocabulary)}, số luật 1 -> 1: {len(rules)} "
+          f"({time.perf_counter() - start_time:.2f}s)")
+
+    output_file = args.output
+    if args.merge_into:
+        with open(args.merge_into, 'r', encoding='utf-8') as f:
+            rules = merge_rules(json.load(f), rules)
+        output_file = args.merge_into
+    with open(output_file, 'w', encoding='utf-8') as f:
+        json.dump(rules, f, ensure_ascii=False, indent=2)
+    print(f"Đã lưu {len(rules)} luật vào {output_file}")
+    return rules
+
+if __name__ == "__main__":
+    main()
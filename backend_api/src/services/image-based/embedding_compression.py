@@ -0,0 +1,172 @@
+import argparse
+import os
+import pickle
+import time
+
+import numpy as np
+from sklearn.decomposition import PCA
+from sklearn.neighbors import NearestNeighbors
+
+# Nén embedding ảnh: chiếu PCA (tùy chọn whitening) xuống n_components chiều và lượng tử hóa int8 theo từng chiều.
+# CompressedIndex có cùng giao diện kneighbors với NearestNeighbors(metric='cosine') và tự áp dụng phép biến đổi
+# cho vector truy vấn, nên find_similar_images không phải thay đổi.
+#
+#   python embedding_compression.py --saved-dir saved_data --components 64,128,256
+
+SEARCH_BLOCK_SIZE = 4096
+
+def _normalize(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+class EmbeddingCompressor:
+    def __init__(self, n_components=256, whiten=True, quantize=False):
+        self.n_components = n_components
+        self.whiten = whiten
+        self.quantize = quantize
+        self.pca = None
+        self.scales = None
+
+    def fit(self, features_matrix):
+        features_matrix = np.asarray(features_matrix, dtype=np.float32)
+        if self.n_components:
+            n_components = min(self.n_components, features_matrix.shape[0], features_matrix.shape[1])
+            self.pca = PCA(n_components=n_components, whiten=self.whiten, random_state=0).fit(features_matrix)
+        if self.quantize:
+            projected = self.project(features_matrix)
+            # Thang đo đối xứng theo từng chiều: giá trị lớn nhất ứng với 127
+            max_abs = np.abs(projected).max(axis=0)
+            self.scales = np.where(max_abs > 0, max_abs / 127.0, 1.0).astype(np.float32)
+        return self
+
+    def project(self, features):
+        """Vector gốc -> vector đã chiếu và chuẩn hóa L2 (float32)."""
+        features = np.asarray(features, dtype=np.float32)
+        if self.pca is not None:
+            features = self.pca.transform(features).astype(np.float32)
+        return _normalize(features)
+
+    def encode(self, features):
+        """Vector gốc -> dạng lưu trữ (int8 nếu lượng tử hóa, ngược lại float32)."""
+        projected = self.project(features)
+        if self.scales is None:
+            return projected
+        return np.clip(np.rint(projected / self.scales), -127, 127).astype(np.int8)
+
+    @property
+    def output_dim(self):
+        return self.pca.n_components_ if self.pca is not None else None
+
+class CompressedIndex:
+    """Tìm kiếm cosine vét cạn trên ma trận đã nén; kneighbors nhận vector gốc giống NearestNeighbors."""
+
+    def __init__(self, compressor, features_matrix, n_neighbors=20):
+        self.compressor = compressor
+        self.n_neighbors = n_neighbors
+        self.codes = compressor.encode(features_matrix)
+        if compressor.scales is not None:
+            # Chuẩn của vector sau khi giải lượng tử để cosine vẫn đúng thang
+            self.norms = np.linalg.norm(self.codes.astype(np.float32) * compressor.scales, axis=1)
+            self.norms[self.norms == 0] = 1.0
+        else:
+            self.norms = None
+
+    @property
+    def nbytes(self):
+        return self.codes.nbytes
+
+    def kneighbors(self, X, n_neighbors=None):
+        n_neighbors = min(n_neighbors or self.n_neighbors, len(self.codes))
+        queries = self.compressor.project(X)
+        if self.compressor.scales is not None:
+            # q · (s * code) = (q * s) · code
+            queries = queries * self.compressor.scales
+        similarities = np.empty((len(queries), len(self.codes)), dtype=np.float32)
+        for start in range(0, len(self.codes), SEARCH_BLOCK_SIZE):
+            block = self.codes[start:start + SEARCH_BLOCK_SIZE].astype(np.float32)
+            similarities[:, start:start + len(block)] = queries @ block.T
+        if self.norms is not None:
+            similarities /= self.norms
+        top = np.argpartition(-similarities, n_neighbors - 1, axis=1)[:, :n_neighbors]
+        top_similarities = np.take_along_axis(similarities, top, axis=1)
+        order = np.argsort(-top_similarities, axis=1)
+        indices = np.take_along_axis(top, order, axis=1)
+        distances = 1 - np.take_along_axis(top_similarities, order, axis=1)
+        return distances, indices
+
+def label_agreement(index, features_matrix, labels, k=10, sample_size=1000, seed=0):
+    """Tỷ lệ trung bình láng giềng top-k (không tính chính ảnh truy vấn) có cùng nhãn với ảnh truy vấn."""
+    labels = np.asarray(labels)
+    rng = np.random.default_rng(seed)
+    queries = rng.choice(len(features_matrix), size=min(sample_size, len(features_matrix)), replace=False)
+    start_time = time.perf_counter()
+    _, indices = index.kneighbors(features_matrix[queries], n_neighbors=min(k + 1, len(features_matrix)))
+    elapsed = time.perf_counter() - start_time
+    agreements = []
+    for query, neighbours in zip(queries, indices):
+        neighbours = [n for n in neighbours if n != query][:k]
+        if neighbours:
+            agreements.append(np.mean(labels[neighbours] == labels[query]))
+    return float(np.mean(agreements)) if agreements else 0.0, elapsed / len(queries)
+
+def quality_report(features_matrix, labels, configs, k=10, sample_size=1000):
+    """So sánh độ khớp nhãn, bộ nhớ index và thời gian truy vấn giữa vector gốc và các cấu hình nén.
+
+    configs: danh sách (n_components, whiten, quantize). Trả về list dict, dòng đầu là vector gốc.
+    """
+    features_matrix = np.asarray(features_matrix, dtype=np.float32)
+    baseline = NearestNeighbors(n_neighbors=min(k + 1, len(features_matrix)), algorithm='brute', metric='cosine')
+    baseline.fit(features_matrix)
+    agreement, query_time = label_agreement(baseline, features_matrix, labels, k, sample_size)
+    rows = [{'config': 'raw', 'dim': features_matrix.shape[1], 'bytes': features_matrix.nbytes,
+             'agreement': agreement, 'query_ms': query_time * 1000}]
+    for n_components, whiten, quantize in configs:
+        compressor = EmbeddingCompressor(n_components, whiten, quantize).fit(features_matrix)
+        index = CompressedIndex(compressor, features_matrix)
+        agreement, query_time = label_agreement(index, features_matrix, labels, k, sample_size)
+        rows.append({
+            'config': f"pca{compressor.output_dim or features_matrix.shape[1]}{'-whiten' if whiten else ''}"
+                      f"{'-int8' if quantize else ''}",
+            'dim': index.codes.shape[1], 'bytes': index.nbytes,
+            'agreement': agreement, 'query_ms': query_time * 1000
+        })
+    return rows
+
+def print_quality_report(rows, k=10):
+    baseline = rows[0]
+    print(f"\n=== Chất lượng truy hồi (độ khớp nhãn top-{k}) ===")
+    print(f"{'cấu hình':<24}{'chiều':>7}{'bộ nhớ (KB)':>14}{'khớp nhãn':>12}{'chênh lệch':>12}{'ms/truy vấn':>14}")
+    for row in rows:
+        print(f"{row['config']:<24}{row['dim']:>7}{row['bytes'] / 1024:>14.1f}{row['agreement'] * 100:>11.2f}%"
+              f"{(row['agreement'] - baseline['agreement']) * 100:>+11.2f}%{row['query_ms']:>14.3f}")
+
+def load_features(product_info):
+    """Ghép features_list và nhãn thư mục từ product_info (kết quả build_feature_database)."""
+    features, labels = [], []
+    for info in product_info.values():
+        for vector in info.get('features_list', []):
+            features.append(vector)
+            labels.append(info.get('label', ''))
+    return np.asarray(features, dtype=np.float32), labels
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Báo cáo chất lượng truy hồi khi nén embedding ảnh")
+    parser.add_argument('--saved-dir', default='saved_data')
+    parser.add_argument('--components', default='64,128,256')
+    parser.add_argument('--no-whiten', action='store_true')
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--sample-size', type=int, default=1000)
+    args = parser.parse_args(argv)
+
+    with open(os.path.join(args.saved_dir, 'product_info.pkl'), 'rb') as f:
+        product_info = pickle.load(f)
+    features_matrix, labels = load_features(product_info)
+    print(f"Đã đọc {len(features_matrix)} vector {features_matrix.shape[1]} chiều, {len(set(labels))} nhãn")
+
+    components = [int(v) for v in args.components.split(',') if v.strip()]
+    configs = [(n, not args.no_whiten, quantize) for n in components for quantize in (False, True)]
+    print_quality_report(quality_report(features_matrix, labels, configs, args.k, args.sample_size), args.k)
+
+if __name__ == '__main__':
+    main()
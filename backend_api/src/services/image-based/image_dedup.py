@@ -0,0 +1,149 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from PIL import Image
+
+# Phát hiện ảnh gần trùng bằng perceptual hash (aHash/dHash/pHash 64 bit) và BK-tree theo khoảng cách Hamming.
+# Dùng trước bước trích xuất đặc trưng để mỗi nhóm ảnh gần giống nhau (thumbnail _th, ảnh thương hiệu dùng chung)
+# chỉ phải chạy EfficientNetB4 một lần; trong cùng một sản phẩm, cả nhóm chỉ chiếm một dòng trong index.
+
+HASH_SIZE = 8
+PHASH_SCALE = 4
+DEFAULT_MAX_DISTANCE = 4
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.webp')
+
+def _bits_to_int(bits):
+    value = 0
+    for bit in bits.flatten():
+        value = (value << 1) | int(bit)
+    return value
+
+def _load_gray(img_path, size):
+    with Image.open(img_path) as img:
+        return np.asarray(img.convert('L').resize(size, Image.Resampling.LANCZOS), dtype=np.float64)
+
+def average_hash(img_path, hash_size=HASH_SIZE):
+    pixels = _load_gray(img_path, (hash_size, hash_size))
+    return _bits_to_int(pixels > pixels.mean())
+
+def difference_hash(img_path, hash_size=HASH_SIZE):
+    pixels = _load_gray(img_path, (hash_size + 1, hash_size))
+    return _bits_to_int(pixels[:, 1:] > pixels[:, :-1])
+
+_dct_matrices = {}
+
+def _dct_matrix(n):
+    # Ma trận DCT-II trực chuẩn, tính một lần cho mỗi kích thước
+    if n not in _dct_matrices:
+        k = np.arange(n)[:, None]
+        i = np.arange(n)[None, :]
+        matrix = np.sqrt(2 / n) * np.cos(np.pi * (2 * i + 1) * k / (2 * n))
+        matrix[0] /= np.sqrt(2)
+        _dct_matrices[n] = matrix
+    return _dct_matrices[n]
+
+def perceptual_hash(img_path, hash_size=HASH_SIZE):
+    size = hash_size * PHASH_SCALE
+    pixels = _load_gray(img_path, (size, size))
+    dct = _dct_matrix(size)
+    low = (dct @ pixels @ dct.T)[:hash_size, :hash_size]
+    # So với trung vị các hệ số tần số thấp, bỏ hệ số DC
+    return _bits_to_int(low > np.median(low.flatten()[1:]))
+
+HASH_FUNCTIONS = {
+    'ahash': average_hash,
+    'dhash': difference_hash,
+    'phash': perceptual_hash,
+}
+
+def hamming_distance(a, b):
+    return bin(a ^ b).count('1')
+
+class BKTree:
+    """BK-tree trên khoảng cách Hamming: tìm mọi hash trong bán kính r mà không phải so với toàn bộ."""
+
+    def __init__(self):
+        self.root = None
+
+    def add(self, hash_value, item):
+        node = [hash_value, item, {}]
+        if self.root is None:
+            self.root = node
+            return
+        current = self.root
+        while True:
+            distance = hamming_distance(hash_value, current[0])
+            child = current[2].get(distance)
+            if child is None:
+                current[2][distance] = node
+                return
+            current = child
+
+    def search(self, hash_value, max_distance):
+        """Trả về danh sách (khoảng cách, item) có khoảng cách <= max_distance."""
+        results = []
+        stack = [self.root] if self.root is not None else []
+        while stack:
+            node = stack.pop()
+            distance = hamming_distance(hash_value, node[0])
+            if distance <= max_distance:
+                results.append((distance, node[1]))
+            # Bất đẳng thức tam giác: chỉ các nhánh có khoảng cách trong [d - r, d + r] mới có thể khớp
+            for edge, child in node[2].items():
+                if distance - max_distance <= edge <= distance + max_distance:
+                    stack.append(child)
+        return results
+
+def list_images(image_folder):
+    paths = []
+    for root, _, files in os.walk(image_folder):
+        for file in files:
+            if file.lower().endswith(IMAGE_EXTENSIONS):
+                paths.append(os.path.join(root, file))
+    return sorted(paths)
+
+def compute_hashes(img_paths, method='phash', max_workers=8):
+    """Tính hash cho danh sách ảnh song song (PIL nhả GIL khi giải mã/resize); ảnh không đọc được bị bỏ qua."""
+    hash_function = HASH_FUNCTIONS[method]
+
+    def safe_hash(img_path):
+        try:
+            return hash_function(img_path)
+        except Exception as e:
+            print(f"Không tính được hash cho ảnh {img_path}: {str(e)}")
+            return None
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        hashes = list(executor.map(safe_hash, img_paths))
+    return {img_path: hash_value for img_path, hash_value in zip(img_paths, hashes) if hash_value is not None}
+
+def group_by_hash(hashes, max_distance=DEFAULT_MAX_DISTANCE):
+    """Gom các ảnh theo hash; trả về dict ảnh đại diện -> danh sách ảnh trong nhóm (gồm cả ảnh đại diện).
+
+    Mỗi ảnh được gán vào nhóm có đại diện gần nhất trong bán kính max_distance bit,
+    nếu không có thì trở thành đại diện của nhóm mới.
+    """
+    tree = BKTree()
+    groups = {}
+    for img_path, hash_value in hashes.items():
+        matches = tree.search(hash_value, max_distance)
+        if matches:
+            _, representative = min(matches)
+            groups[representative].append(img_path)
+        else:
+            tree.add(hash_value, img_path)
+            groups[img_path] = [img_path]
+    return groups
+
+def group_near_duplicates(img_paths, max_distance=DEFAULT_MAX_DISTANCE, method='phash', max_workers=8):
+    """Như group_by_hash trên img_paths; ảnh không tính được hash vẫn có nhóm riêng một ảnh
+    để bước sau (preprocess_image) tự quyết định, không bị loại khỏi index."""
+    hashes = compute_hashes(img_paths, method, max_workers)
+    groups = group_by_hash(hashes, max_distance)
+    duplicates = len(hashes) - len(groups)
+    for img_path in img_paths:
+        if img_path not in hashes:
+            groups[img_path] = [img_path]
+    print(f"Perceptual hash ({method}, r={max_distance}): {len(img_paths)} ảnh -> {len(groups)} nhóm, "
+          f"{duplicates} ảnh gần trùng, {len(img_paths) - len(hashes)} ảnh không tính được hash")
+    return groups
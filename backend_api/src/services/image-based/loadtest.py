@@ -0,0 +1,300 @@
+import argparse
+import contextlib
+import hashlib
+import io
+import json
+import logging
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import requests
+from PIL import Image, ImageDraw
+
+# Load test cho /find_similar: dựng service với catalog tổng hợp (ảnh ngẫu nhiên, MongoDB giả bằng mongomock,
+# embedding sinh sẵn), phát lại yêu cầu multipart và imageUrl (ảnh phục vụ từ một HTTP server cục bộ)
+# với số luồng đồng thời tùy chọn, rồi báo throughput và p50/p95/p99 cho từng giai đoạn.
+#
+#   python loadtest.py --products 500 --requests 400 --concurrency 8 --url-fraction 0.5
+#   python loadtest.py ... --real-model          # dùng EfficientNetB4 thật thay cho embedding sinh sẵn
+#   python loadtest.py ... --output loadtest.json
+
+STAGES = ['request', 'handler', 'preprocess', 'embed', 'knn', 'lookup']
+
+class StageTimer:
+    """Gom thời gian từng giai đoạn theo từng request (mỗi request chạy trên một luồng của server)."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.samples = {stage: [] for stage in STAGES}
+
+    def record(self, stage, seconds):
+        with self.lock:
+            self.samples[stage].append(seconds)
+        current = getattr(self.local, 'current', None)
+        if current is not None:
+            current[stage] = current.get(stage, 0.0) + seconds
+
+    def wrap(self, stage, function):
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.record(stage, time.perf_counter() - start)
+        return timed
+
+    def wrap_handler(self, function):
+        # find_similar_images: phần còn lại sau preprocess/embed/knn là tra cứu sản phẩm trong MongoDB
+        def timed(*args, **kwargs):
+            self.local.current = {}
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                current = self.local.current
+                self.local.current = None
+                self.record('handler', elapsed)
+                self.record('lookup', max(0.0, elapsed - sum(current.get(s, 0.0) for s in ('preprocess', 'embed', 'knn'))))
+        return timed
+
+class PrecomputedEmbeddingModel:
+    """Thay cho EfficientNetB4: trả về embedding sinh sẵn theo nội dung ảnh đã tiền xử lý.
+
+    Ảnh trong catalog được đăng ký trước nên truy vấn bằng chính ảnh đó tìm lại được đúng sản phẩm;
+    ảnh lạ nhận vector ngẫu nhiên cố định theo hash. latency_ms mô phỏng thời gian chạy mô hình.
+    """
+
+    def __init__(self, dim=1792, latency_ms=0.0):
+        self.dim = dim
+        self.latency_ms = latency_ms
+        self.embeddings = {}
+
+    @staticmethod
+    def key(img_array):
+        return hashlib.sha1(np.ascontiguousarray(img_array).tobytes()).hexdigest()
+
+    def register(self, img_array):
+        key = self.key(img_array)
+        if key not in self.embeddings:
+            rng = np.random.default_rng(int(key[:16], 16))
+            self.embeddings[key] = rng.normal(size=self.dim).astype(np.float32)
+        return self.embeddings[key]
+
+    def predict(self, img_array, verbose=0):
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        return self.register(img_array)[None, :]
+
+def generate_catalog(image_dir, n_products, images_per_product=2, size=256, seed=0):
+    """Sinh ảnh ngẫu nhiên (nền + hình khối) và document sản phẩm tương ứng."""
+    from bson import ObjectId
+    rng = random.Random(seed)
+    products = []
+    for i in range(n_products):
+        product_id = ObjectId()
+        images = []
+        for j in range(images_per_product):
+            img = Image.new('RGB', (size, size), tuple(rng.randrange(256) for _ in range(3)))
+            draw = ImageDraw.Draw(img)
+            for _ in range(6):
+                x0, y0 = rng.randrange(size), rng.randrange(size)
+                box = [x0, y0, x0 + rng.randrange(16, size // 2), y0 + rng.randrange(16, size // 2)]
+                color = tuple(rng.randrange(256) for _ in range(3))
+                (draw.ellipse if rng.random() < 0.5 else draw.rectangle)(box, fill=color)
+            file_name = f"product_{i}_image_{j + 1}.jpg"
+            img.save(os.path.join(image_dir, file_name), quality=90)
+            images.append(file_name)
+        products.append({
+            '_id': product_id,
+            'p_name': f"Sản phẩm thử {i}",
+            'p_images': [f"/uploads/product/{name}" for name in images],
+            'p_price': rng.randrange(100, 10000) * 1000,
+            'p_stock_quantity': rng.randrange(0, 100),
+            'p_description': '',
+            'p_specifications': [{'key': 'Mã', 'value': str(i)}],
+            'p_category': ObjectId(), 'p_subcategory': ObjectId(), 'p_brand': ObjectId(),
+        })
+    return products
+
+def build_index(service, image_dir, products):
+    """Tạo nbrs / paths_list / product_info giống build_feature_database nhưng dùng model hiện tại của service."""
+    from sklearn.neighbors import NearestNeighbors
+    features_list, paths_list, product_info = [], [], {}
+    for product in products:
+        product_id = str(product['_id'])
+        product_info[product_id] = {'product_id': product_id, 'name': product['p_name'], 'label': 'synthetic',
+                                    'image_paths': [], 'features_list': []}
+        for image in product['p_images']:
+            img_path = os.path.join(image_dir, os.path.basename(image))
+            img_array = service.preprocess_image(img_path)
+            if isinstance(service.model, PrecomputedEmbeddingModel):
+                features = service.model.register(img_array)
+            else:
+                features = service.extract_features(service.model, img_array)
+            features_list.append(features)
+            paths_list.append(img_path)
+            product_info[product_id]['image_paths'].append(img_path)
+    nbrs = NearestNeighbors(n_neighbors=min(20, len(features_list)), algorithm='brute', metric='cosine')
+    return nbrs.fit(np.array(features_list)), paths_list, product_info
+
+def start_server(server):
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return thread
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+def percentiles(samples):
+    if not samples:
+        return None
+    values = np.asarray(samples) * 1000
+    return {
+        'count': len(values),
+        'mean_ms': float(values.mean()),
+        'p50_ms': float(np.percentile(values, 50)),
+        'p95_ms': float(np.percentile(values, 95)),
+        'p99_ms': float(np.percentile(values, 99)),
+        'max_ms': float(values.max()),
+    }
+
+def run_load(service_url, image_server_url, image_files, n_requests, concurrency, url_fraction, top_k, timer, seed=0):
+    rng = random.Random(seed)
+    plan = [(rng.choice(image_files), rng.random() < url_fraction) for _ in range(n_requests)]
+    session = requests.Session()
+    session.mount('http://', requests.adapters.HTTPAdapter(pool_maxsize=concurrency))
+    errors = []
+    hits = []
+
+    def send(job):
+        image_file, by_url = job
+        start = time.perf_counter()
+        try:
+            if by_url:
+                response = session.post(f"{service_url}/find_similar", timeout=60,
+                                        json={'imageUrl': f"{image_server_url}/{os.path.basename(image_file)}", 'topK': top_k})
+            else:
+                with open(image_file, 'rb') as f:
+                    response = session.post(f"{service_url}/find_similar", timeout=60,
+                                            files={'image': (os.path.basename(image_file), f, 'image/jpeg')},
+                                            data={'topK': top_k})
+            response.raise_for_status()
+            hits.append(bool(response.json().get('data')))
+        except Exception as e:
+            errors.append(str(e))
+        finally:
+            timer.record('request', time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(send, plan))
+    elapsed = time.perf_counter() - start
+    return elapsed, errors, hits
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test /find_similar với catalog tổng hợp")
+    parser.add_argument('--products', type=int, default=200)
+    parser.add_argument('--images-per-product', type=int, default=2)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--url-fraction', type=float, default=0.5, help="Tỷ lệ yêu cầu gửi imageUrl thay vì upload multipart")
+    parser.add_argument('--top-k', type=int, default=5)
+    parser.add_argument('--warmup', type=int, default=10)
+    parser.add_argument('--real-model', action='store_true', help="Dùng EfficientNetB4 thật (tải trọng số imagenet)")
+    parser.add_argument('--model-latency-ms', type=float, default=0.0, help="Độ trễ giả lập cho mỗi lần gọi model")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--verbose', action='store_true', help="Giữ log print của service")
+    parser.add_argument('--output', help="Ghi kết quả ra file JSON")
+    args = parser.parse_args(argv)
+
+    import mongomock
+    from werkzeug.serving import make_server
+    import train_features as service
+
+    work_dir = tempfile.mkdtemp(prefix='find_similar_loadtest_')
+    image_dir = os.path.join(work_dir, 'images')
+    os.makedirs(image_dir)
+    servers = []
+    quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+    if not args.verbose:
+        logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    try:
+        with quiet:
+            print(f"Sinh {args.products} sản phẩm tổng hợp...")
+            products = generate_catalog(image_dir, args.products, args.images_per_product, seed=args.seed)
+            client = mongomock.MongoClient()
+            client['ecommerce']['products'].insert_many(products)
+
+            service.get_mongo_client = lambda: client
+            service.model = (service.init_feature_extractor() if args.real_model
+                             else PrecomputedEmbeddingModel(latency_ms=args.model_latency_ms))
+            service.nbrs, service.paths_list, service.product_info = build_index(service, image_dir, products)
+
+            timer = StageTimer()
+            service.preprocess_image = timer.wrap('preprocess', service.preprocess_image)
+            service.extract_features = timer.wrap('embed', service.extract_features)
+            service.nbrs.kneighbors = timer.wrap('knn', service.nbrs.kneighbors)
+            service.find_similar_images = timer.wrap_handler(service.find_similar_images)
+
+            app_server = make_server('127.0.0.1', 0, service.app, threaded=True)
+            image_server = ThreadingHTTPServer(('127.0.0.1', 0), partial(QuietHandler, directory=image_dir))
+            servers = [app_server, image_server]
+            for server in servers:
+                start_server(server)
+            service_url = f"http://127.0.0.1:{app_server.server_port}"
+            image_server_url = f"http://127.0.0.1:{image_server.server_port}"
+
+            image_files = sorted(os.path.join(image_dir, name) for name in os.listdir(image_dir))
+            if args.warmup:
+                run_load(service_url, image_server_url, image_files, args.warmup, 1, args.url_fraction,
+                         args.top_k, StageTimer(), args.seed + 1)
+                timer.samples = {stage: [] for stage in STAGES}
+            elapsed, errors, hits = run_load(service_url, image_server_url, image_files, args.requests,
+                                             args.concurrency, args.url_fraction, args.top_k, timer, args.seed)
+
+        report = {
+            'products': args.products,
+            'images': len(image_files),
+            'requests': args.requests,
+            'concurrency': args.concurrency,
+            'url_fraction': args.url_fraction,
+            'model': 'EfficientNetB4' if args.real_model else 'precomputed',
+            'elapsed_s': elapsed,
+            'throughput_rps': args.requests / elapsed if elapsed else None,
+            'errors': len(errors),
+            'empty_results': hits.count(False),
+            'stages': {stage: percentiles(timer.samples[stage]) for stage in STAGES},
+        }
+        print(f"{args.requests} yêu cầu, concurrency={args.concurrency}: {report['throughput_rps']:.1f} req/s, "
+              f"{len(errors)} lỗi, {report['empty_results']} kết quả rỗng")
+        print(f"{'stage':<12}{'count':>8}{'mean':>10}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}  (ms)")
+        for stage, stats in report['stages'].items():
+            if stats:
+                print(f"{stage:<12}{stats['count']:>8}{stats['mean_ms']:>10.2f}{stats['p50_ms']:>10.2f}"
+                      f"{stats['p95_ms']:>10.2f}{stats['p99_ms']:>10.2f}{stats['max_ms']:>10.2f}")
+        for error in errors[:5]:
+            print(f"Lỗi: {error}")
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+            print(f"Đã lưu kết quả vào {args.output}")
+        return report
+    finally:
+        for server in servers:
+            server.shutdown()
+            server.server_close()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,212 @@
+import argparse
+import json
+import math
+import os
+import pickle
+import re
+import sys
+from collections import defaultdict
+
+import numpy as np
+
+from text_index import fold_diacritics
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data'))
+
+# Gợi ý kết hợp: "giống sản phẩm này" (láng giềng theo embedding ảnh) + "thường được mua kèm"
+# (luật kết hợp theo danh mục con trong rules.json). Danh sách ứng viên được tính trước cho từng sản phẩm
+# và lưu thành bảng tra cứu .npz gọn; khi phục vụ chỉ cần đọc một dòng trong bộ nhớ rồi xếp hạng lại.
+#
+#   python recommendations.py --saved-dir saved_data --rules ../data/rules.json
+
+# Mặc định theo thư mục module và cùng biến môi trường với train_features (IMAGE_SAVED_DIR, RECOMMENDATIONS_FILE)
+# để bảng được ghi đúng nơi service Flask đọc, dù chạy từ thư mục nào
+SERVICE_DIR = os.path.dirname(os.path.abspath(__file__))
+RULES_FILE = os.path.join(SERVICE_DIR, '..', 'data', 'rules.json')
+SAVED_DIR = os.environ.get('IMAGE_SAVED_DIR', os.path.join(SERVICE_DIR, 'saved_data'))
+TABLE_FILE = os.environ.get('RECOMMENDATIONS_FILE', os.path.join(SAVED_DIR, 'recommendations.npz'))
+VISUAL_CANDIDATES = 20
+COMPLEMENT_SUBCATEGORIES = 4
+PRODUCTS_PER_SUBCATEGORY = 5
+BLOCK_SIZE = 1024
+
+def subcategory_slug(name):
+    """Tên danh mục con -> khóa dùng trong rules.json (bỏ dấu, khoảng trắng -> _), ví dụ "Điều hòa" -> "dieu_hoa"."""
+    return re.sub(r'\s+', '_', fold_diacritics(name).strip())
+
+def product_embeddings(product_info, product_ids):
+    """Trung bình các vector đặc trưng ảnh của mỗi sản phẩm, chuẩn hóa L2; sản phẩm không có ảnh là vector 0."""
+    dim = next((len(info['features_list'][0]) for info in product_info.values() if info.get('features_list')), 0)
+    embeddings = np.zeros((len(product_ids), dim), dtype=np.float32)
+    for row, product_id in enumerate(product_ids):
+        features = product_info.get(product_id, {}).get('features_list')
+        if features:
+            vector = np.mean(np.asarray(features, dtype=np.float32), axis=0)
+            norm = np.linalg.norm(vector)
+            if norm > 0:
+                embeddings[row] = vector / norm
+    return embeddings
+
+def visual_neighbours(embeddings, k=VISUAL_CANDIDATES, block_size=BLOCK_SIZE):
+    """Top-k láng giềng cosine của mỗi sản phẩm (không gồm chính nó), tính theo khối để giới hạn bộ nhớ."""
+    n = len(embeddings)
+    indices = np.full((n, k), -1, dtype=np.int32)
+    scores = np.zeros((n, k), dtype=np.float16)
+    has_embedding = np.linalg.norm(embeddings, axis=1) > 0
+    if n < 2 or not has_embedding.any():
+        return indices, scores
+    k_eff = min(k, n - 1)
+    for start in range(0, n, block_size):
+        block = embeddings[start:start + block_size] @ embeddings.T
+        block[:, ~has_embedding] = -np.inf
+        rows = np.arange(block.shape[0])
+        block[rows, start + rows] = -np.inf
+        top = np.argpartition(-block, k_eff - 1, axis=1)[:, :k_eff]
+        top_scores = np.take_along_axis(block, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        top = np.take_along_axis(top, order, axis=1)
+        top_scores = np.take_along_axis(top_scores, order, axis=1)
+        valid = np.isfinite(top_scores) & has_embedding[start:start + block_size, None]
+        indices[start:start + block_size, :k_eff] = np.where(valid, top, -1)
+        scores[start:start + block_size, :k_eff] = np.where(valid, top_scores, 0)
+    return indices, scores
+
+def complementary_subcategories(rules, top_n=COMPLEMENT_SUBCATEGORIES):
+    """slug -> [(slug mua kèm, điểm confidence * lift)] từ các luật có slug ở vế trái, lift > 1."""
+    best = defaultdict(dict)
+    for rule in rules:
+        if rule['lift'] <= 1.0:
+            continue
+        score = rule['confidence'] * rule['lift']
+        for antecedent in rule['antecedents']:
+            for consequent in rule['consequents']:
+                if consequent != antecedent and score > best[antecedent].get(consequent, 0):
+                    best[antecedent][consequent] = score
+    return {
+        slug: sorted(targets.items(), key=lambda item: -item[1])[:top_n]
+        for slug, targets in best.items()
+    }
+
+def complementary_products(products, slugs, complements, per_subcategory=PRODUCTS_PER_SUBCATEGORY):
+    """Với mỗi sản phẩm, chọn sản phẩm trong các danh mục con mua kèm: ưu tiên còn hàng, cùng thương hiệu,
+    giá gần nhất; trả về (indices, scores) kích thước (n, COMPLEMENT_SUBCATEGORIES * per_subcategory)."""
+    by_slug = defaultdict(list)
+    for row, slug in enumerate(slugs):
+        if slug:
+            by_slug[slug].append(row)
+    width = COMPLEMENT_SUBCATEGORIES * per_subcategory
+    indices = np.full((len(products), width), -1, dtype=np.int32)
+    scores = np.zeros((len(products), width), dtype=np.float16)
+    for row, product in enumerate(products):
+        column = 0
+        price = max(product.price or 0, 1)
+        for target_slug, rule_score in complements.get(slugs[row], []):
+            ranked = sorted(
+                by_slug.get(target_slug, []),
+                key=lambda other: (products[other].stock_quantity <= 0,
+                                   products[other].brand_id != product.brand_id,
+                                   abs(math.log(max(products[other].price or 0, 1) / price)))
+            )[:per_subcategory]
+            for other in ranked:
+                indices[row, column] = other
+                scores[row, column] = rule_score
+                column += 1
+    return indices, scores
+
+def build_recommendation_table(products, categories, product_info, rules, output_file=TABLE_FILE):
+    products = list(products)
+    product_ids = [product.id for product in products]
+    category_names = {category.id: category.name for category in categories}
+    slugs = [subcategory_slug(category_names[p.subcategory_id]) if p.subcategory_id in category_names else None
+             for p in products]
+
+    embeddings = product_embeddings(product_info, product_ids)
+    visual_idx, visual_score = visual_neighbours(embeddings)
+    complement_idx, complement_score = complementary_products(products, slugs, complementary_subcategories(rules))
+
+    os.makedirs(os.path.dirname(output_file) or '.', exist_ok=True)
+    np.savez_compressed(
+        output_file,
+        product_ids=np.array(product_ids),
+        in_stock=np.array([(p.stock_quantity or 0) > 0 for p in products]),
+        visual_idx=visual_idx, visual_score=visual_score,
+        complement_idx=complement_idx, complement_score=complement_score
+    )
+    covered = int((visual_idx[:, 0] >= 0).sum())
+    with_complements = int((complement_idx[:, 0] >= 0).sum())
+    print(f"Đã lưu bảng gợi ý cho {len(products)} sản phẩm vào {output_file} "
+          f"({covered} có láng giềng ảnh, {with_complements} có sản phẩm mua kèm)")
+
+class RecommendationTable:
+    """Bảng ứng viên đã tính trước; recommend() chỉ đọc một dòng và xếp hạng lại."""
+
+    def __init__(self, path=TABLE_FILE):
+        data = np.load(path)
+        self.product_ids = data['product_ids'].tolist()
+        self.row_of = {product_id: row for row, product_id in enumerate(self.product_ids)}
+        self.in_stock = data['in_stock']
+        self.visual_idx = data['visual_idx']
+        self.visual_score = data['visual_score'].astype(np.float32)
+        self.complement_idx = data['complement_idx']
+        self.complement_score = data['complement_score'].astype(np.float32)
+
+    def __contains__(self, product_id):
+        return product_id in self.row_of
+
+    def _candidates(self, indices, scores, exclude, top_k):
+        results = []
+        for idx, score in zip(indices, scores):
+            if idx < 0 or not self.in_stock[idx] or self.product_ids[idx] in exclude:
+                continue
+            exclude.add(self.product_ids[idx])
+            results.append((self.product_ids[idx], float(score)))
+            if len(results) >= top_k:
+                break
+        return results
+
+    def recommend(self, product_id, top_k=5, visual_weight=0.5):
+        """Trả về dict similar / complementary / combined, mỗi phần là list (product_id, điểm).
+
+        combined xếp hạng lại hai danh sách theo visual_weight * similarity + (1 - visual_weight) * điểm luật
+        (điểm luật chuẩn hóa theo giá trị lớn nhất của dòng).
+        """
+        row = self.row_of.get(product_id)
+        if row is None:
+            return None
+        exclude = {product_id}
+        similar = self._candidates(self.visual_idx[row], self.visual_score[row], exclude, top_k)
+        complementary = self._candidates(self.complement_idx[row], self.complement_score[row], exclude, top_k)
+        max_rule = max((score for _, score in complementary), default=0) or 1.0
+        combined = sorted(
+            [(pid, visual_weight * score) for pid, score in similar] +
+            [(pid, (1 - visual_weight) * score / max_rule) for pid, score in complementary],
+            key=lambda item: -item[1]
+        )[:top_k]
+        return {'similar': similar, 'complementary': complementary, 'combined': combined}
+
+def main(argv=None):
+    from catalog import PRODUCTS_FILE, CATEGORIES_FILE, iter_products, iter_categories
+
+    parser = argparse.ArgumentParser(description="Tính trước bảng gợi ý ảnh + luật kết hợp cho từng sản phẩm")
+    parser.add_argument('--saved-dir', default=SAVED_DIR, help="Thư mục chứa product_info.pkl của index ảnh")
+    parser.add_argument('--rules', default=RULES_FILE)
+    parser.add_argument('--products', default=PRODUCTS_FILE)
+    parser.add_argument('--categories', default=CATEGORIES_FILE)
+    parser.add_argument('--output', default=TABLE_FILE)
+    args = parser.parse_args(argv)
+
+    product_info = {}
+    info_file = os.path.join(args.saved_dir, 'product_info.pkl')
+    try:
+        with open(info_file, 'rb') as f:
+            product_info = pickle.load(f)
+    except Exception as e:
+        print(f"Không đọc được {info_file}, bảng chỉ có gợi ý mua kèm: {str(e)}")
+    with open(args.rules, 'r', encoding='utf-8') as f:
+        rules = json.load(f)
+
+    build_recommendation_table(iter_products(args.products), list(iter_categories(args.categories)),
+                               product_info, rules, args.output)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,303 @@
+import argparse
+import os
+import pickle
+import sys
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import Process
+from multiprocessing.connection import Client, Listener
+
+import numpy as np
+from sklearn.neighbors import NearestNeighbors
+
+# Index ảnh chia thành N shard (theo hash product_id hoặc theo danh mục), mỗi shard do một tiến trình worker
+# phục vụ qua multiprocessing.connection (TCP, có authkey) nên có thể chạy trên nhiều máy.
+# ShardedIndex là coordinator: gửi vector truy vấn tới mọi shard song song rồi trộn top-k; có cùng giao diện
+# kneighbors với NearestNeighbors nên dùng thay trực tiếp cho nbrs trong find_similar_images.
+# Nếu index đã nén (EMBEDDING_COMPONENTS), features_list trong product_info là vector đã chiếu: truyền compressor
+# để coordinator chiếu vector truy vấn trước khi gửi đi.
+#
+# multiprocessing.connection unpickle dữ liệu nhận được nên authkey là bắt buộc: đặt cùng một giá trị bí mật
+# SHARD_AUTHKEY cho coordinator và mọi worker; worker mặc định chỉ lắng nghe trên 127.0.0.1.
+#
+#   python sharded_index.py split --saved-dir saved_data --shards 4 --by category --output-dir shards
+#   SHARD_AUTHKEY=... python sharded_index.py serve --shard-file shards/shard_0.npz --host 10.0.0.5 --port 6001
+#   python sharded_index.py local --shard-dir shards --base-port 6001            # chạy thử mọi shard trên một máy
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_TIMEOUT = 10.0
+# Mặc định theo thư mục module (cùng IMAGE_SAVED_DIR với train_features), không phụ thuộc thư mục đang chạy
+SERVICE_DIR = os.path.dirname(os.path.abspath(__file__))
+SAVED_DIR = os.environ.get('IMAGE_SAVED_DIR', os.path.join(SERVICE_DIR, 'saved_data'))
+SHARD_DIR = os.path.join(SERVICE_DIR, 'shards')
+
+def shard_authkey():
+    """Khóa xác thực từ biến môi trường SHARD_AUTHKEY; không có giá trị mặc định."""
+    authkey = os.environ.get('SHARD_AUTHKEY')
+    if not authkey:
+        raise RuntimeError("Chưa đặt biến môi trường SHARD_AUTHKEY (khóa bí mật dùng chung cho coordinator và các shard)")
+    return authkey.encode('utf-8')
+
+def shard_of_product(product_id, n_shards):
+    return zlib.crc32(product_id.encode('utf-8')) % n_shards
+
+def assign_shards(row_products, product_info, n_shards, by='hash'):
+    """Trả về mảng shard cho từng dòng index.
+
+    by='hash': theo crc32(product_id); by='category': mỗi danh mục nằm trọn trong một shard,
+    danh mục lớn được xếp trước vào shard đang ít dòng nhất để các shard cân bằng.
+    """
+    if by == 'hash':
+        return np.array([shard_of_product(product_id, n_shards) for product_id in row_products], dtype=np.int32)
+    if by != 'category':
+        raise ValueError(f"Cách chia shard không hợp lệ: {by}")
+    sizes = {}
+    for product_id in row_products:
+        category = product_info[product_id].get('category')
+        sizes[category] = sizes.get(category, 0) + 1
+    loads = [0] * n_shards
+    category_shard = {}
+    for category, size in sorted(sizes.items(), key=lambda item: -item[1]):
+        shard = loads.index(min(loads))
+        category_shard[category] = shard
+        loads[shard] += size
+    return np.array([category_shard[product_info[product_id].get('category')] for product_id in row_products],
+                    dtype=np.int32)
+
+def rows_from_product_info(paths_list, product_info):
+    """Dựng lại ma trận đặc trưng theo thứ tự paths_list từ product_info; trả về (features_matrix, row_products)."""
+    row_of = {path: row for row, path in enumerate(paths_list)}
+    features = [None] * len(paths_list)
+    row_products = [None] * len(paths_list)
+    for product_id, info in product_info.items():
+        for path, vector in zip(info.get('image_paths', []), info.get('features_list', [])):
+            row = row_of.get(path)
+            if row is not None:
+                features[row] = vector
+                row_products[row] = product_id
+    missing = [row for row, vector in enumerate(features) if vector is None]
+    if missing:
+        raise ValueError(f"{len(missing)} dòng index không có vector trong product_info")
+    return np.asarray(features, dtype=np.float32), row_products
+
+def split_index(features_matrix, row_products, product_info, n_shards, output_dir, by='hash'):
+    """Ghi mỗi shard ra output_dir/shard_<i>.npz gồm vector và chỉ số dòng toàn cục."""
+    os.makedirs(output_dir, exist_ok=True)
+    shards = assign_shards(row_products, product_info, n_shards, by)
+    files = []
+    for shard in range(n_shards):
+        rows = np.flatnonzero(shards == shard)
+        file_path = os.path.join(output_dir, f"shard_{shard}.npz")
+        np.savez(file_path, features=features_matrix[rows], global_ids=rows.astype(np.int64))
+        files.append(file_path)
+        print(f"Shard {shard}: {len(rows)} ảnh -> {file_path}")
+    return files
+
+class ShardWorker:
+    """Một shard: NearestNeighbors cosine trên phần index của shard, trả về chỉ số dòng toàn cục."""
+
+    def __init__(self, shard_file):
+        data = np.load(shard_file)
+        self.global_ids = data['global_ids']
+        self.nbrs = None
+        if len(self.global_ids):
+            self.nbrs = NearestNeighbors(n_neighbors=min(20, len(self.global_ids)), algorithm='brute',
+                                         metric='cosine').fit(data['features'])
+
+    def search(self, queries, k):
+        if self.nbrs is None:
+            return np.empty((len(queries), 0)), np.empty((len(queries), 0), dtype=np.int64)
+        distances, indices = self.nbrs.kneighbors(queries, n_neighbors=min(k, len(self.global_ids)))
+        return distances, self.global_ids[indices]
+
+def handle_connection(worker, conn):
+    with conn:
+        while True:
+            try:
+                message = conn.recv()
+            except EOFError:
+                return
+            command = message[0]
+            if command == 'search':
+                _, queries, k = message
+                try:
+                    conn.send(('ok', worker.search(np.asarray(queries, dtype=np.float32), k)))
+                except Exception as e:
+                    conn.send(('error', str(e)))
+            elif command == 'ping':
+                conn.send(('ok', len(worker.global_ids)))
+            elif command == 'close':
+                return
+
+def serve_shard(shard_file, host=DEFAULT_HOST, port=6001, authkey=None):
+    """Chạy worker cho một shard; mỗi kết nối của coordinator được phục vụ trên một luồng riêng."""
+    authkey = authkey or shard_authkey()
+    worker = ShardWorker(shard_file)
+    with Listener((host, port), authkey=authkey) as listener:
+        print(f"Shard {shard_file} ({len(worker.global_ids)} ảnh) đang lắng nghe tại {host}:{port}")
+        while True:
+            try:
+                conn = listener.accept()
+            except Exception as e:
+                print(f"Lỗi khi nhận kết nối: {str(e)}")
+                continue
+            threading.Thread(target=handle_connection, args=(worker, conn), daemon=True).start()
+
+class ShardedIndex:
+    """Coordinator scatter-gather; addresses là danh sách (host, port) của các worker."""
+
+    def __init__(self, addresses, authkey=None, n_neighbors=20, timeout=DEFAULT_TIMEOUT, compressor=None):
+        self.addresses = [tuple(address) for address in addresses]
+        self.compressor = compressor
+        self.authkey = authkey or shard_authkey()
+        self.n_neighbors = n_neighbors
+        self.timeout = timeout
+        self.connections = [None] * len(self.addresses)
+        self.locks = [threading.Lock() for _ in self.addresses]
+        self.executor = ThreadPoolExecutor(max_workers=len(self.addresses))
+
+    def _query_shard(self, shard, queries, k):
+        # Mỗi shard giữ một kết nối; khóa để các request đồng thời không chen nhau trên cùng kết nối
+        with self.locks[shard]:
+            try:
+                if self.connections[shard] is None:
+                    self.connections[shard] = Client(self.addresses[shard], authkey=self.authkey)
+                conn = self.connections[shard]
+                conn.send(('search', queries, k))
+                if not conn.poll(self.timeout):
+                    raise TimeoutError(f"quá {self.timeout}s")
+                status, payload = conn.recv()
+                if status != 'ok':
+                    raise RuntimeError(payload)
+                return payload
+            except Exception as e:
+                print(f"Lỗi khi truy vấn shard {shard} tại {self.addresses[shard]}: {str(e)}")
+                if self.connections[shard] is not None:
+                    self.connections[shard].close()
+                    self.connections[shard] = None
+                return None
+
+    def kneighbors(self, X, n_neighbors=None):
+        """Top-k toàn cục: mỗi shard trả về top-k của nó, coordinator trộn theo khoảng cách.
+
+        Shard lỗi hoặc quá thời gian bị bỏ qua (kết quả có thể thiếu phần của shard đó).
+        """
+        k = n_neighbors or self.n_neighbors
+        queries = np.asarray(X, dtype=np.float32)
+        if self.compressor is not None:
+            queries = self.compressor.project(queries)
+        futures = [self.executor.submit(self._query_shard, shard, queries, k) for shard in range(len(self.addresses))]
+        results = [future.result() for future in futures]
+        results = [result for result in results if result is not None and result[1].shape[1]]
+        if not results:
+            raise RuntimeError("Không có shard nào trả về kết quả")
+        distances = np.concatenate([result[0] for result in results], axis=1)
+        indices = np.concatenate([result[1] for result in results], axis=1)
+        order = np.argsort(distances, axis=1, kind='stable')[:, :k]
+        return np.take_along_axis(distances, order, axis=1), np.take_along_axis(indices, order, axis=1)
+
+    def close(self):
+        for shard, conn in enumerate(self.connections):
+            if conn is not None:
+                try:
+                    conn.send(('close',))
+                except OSError:
+                    pass
+                conn.close()
+                self.connections[shard] = None
+        self.executor.shutdown(wait=False)
+
+def wait_for_shards(addresses, authkey, timeout=30.0):
+    deadline = time.time() + timeout
+    for address in addresses:
+        while True:
+            try:
+                with Client(tuple(address), authkey=authkey) as conn:
+                    conn.send(('ping',))
+                    conn.recv()
+                break
+            except (ConnectionRefusedError, OSError):
+                if time.time() > deadline:
+                    raise TimeoutError(f"Shard tại {address} không phản hồi")
+                time.sleep(0.2)
+
+def start_local_shards(shard_files, authkey, host=DEFAULT_HOST, base_port=6001):
+    """Chạy mỗi shard trong một tiến trình trên máy hiện tại; trả về (processes, addresses)."""
+    processes, addresses = [], []
+    for i, shard_file in enumerate(shard_files):
+        address = (host, base_port + i)
+        process = Process(target=serve_shard, args=(shard_file, host, address[1], authkey), daemon=True)
+        process.start()
+        processes.append(process)
+        addresses.append(address)
+    wait_for_shards(addresses, authkey)
+    return processes, addresses
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Index ảnh chia shard với truy vấn scatter-gather")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    split_parser = subparsers.add_parser('split', help="Chia index đã lưu thành các shard")
+    split_parser.add_argument('--saved-dir', default=SAVED_DIR)
+    split_parser.add_argument('--shards', type=int, default=4)
+    split_parser.add_argument('--by', choices=['hash', 'category'], default='hash')
+    split_parser.add_argument('--output-dir', default=SHARD_DIR)
+
+    serve_parser = subparsers.add_parser('serve', help="Chạy worker cho một shard")
+    serve_parser.add_argument('--shard-file', required=True)
+    serve_parser.add_argument('--host', default=DEFAULT_HOST,
+                              help="Địa chỉ lắng nghe; chỉ mở ra mạng ngoài (0.0.0.0) khi cổng được tường lửa bảo vệ")
+    serve_parser.add_argument('--port', type=int, default=6001)
+
+    local_parser = subparsers.add_parser('local', help="Chạy mọi shard trên máy này và kiểm tra với index gốc")
+    local_parser.add_argument('--shard-dir', default=SHARD_DIR)
+    local_parser.add_argument('--saved-dir', default=SAVED_DIR)
+    local_parser.add_argument('--base-port', type=int, default=6001)
+    local_parser.add_argument('--queries', type=int, default=100)
+    args = parser.parse_args(argv)
+
+    if args.command == 'serve':
+        try:
+            authkey = shard_authkey()
+        except RuntimeError as e:
+            sys.exit(str(e))
+        serve_shard(args.shard_file, args.host, args.port, authkey)
+        return
+
+    with open(os.path.join(args.saved_dir, 'paths_list.pkl'), 'rb') as f:
+        paths_list = pickle.load(f)
+    with open(os.path.join(args.saved_dir, 'product_info.pkl'), 'rb') as f:
+        product_info = pickle.load(f)
+    features_matrix, row_products = rows_from_product_info(paths_list, product_info)
+
+    if args.command == 'split':
+        split_index(features_matrix, row_products, product_info, args.shards, args.output_dir, args.by)
+        return
+
+    shard_files = sorted(os.path.join(args.shard_dir, name) for name in os.listdir(args.shard_dir)
+                         if name.startswith('shard_') and name.endswith('.npz'))
+    # Chạy thử trên một máy: coordinator và worker cùng tiến trình cha nên dùng khóa ngẫu nhiên nếu chưa đặt
+    authkey = os.environ.get('SHARD_AUTHKEY', '').encode('utf-8') or os.urandom(32)
+    processes, addresses = start_local_shards(shard_files, authkey, base_port=args.base_port)
+    try:
+        index = ShardedIndex(addresses, authkey)
+        reference = NearestNeighbors(n_neighbors=min(20, len(features_matrix)), algorithm='brute',
+                                     metric='cosine').fit(features_matrix)
+        queries = features_matrix[np.random.default_rng(0).choice(len(features_matrix),
+                                                                  min(args.queries, len(features_matrix)), replace=False)]
+        start_time = time.perf_counter()
+        sharded_distances, _ = index.kneighbors(queries, n_neighbors=10)
+        elapsed = time.perf_counter() - start_time
+        reference_distances, _ = reference.kneighbors(queries, n_neighbors=10)
+        same = np.allclose(sharded_distances, reference_distances, atol=1e-5)
+        print(f"{len(shard_files)} shard, {len(queries)} truy vấn trong {elapsed * 1000:.1f} ms; "
+              f"khớp với index một tiến trình: {same}")
+        index.close()
+    finally:
+        for process in processes:
+            process.terminate()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,181 @@
+import math
+import os
+import re
+import sys
+import heapq
+import threading
+import unicodedata
+from collections import Counter, defaultdict
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data'))
+
+# Index văn bản BM25 trong bộ nhớ trên p_name, p_description, p_specifications.
+# Từ được bỏ dấu tiếng Việt (NFKD như clean_filename, thêm đ -> d) nên "noi com dien" khớp "Nồi cơm điện".
+# Index cập nhật tăng dần bằng add_product / remove_product, không cần build lại toàn bộ.
+# Flask chạy đa luồng: mọi thao tác đọc/ghi đi qua self.lock nên cập nhật không xen vào giữa một lượt tìm kiếm.
+
+FIELD_WEIGHTS = {'name': 3.0, 'specifications': 1.5, 'description': 1.0}
+BM25_K1 = 1.2
+BM25_B = 0.75
+TOKEN_PATTERN = re.compile(r'[a-z0-9]+')
+
+def fold_diacritics(text):
+    """Bỏ dấu tiếng Việt và chuyển về chữ thường."""
+    text = text.lower().replace('đ', 'd')
+    return unicodedata.normalize('NFKD', text).encode('ASCII', 'ignore').decode('ASCII')
+
+def tokenize(text):
+    if not text:
+        return []
+    return TOKEN_PATTERN.findall(fold_diacritics(str(text)))
+
+def product_fields(product):
+    """Lấy (id, name, description, specifications, images, price) từ record catalog hoặc document MongoDB."""
+    if isinstance(product, dict):
+        specs = product.get('p_specifications') or []
+        return (str(product['_id']), product.get('p_name', ''), product.get('p_description', ''),
+                [(spec.get('key'), spec.get('value')) for spec in specs if isinstance(spec, dict)],
+                product.get('p_images', []), product.get('p_price', 0))
+    return (product.id, product.name, product.description, product.specifications,
+            list(product.images), product.price)
+
+class TextIndex:
+    def __init__(self, field_weights=FIELD_WEIGHTS, k1=BM25_K1, b=BM25_B):
+        self.field_weights = field_weights
+        self.k1 = k1
+        self.b = b
+        self.postings = defaultdict(dict)  # term -> {product_id: tf có trọng số theo trường}
+        self.doc_lengths = {}
+        self.total_length = 0.0
+        self.documents = {}
+        self.image_owner = {}  # tên file ảnh (chữ thường) -> product_id
+        # tên sản phẩm đã bỏ dấu, tách từ -> {product_id: None} theo thứ tự thêm (nhiều sản phẩm có thể trùng tên)
+        self.name_owners = defaultdict(dict)
+        self.lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.documents)
+
+    def add_product(self, product):
+        """Thêm hoặc cập nhật một sản phẩm (record catalog hoặc document MongoDB)."""
+        product_id, name, description, specifications, images, price = product_fields(product)
+        with self.lock:
+            self._add(product_id, name, description, specifications, images, price)
+
+    def _add(self, product_id, name, description, specifications, images, price):
+        if product_id in self.documents:
+            self._remove(product_id)
+
+        spec_text = ' '.join(f"{key} {value}" for key, value in specifications)
+        term_freqs = Counter()
+        for field, text in (('name', name), ('description', description), ('specifications', spec_text)):
+            weight = self.field_weights[field]
+            for token in tokenize(text):
+                term_freqs[token] += weight
+        for term, tf in term_freqs.items():
+            self.postings[term][product_id] = tf
+        length = sum(term_freqs.values())
+        self.doc_lengths[product_id] = length
+        self.total_length += length
+        name_key = ' '.join(tokenize(name))
+        self.documents[product_id] = {'id': product_id, 'name': name, 'images': images, 'price': price,
+                                      'terms': tuple(term_freqs), 'name_key': name_key}
+        for image in images:
+            self.image_owner[os.path.basename(image).lower()] = product_id
+        if name_key:
+            self.name_owners[name_key][product_id] = None
+
+    def remove_product(self, product_id):
+        with self.lock:
+            self._remove(product_id)
+
+    def _remove(self, product_id):
+        document = self.documents.pop(product_id, None)
+        if document is None:
+            return
+        for term in document['terms']:
+            postings = self.postings[term]
+            postings.pop(product_id, None)
+            if not postings:
+                del self.postings[term]
+        self.total_length -= self.doc_lengths.pop(product_id)
+        for image in document['images']:
+            if self.image_owner.get(os.path.basename(image).lower()) == product_id:
+                del self.image_owner[os.path.basename(image).lower()]
+        owners = self.name_owners.get(document['name_key'])
+        if owners is not None:
+            owners.pop(product_id, None)
+            if not owners:
+                del self.name_owners[document['name_key']]
+
+    def get_document(self, product_id):
+        """Bản sao thông tin hiển thị (id, name, images, price) của sản phẩm, None nếu không có trong index."""
+        with self.lock:
+            document = self.documents.get(product_id)
+            if document is None:
+                return None
+            return {key: document[key] for key in ('id', 'name', 'images', 'price')}
+
+    def search(self, query, top_k=10):
+        """Trả về danh sách (product_id, điểm BM25) giảm dần theo điểm."""
+        with self.lock:
+            return self._search(query, top_k)
+
+    def _search(self, query, top_k):
+        n_docs = len(self.documents)
+        if not n_docs:
+            return []
+        avg_length = self.total_length / n_docs or 1.0
+        scores = defaultdict(float)
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+            for product_id, tf in postings.items():
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[product_id] / avg_length)
+                scores[product_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+        return heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
+
+    def find_by_image(self, image_path):
+        """product_id sở hữu ảnh có cùng tên file (không phân biệt hoa thường), None nếu không có."""
+        with self.lock:
+            return self.image_owner.get(os.path.basename(image_path).lower())
+
+    def find_by_name(self, name):
+        """product_id có tên (đã bỏ dấu) trùng name, hoặc chứa nguyên cụm từ name như $regex trên p_name;
+        None nếu không có. Chỉ xét trường tên, không dùng điểm BM25 của mô tả / thông số."""
+        key = ' '.join(tokenize(name))
+        if not key:
+            return None
+        with self.lock:
+            return self._find_by_name(key)
+
+    def _find_by_name(self, key):
+        if key in self.name_owners:
+            return next(iter(self.name_owners[key]))
+        postings = [self.postings.get(term) for term in set(key.split())]
+        if not all(postings):
+            return None
+        candidates = set.intersection(*(set(p) for p in postings))
+        matches = [product_id for product_id in candidates
+                   if f" {key} " in f" {self.documents[product_id]['name_key']} "]
+        # Nhiều sản phẩm khớp thì chọn tên ngắn nhất (gần với cụm tìm kiếm nhất)
+        return min(matches, key=lambda product_id: (len(self.documents[product_id]['name_key']), product_id),
+                   default=None)
+
+def build_text_index(products):
+    index = TextIndex()
+    for product in products:
+        index.add_product(product)
+    return index
+
+def build_text_index_from_catalog(products_file=None):
+    """Dựng index từ file dump ecommerce.products.json (đọc streaming qua catalog)."""
+    from catalog import PRODUCTS_FILE, iter_products
+    return build_text_index(iter_products(products_file or PRODUCTS_FILE))
+
+def build_text_index_from_mongo(products_collection):
+    return build_text_index(products_collection.find({}, {
+        'p_name': 1, 'p_description': 1, 'p_specifications': 1, 'p_images': 1, 'p_price': 1
+    }))
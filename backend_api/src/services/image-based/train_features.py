@@ -1,9 +1,14 @@
 from flask import Flask, request, jsonify
+import base64
+import hashlib
+import hmac
+import json
 import os
 import numpy as np
 import re
 import pickle
 import time
+import threading
 from pymongo import MongoClient
 from PIL import Image
 import tensorflow as tf
@@ -15,9 +20,41 @@ import uuid
 from io import BytesIO
 from bson.objectid import ObjectId
 from bson import json_util
+from text_index import build_text_index_from_mongo, build_text_index_from_catalog
+from recommendations import RecommendationTable
+from embedding_compression import EmbeddingCompressor, CompressedIndex, quality_report, print_quality_report
+from sharded_index import ShardedIndex
+from image_dedup import DEFAULT_MAX_DISTANCE as DEDUP_MAX_DISTANCE, list_images, group_near_duplicates
 
 app = Flask(__name__)
 
+# Nén index ảnh (tùy chọn): số chiều PCA (None để giữ 1792 chiều gốc) và lượng tử hóa int8
+EMBEDDING_COMPONENTS = None
+EMBEDDING_QUANTIZE = False
+
+# Index chia shard (tùy chọn): danh sách (host, port) của các worker sharded_index.py serve;
+# None để tìm kiếm trong tiến trình Flask như cũ
+SHARD_ADDRESSES = None
+
+# Đường dẫn và kết nối, đổi được qua biến môi trường (offline_jobs.py index features nhận tham số tương ứng)
+SERVICE_DIR = os.path.dirname(os.path.abspath(__file__))
+IMAGE_FOLDER = os.environ.get('IMAGE_FOLDER', os.path.join(SERVICE_DIR, 'Ảnh sản phẩm'))
+SAVED_DIR = os.environ.get('IMAGE_SAVED_DIR', os.path.join(SERVICE_DIR, 'saved_data'))
+MONGO_URI = os.environ.get('MONGO_URI', "mongodb://localhost:27017/")
+
+# Thư mục chứa file của URL /uploads/product/... (ảnh sản phẩm và ảnh dẫn xuất do import_mongodb tạo)
+PRODUCT_UPLOAD_DIR = os.environ.get(
+    'PRODUCT_UPLOAD_DIR',
+    os.path.join(SERVICE_DIR, '..', '..', 'uploads', 'product')
+)
+PRODUCT_UPLOAD_PREFIX = '/uploads/product/'
+
+# Bảng gợi ý do recommendations.py tạo
+RECOMMENDATIONS_FILE = os.environ.get('RECOMMENDATIONS_FILE', os.path.join(SAVED_DIR, 'recommendations.npz'))
+
+# Khóa ký JWT của backend Node (JWT_SECRET trong backend_api/.env); chưa đặt thì các endpoint ghi bị tắt
+JWT_SECRET = os.environ.get('JWT_SECRET')
+
 # Khởi tạo mô hình
 def init_feature_extractor():
     try:
@@ -92,7 +129,7 @@ def normalize_image_path(img_path):
             print(f"Normalized URL path: {result}")
             return f"/uploads/product/{result}"
         
-        base_dir = r"E:\ThucTapThucTe\Model\image-based\Ảnh sản phẩm"
+        base_dir = IMAGE_FOLDER
         if img_path.startswith(base_dir):
             result = img_path[len(base_dir):].lstrip(os.sep).replace('\\', '/')
             print(f"Normalized local path: {result}")
@@ -109,9 +146,9 @@ def normalize_product_name(image_name):
     """Chuẩn hóa tên sản phẩm từ tên tệp ảnh."""
     return re.sub(r'\s+\d+\.(png|jpg|jpeg|webp)$', '', image_name, flags=re.IGNORECASE)
 
-def get_mongo_client():
+def get_mongo_client(mongo_uri=None):
     try:
-        client = MongoClient("mongodb://localhost:27017/")
+        client = MongoClient(mongo_uri or MONGO_URI)
         client.admin.command('ping')
         print("Kết nối MongoDB thành công")
         return client
@@ -119,86 +156,163 @@ def get_mongo_client():
         print(f"Lỗi kết nối MongoDB: {str(e)}")
         raise
 
-def build_feature_database(model, image_folder):
+def find_product_for_image(products_collection, img_path):
+    normalized_path = normalize_image_path(img_path)
+    product_name = normalize_product_name(normalized_path)
+    print(f"normalized_path: {normalized_path}, product_name: {product_name}")
+    
+    product = products_collection.find_one({
+        "p_images": {"$regex": re.escape(os.path.basename(normalized_path)), "$options": "i"}
+    })
+    if not product:
+        print(f"Không tìm thấy sản phẩm cho ảnh: {img_path}")
+        product = products_collection.find_one({
+            "p_name": {"$regex": re.escape(product_name), "$options": "i"}
+        })
+    return product
+
+def index_image_path(product, img_path, upload_dir=PRODUCT_UPLOAD_DIR):
+    """Ảnh dẫn xuất 380x380 ("index" trong p_image_derivatives) của img_path nếu có trên đĩa, ngược lại img_path.
+
+    Không ghép theo vị trí trong p_images: khi sửa sản phẩm p_images có thể bị xóa/đổi thứ tự, nên chỉ nhận bản
+    dẫn xuất có tên file (bỏ đuôi) trùng với img_path và không cũ hơn ảnh gốc.
+    """
+    if not product:
+        return img_path
+    name = os.path.basename(img_path).lower()
+    if not any(os.path.basename(image_url).lower() == name for image_url in product.get('p_images', [])):
+        return img_path
+    stem = os.path.splitext(name)[0]
+    for derivatives in product.get('p_image_derivatives') or []:
+        index_url = (derivatives or {}).get('index')
+        if not index_url or not index_url.startswith(PRODUCT_UPLOAD_PREFIX):
+            continue
+        if os.path.splitext(os.path.basename(index_url))[0].lower() != stem:
+            continue
+        derivative = os.path.join(upload_dir, *index_url[len(PRODUCT_UPLOAD_PREFIX):].split('/'))
+        if os.path.exists(derivative) and os.path.getmtime(derivative) >= os.path.getmtime(img_path):
+            return derivative
+    return img_path
+
+def build_feature_database(model, image_folder, dedup_max_distance=DEDUP_MAX_DISTANCE,
+                           n_components=EMBEDDING_COMPONENTS, quantize=EMBEDDING_QUANTIZE, mongo_uri=None):
+    """Xây index đặc trưng; ảnh gần trùng (perceptual hash) được gom nhóm trước khi trích xuất đặc trưng.
+
+    Mỗi nhóm chỉ chạy EfficientNetB4 một lần. Các ảnh trong nhóm thuộc cùng một sản phẩm chỉ giữ một dòng index;
+    ảnh dùng chung giữa các sản phẩm khác nhau vẫn có dòng riêng nhưng dùng lại đặc trưng của nhóm.
+    dedup_max_distance=None để tắt bước gom nhóm.
+    Ảnh có bản dẫn xuất 380x380 (p_image_derivatives) được đọc từ bản dẫn xuất thay cho ảnh gốc.
+    n_components / quantize: chiếu PCA (whitening) và lượng tử hóa int8 ma trận index (None / False để giữ vector gốc);
+    khi bật, features_list trong product_info lưu vector đã chiếu thay cho vector gốc 1792 chiều.
+    mongo_uri: MongoDB chứa collection products (mặc định MONGO_URI).
+    """
     features_list = []
     paths_list = []
+    row_products = []
     product_info = {}
     try:
-        client = get_mongo_client()
+        client = get_mongo_client(mongo_uri)
         db = client["ecommerce"]
         products_collection = db["products"]
         
-        image_count = 0
-        for root, _, files in os.walk(image_folder):
-            current_label = os.path.basename(root)
-            for file in files:
-                if file.lower().endswith(('.png', '.jpg', '.jpeg', '.webp')):
-                    image_count += 1
-                    img_path = os.path.join(root, file)
-                    print(f"Xử lý ảnh: {img_path}")
-                    img_array = preprocess_image(img_path)
-                    if img_array is None:
-                        print(f"Bỏ qua ảnh: {img_path}")
-                        continue
-                    
+        img_paths = list_images(image_folder)
+        image_count = len(img_paths)
+        if dedup_max_distance is None:
+            groups = {img_path: [img_path] for img_path in img_paths}
+        else:
+            groups = group_near_duplicates(img_paths, dedup_max_distance)
+        
+        embedded_count = 0
+        for representative, members in groups.items():
+            matched = []
+            for img_path in members:
+                product = find_product_for_image(products_collection, img_path)
+                if not product:
+                    print(f"Vẫn không tìm thấy sản phẩm cho ảnh: {img_path}")
+                    continue
+                matched.append((img_path, product))
+            if not matched:
+                continue
+            
+            # Ảnh đại diện lỗi thì lần lượt thử các ảnh khác trong nhóm; ảnh lỗi không có dòng index
+            features = None
+            failed = set()
+            products_by_path = dict(matched)
+            for candidate in [representative] + [img_path for img_path in members if img_path != representative]:
+                source = index_image_path(products_by_path.get(candidate), candidate)
+                print(f"Xử lý ảnh: {source}")
+                img_array = preprocess_image(source)
+                if img_array is not None:
                     features = extract_features(model, img_array)
-                    if features is None:
-                        print(f"Bỏ qua ảnh do lỗi trích xuất đặc trưng: {img_path}")
-                        continue
-                    
-                    features_list.append(features)
-                    paths_list.append(img_path)
-                    
-                    normalized_path = normalize_image_path(img_path)
-                    product_name = normalize_product_name(normalized_path)
-                    print(f"normalized_path: {normalized_path}, product_name: {product_name}")
-                    
-                    product = products_collection.find_one({
-                        "p_images": {"$regex": re.escape(os.path.basename(normalized_path)), "$options": "i"}
-                    })
-                    if not product:
-                        print(f"Không tìm thấy sản phẩm cho ảnh: {img_path}")
-                        product = products_collection.find_one({
-                            "p_name": {"$regex": re.escape(product_name), "$options": "i"}
-                        })
-                    
-                    if not product:
-                        print(f"Vẫn không tìm thấy sản phẩm cho ảnh: {img_path}")
-                        continue
-                    
-                    product_id = str(product['_id'])
-                    print(f"Tìm thấy sản phẩm với ID: {product_id}")
-                    
-                    if product_id not in product_info:
-                        product_info[product_id] = {
-                            'product_id': product_id,
-                            'name': product['p_name'],
-                            'images': product.get('p_images', []),
-                            'price': product.get('p_price', 0),
-                            'stock_quantity': product.get('p_stock_quantity', 0),
-                            'description': product.get('p_description', ''),
-                            'specifications': product.get('p_specifications', []),
-                            'category': str(product.get('p_category', None)),
-                            'subcategory': str(product.get('p_subcategory', None)),
-                            'brand': str(product.get('p_brand', None)),
-                            'label': current_label,
-                            'image_paths': [],
-                            'features_list': []
-                        }
-                        print(f"Khởi tạo product_id: {product_id}")
-                    
-                    product_info[product_id]['image_paths'].append(img_path)
-                    product_info[product_id]['features_list'].append(features.tolist())
-                    print(f"Thêm ảnh {normalized_path} vào product_id: {product_id}")
+                if features is not None:
+                    break
+                print(f"Lỗi xử lý ảnh {candidate}, thử ảnh khác trong nhóm")
+                failed.add(candidate)
+            if features is None:
+                print(f"Bỏ qua nhóm ảnh: {representative}")
+                continue
+            embedded_count += 1
+            
+            indexed_products = set()
+            for img_path, product in matched:
+                if img_path in failed:
+                    continue
+                product_id = str(product['_id'])
+                print(f"Tìm thấy sản phẩm với ID: {product_id}")
+                if product_id in indexed_products:
+                    print(f"Bỏ qua ảnh gần trùng {img_path} (đại diện: {representative})")
+                    continue
+                
+                indexed_products.add(product_id)
+                features_list.append(features)
+                paths_list.append(img_path)
+                row_products.append(product_id)
+                
+                if product_id not in product_info:
+                    product_info[product_id] = {
+                        'product_id': product_id,
+                        'name': product['p_name'],
+                        'images': product.get('p_images', []),
+                        'price': product.get('p_price', 0),
+                        'stock_quantity': product.get('p_stock_quantity', 0),
+                        'description': product.get('p_description', ''),
+                        'specifications': product.get('p_specifications', []),
+                        'category': str(product.get('p_category', None)),
+                        'subcategory': str(product.get('p_subcategory', None)),
+                        'brand': str(product.get('p_brand', None)),
+                        'label': os.path.basename(os.path.dirname(img_path)),
+                        'image_paths': [],
+                        'features_list': []
+                    }
+                    print(f"Khởi tạo product_id: {product_id}")
+                
+                product_info[product_id]['image_paths'].append(img_path)
+                product_info[product_id]['features_list'].append(features.tolist())
+                print(f"Thêm ảnh {img_path} vào product_id: {product_id}")
         
-        print(f"Tìm thấy {image_count} ảnh trong thư mục")
+        print(f"Tìm thấy {image_count} ảnh trong thư mục, trích xuất đặc trưng {embedded_count} ảnh, "
+              f"index có {len(features_list)} dòng")
         if not features_list:
             print("Không có ảnh nào được xử lý thành công")
             return None, None, None
         
         features_matrix = np.array(features_list)
         print(f"Kích thước features_matrix: {features_matrix.shape}")
-        nbrs = NearestNeighbors(n_neighbors=min(20, len(features_list)), algorithm='brute', metric='cosine').fit(features_matrix)
+        if not n_components and not quantize:
+            nbrs = NearestNeighbors(n_neighbors=min(20, len(features_list)), algorithm='brute', metric='cosine').fit(features_matrix)
+            return nbrs, paths_list, product_info
+        
+        compressor = EmbeddingCompressor(n_components, whiten=True, quantize=quantize).fit(features_matrix)
+        nbrs = CompressedIndex(compressor, features_matrix, n_neighbors=min(20, len(features_list)))
+        print(f"Index nén: {features_matrix.nbytes / 1024:.1f} KB -> {nbrs.nbytes / 1024:.1f} KB "
+              f"({nbrs.codes.shape[1]} chiều, {nbrs.codes.dtype})")
+        labels = [product_info[product_id]['label'] for product_id in row_products]
+        print_quality_report(quality_report(features_matrix, labels, [(n_components, True, quantize)]))
+        
+        for info in product_info.values():
+            info['features_list'] = []
+        for product_id, projected in zip(row_products, compressor.project(features_matrix)):
+            product_info[product_id]['features_list'].append(projected.tolist())
         return nbrs, paths_list, product_info
     
     except Exception as e:
@@ -226,7 +340,7 @@ def find_similar_images(model, nbrs, paths_list, product_info, query_img_data, t
     distances, indices = nbrs.kneighbors([query_features])
     print(f"Distances: {distances[0][:top_k]}, Indices: {indices[0][:top_k]}")
     
-    client = get_mongo_client()
+    client = get_shared_mongo_client()
     db = client["ecommerce"]
     products_collection = db["products"]
     
@@ -266,24 +380,19 @@ def find_similar_images(model, nbrs, paths_list, product_info, query_img_data, t
             except Exception as e:
                 print(f"Lỗi khi lấy sản phẩm với product_id {product_id}: {str(e)}")
         
-        if not product:
+        index = get_text_index() if not product else None
+        if not product and index is not None:
+            # Tra theo tên file ảnh rồi theo tên sản phẩm trên index văn bản thay cho $regex không dùng được index;
+            # chỉ nhận sản phẩm có tên khớp, không nhận kết quả BM25 chỉ trùng từ trong mô tả / thông số
             normalized_path = normalize_image_path(img_path)
-            product_name = normalize_product_name(normalized_path)
+            product_name = normalize_product_name(os.path.basename(normalized_path))
             print(f"Thử tìm sản phẩm với normalized_path: {normalized_path}, product_name: {product_name}")
-            try:
-                escaped_normalized_path = re.escape(os.path.basename(normalized_path))
-                escaped_product_name = re.escape(product_name)
-                product = products_collection.find_one({
-                    "$or": [
-                        {"p_images": {"$regex": escaped_normalized_path, "$options": "i"}},
-                        {"p_name": {"$regex": escaped_product_name, "$options": "i"}}
-                    ]
-                })
+            fallback_id = index.find_by_image(normalized_path) or index.find_by_name(product_name)
+            if fallback_id and fallback_id not in seen_product_ids:
+                product = products_collection.find_one({"_id": ObjectId(fallback_id)})
                 if product:
-                    product_id = str(product['_id'])
+                    product_id = fallback_id
                     print(f"Tìm thấy sản phẩm với ID: {product_id}")
-            except Exception as e:
-                print(f"Lỗi khi tìm sản phẩm với regex: {str(e)}")
         
         if not product:
             print(f"Không tìm thấy sản phẩm cho ảnh: {img_path}")
@@ -337,7 +446,7 @@ def find_similar_images(model, nbrs, paths_list, product_info, query_img_data, t
     
     return sorted_products
 
-def save_trained_data(nbrs, paths_list, product_info, save_dir="saved_data"):
+def save_trained_data(nbrs, paths_list, product_info, save_dir=SAVED_DIR):
     try:
         if nbrs is None or paths_list is None or product_info is None:
             print("Không có dữ liệu để lưu")
@@ -357,11 +466,11 @@ def save_trained_data(nbrs, paths_list, product_info, save_dir="saved_data"):
         with open(os.path.join(save_dir, "last_update.txt"), 'w') as f:
             f.write(str(time.time()))
         
-        print("Đã lưu dữ liệu train vào thư mục saved_data")
+        print(f"Đã lưu dữ liệu train vào thư mục {save_dir}")
     except Exception as e:
         print(f"Lỗi khi lưu dữ liệu train: {str(e)}")
 
-def load_trained_data(save_dir="saved_data"):
+def load_trained_data(save_dir=SAVED_DIR):
     try:
         with open(os.path.join(save_dir, "nbrs.pkl"), 'rb') as f:
             nbrs = pickle.load(f)
@@ -372,7 +481,7 @@ def load_trained_data(save_dir="saved_data"):
         with open(os.path.join(save_dir, "product_info.pkl"), 'rb') as f:
             product_info = pickle.load(f)
         
-        print("Đã load dữ liệu train từ thư mục saved_data")
+        print(f"Đã load dữ liệu train từ thư mục {save_dir}")
         return nbrs, paths_list, product_info
     
     except FileNotFoundError:
@@ -382,7 +491,7 @@ def load_trained_data(save_dir="saved_data"):
         print(f"Lỗi khi load dữ liệu train: {str(e)}")
         return None, None, None
 
-def check_data_changed(image_folder, saved_time_file="saved_data/last_update.txt"):
+def check_data_changed(image_folder, saved_time_file=os.path.join(SAVED_DIR, "last_update.txt")):
     try:
         with open(saved_time_file, 'r') as f:
             last_saved_time = float(f.read())
@@ -401,16 +510,85 @@ def check_data_changed(image_folder, saved_time_file="saved_data/last_update.txt
         print(f"Lỗi khi kiểm tra thay đổi dữ liệu: {str(e)}")
         return True
 
-model = init_feature_extractor()
+# Mô hình được khởi tạo trong initialize_model để import module (benchmark, script offline) không phải tải EfficientNetB4
+model = None
 nbrs, paths_list, product_info = None, None, None
+text_index = None
+text_index_lock = threading.Lock()
+recommendation_table = None
+mongo_client = None
+mongo_client_lock = threading.Lock()
+
+def get_shared_mongo_client():
+    """MongoClient dùng chung cho mọi request (có sẵn connection pool, an toàn đa luồng), tạo ở lần dùng đầu."""
+    global mongo_client
+    if mongo_client is None:
+        with mongo_client_lock:
+            if mongo_client is None:
+                mongo_client = get_mongo_client()
+    return mongo_client
 
-def initialize_model():
-    global nbrs, paths_list, product_info
-    image_folder = r"E:\ThucTapThucTe\Project\backend_api\src\services\image-based\Ảnh sản phẩm"
-    saved_dir = r"E:\ThucTapThucTe\Project\backend_api\src\services\image-based\saved_data"
+def _b64url_decode(segment):
+    return base64.urlsafe_b64decode(segment + '=' * (-len(segment) % 4))
+
+def verify_backend_token(token, secret=None):
+    """Payload của JWT HS256 do backend Node cấp (jsonwebtoken, JWT_SECRET) nếu chữ ký đúng và chưa hết hạn;
+    None nếu không hợp lệ."""
+    secret = secret or JWT_SECRET
+    if not token or not secret:
+        return None
+    try:
+        header_b64, payload_b64, signature_b64 = token.split('.')
+        if json.loads(_b64url_decode(header_b64)).get('alg') != 'HS256':
+            return None
+        expected = hmac.new(secret.encode('utf-8'), f"{header_b64}.{payload_b64}".encode('ascii'),
+                            hashlib.sha256).digest()
+        if not hmac.compare_digest(expected, _b64url_decode(signature_b64)):
+            return None
+        payload = json.loads(_b64url_decode(payload_b64))
+    except (ValueError, AttributeError):
+        return None
+    if not isinstance(payload, dict) or payload.get('exp', float('inf')) < time.time():
+        return None
+    return payload
+
+def initialize_recommendations(table_file):
+    global recommendation_table
+    if not os.path.exists(table_file):
+        print(f"Chưa có bảng gợi ý {table_file}, chạy recommendations.py để tạo")
+        return
+    recommendation_table = RecommendationTable(table_file)
+    print(f"Đã load bảng gợi ý cho {len(recommendation_table.product_ids)} sản phẩm")
+
+def initialize_text_index():
+    global text_index
+    try:
+        client = get_shared_mongo_client()
+        text_index = build_text_index_from_mongo(client["ecommerce"]["products"])
+    except Exception as e:
+        print(f"Không đọc được sản phẩm từ MongoDB, dựng index văn bản từ file dump: {str(e)}")
+        text_index = build_text_index_from_catalog()
+    print(f"Đã dựng index văn bản cho {len(text_index)} sản phẩm")
+
+def get_text_index():
+    """Index văn bản, dựng ở lần dùng đầu tiên nếu chưa có (khi module được import qua WSGI, loadtest...);
+    None nếu không dựng được."""
+    if text_index is None:
+        with text_index_lock:
+            if text_index is None:
+                try:
+                    initialize_text_index()
+                except Exception as e:
+                    print(f"Lỗi khi dựng index văn bản: {str(e)}")
+    return text_index
+
+def initialize_model(image_folder=IMAGE_FOLDER, saved_dir=SAVED_DIR):
+    global model, nbrs, paths_list, product_info
+    if model is None:
+        model = init_feature_extractor()
     
     try:
-        if check_data_changed(image_folder):
+        if check_data_changed(image_folder, os.path.join(saved_dir, "last_update.txt")):
             print("Dữ liệu ảnh đã thay đổi, xây dựng lại...")
             nbrs, paths_list, product_info = build_feature_database(model, image_folder)
             save_trained_data(nbrs, paths_list, product_info, saved_dir)
@@ -422,6 +600,10 @@ def initialize_model():
                 save_trained_data(nbrs, paths_list, product_info, saved_dir)
             else:
                 print(f"Đã load {len(paths_list)} ảnh từ dữ liệu train")
+        if SHARD_ADDRESSES:
+            # paths_list và product_info vẫn giữ ở coordinator; worker chỉ trả về chỉ số dòng toàn cục
+            nbrs = ShardedIndex(SHARD_ADDRESSES, compressor=getattr(nbrs, 'compressor', None))
+            print(f"Truy vấn ảnh qua {len(SHARD_ADDRESSES)} shard: {SHARD_ADDRESSES}")
     except Exception as e:
         print(f"Lỗi trong initialize_model: {str(e)}")
         raise
@@ -457,9 +639,105 @@ def find_similar():
         print(f"Lỗi endpoint /find_similar: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/search_text', methods=['GET'])
+def search_text():
+    try:
+        query = request.args.get('q', '').strip()
+        top_k = request.args.get('topK', 10, type=int)
+        if not query:
+            return jsonify({'error': 'No query provided'}), 400
+        index = get_text_index()
+        if index is None:
+            return jsonify({'error': 'Text index is not initialized'}), 503
+
+        start_time = time.perf_counter()
+        results = []
+        for product_id, score in index.search(query, top_k):
+            # Sản phẩm có thể vừa bị xóa khỏi index bởi request /text_index khác
+            document = index.get_document(product_id)
+            if document is not None:
+                results.append({
+                    "id": product_id,
+                    "name": document['name'],
+                    "images": document['images'],
+                    "price": document['price'],
+                    "score": score
+                })
+        print(f"Tìm kiếm văn bản '{query}' trong {(time.perf_counter() - start_time) * 1000:.2f} ms")
+        return jsonify({"data": results}), 200
+    except Exception as e:
+        print(f"Lỗi endpoint /search_text: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/text_index/<product_id>', methods=['PUT', 'DELETE'])
+def update_text_index(product_id):
+    """Cập nhật tăng dần index văn bản khi sản phẩm được thêm/sửa (PUT) hoặc xóa (DELETE).
+
+    Service lắng nghe trên 0.0.0.0 nên yêu cầu token của backend (Authorization: Bearer <JWT> hoặc cookie token).
+    """
+    try:
+        if not JWT_SECRET:
+            return jsonify({'error': 'Text index updates are disabled (JWT_SECRET is not set)'}), 503
+        auth_header = request.headers.get('Authorization', '')
+        token = auth_header[len('Bearer '):].strip() if auth_header.startswith('Bearer ') else request.cookies.get('token')
+        if not token:
+            return jsonify({'error': 'No token provided'}), 401
+        if verify_backend_token(token) is None:
+            return jsonify({'error': 'Invalid token'}), 403
+        index = get_text_index()
+        if index is None:
+            return jsonify({'error': 'Text index is not initialized'}), 503
+        if request.method == 'DELETE':
+            index.remove_product(product_id)
+            return jsonify({"message": "removed"}), 200
+        if not ObjectId.is_valid(product_id):
+            return jsonify({'error': 'Invalid product id'}), 400
+        product = get_shared_mongo_client()["ecommerce"]["products"].find_one({"_id": ObjectId(product_id)})
+        if not product:
+            index.remove_product(product_id)
+            return jsonify({'error': 'Product not found'}), 404
+        index.add_product(product)
+        return jsonify({"message": "updated"}), 200
+    except Exception as e:
+        print(f"Lỗi endpoint /text_index: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/recommend/<product_id>', methods=['GET'])
+def recommend(product_id):
+    try:
+        top_k = request.args.get('topK', 5, type=int)
+        visual_weight = request.args.get('visualWeight', 0.5, type=float)
+        if recommendation_table is None:
+            return jsonify({'error': 'Recommendation table is not initialized'}), 503
+        recommendations = recommendation_table.recommend(product_id, top_k, visual_weight)
+        if recommendations is None:
+            return jsonify({'error': 'Product not found'}), 404
+
+        index = get_text_index()
+
+        def describe(candidates):
+            results = []
+            for candidate_id, score in candidates:
+                document = (index.get_document(candidate_id) if index is not None else None) or {}
+                results.append({
+                    "id": candidate_id,
+                    "name": document.get('name', ''),
+                    "images": document.get('images', []),
+                    "price": document.get('price', 0),
+                    "score": score
+                })
+            return results
+
+        return jsonify({"data": {key: describe(candidates) for key, candidates in recommendations.items()}}), 200
+    except Exception as e:
+        print(f"Lỗi endpoint /recommend: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
 if __name__ == '__main__':
     try:
+        initialize_text_index()
         initialize_model()
+        initialize_recommendations(RECOMMENDATIONS_FILE)
         app.run(host='0.0.0.0', port=5001, debug=True)
     except Exception as e:
         print(f"Lỗi khi khởi động server Flask: {str(e)}")
\ No newline at end of file
@@ -0,0 +1,362 @@
+import argparse
+import contextlib
+import cProfile
+import io
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+
+# Điểm chạy chung cho các job offline: import sản phẩm, khai thác luật kết hợp và dựng index ảnh.
+# Mọi đường dẫn và ngưỡng đều là tham số; mỗi job được chia thành các giai đoạn và luôn in báo cáo thời gian.
+# Với --profile, mỗi giai đoạn chạy dưới cProfile + tracemalloc và ghi vào --profile-dir:
+# <job>_<giai đoạn>.prof (mở bằng snakeviz / pstats), <job>_<giai đoạn>.txt (top hàm theo thời gian tích lũy)
+# và <job>_report.json (thời gian, bộ nhớ đỉnh, top vị trí cấp phát gần đỉnh và lúc kết thúc).
+# cProfile chỉ đo luồng chính; công việc trong thread/process pool chỉ thấy qua thời gian chờ.
+#
+#   python offline_jobs.py import --input process_data/list_products.xlsx --skip-db
+#   python offline_jobs.py --profile mine fp_growth --min-supports 0.001,0.002 --min-thresholds 0.5
+#   python offline_jobs.py mine apriori --min-support 0.001 --max-len 3
+#   python offline_jobs.py mine pairwise -- --min-support 0.0005 --merge-into data/rules.json
+#   python offline_jobs.py index features --image-folder "image-based/Ảnh sản phẩm" --saved-dir image-based/saved_data
+#   python offline_jobs.py index shards -- split --saved-dir image-based/saved_data --shards 4
+
+SERVICES_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(SERVICES_DIR, 'data')
+PROCESS_DATA_DIR = os.path.join(SERVICES_DIR, 'process_data')
+IMAGE_DIR = os.path.join(SERVICES_DIR, 'image-based')
+for module_dir in (DATA_DIR, PROCESS_DATA_DIR, IMAGE_DIR):
+    if module_dir not in sys.path:
+        sys.path.append(module_dir)
+
+from benchmark import peak_rss_mb
+
+DATASET_FILE = os.path.join(DATA_DIR, 'dataset.csv')
+RULES_FILE = os.path.join(DATA_DIR, 'rules.json')
+PROFILE_DIR = 'profiles'
+TOP_ENTRIES = 15
+PEAK_POLL_INTERVAL = 0.05
+PEAK_SNAPSHOT_GROWTH = 1.1
+PEAK_SNAPSHOT_MIN_BYTES = 1 << 20
+
+def parse_floats(value):
+    return [float(v) for v in value.split(',') if v.strip()]
+
+class StageProfiler:
+    """Đo từng giai đoạn của một job: thời gian thực, CPU và (với profile=True) cProfile + tracemalloc.
+
+    RSS lấy từ ru_maxrss là đỉnh của cả tiến trình tính tới lúc đo, nên mỗi giai đoạn ghi giá trị lúc bắt đầu
+    và lúc kết thúc; phần tăng thêm là bộ nhớ đỉnh do chính giai đoạn đó đẩy lên (0 nếu không vượt đỉnh cũ).
+    Top vị trí cấp phát lấy từ snapshot tracemalloc chụp gần lúc bộ nhớ đang cấp phát đạt đỉnh (một luồng
+    theo dõi chụp lại mỗi khi mức cấp phát vượt snapshot trước PEAK_SNAPSHOT_GROWTH lần), kèm snapshot
+    lúc kết thúc giai đoạn cho bộ nhớ còn giữ lại.
+    """
+
+    def __init__(self, job, profile=False, output_dir=PROFILE_DIR, top=TOP_ENTRIES):
+        self.job = job
+        self.profile = profile
+        self.output_dir = output_dir
+        self.top = top
+        self.stages = []
+        if profile:
+            os.makedirs(output_dir, exist_ok=True)
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        record = {'stage': name, 'status': 'ok', 'process_peak_rss_start_mb': peak_rss_mb()}
+        profiler = watcher = None
+        if self.profile:
+            if tracemalloc.is_tracing():
+                tracemalloc.stop()
+            tracemalloc.start()
+            watcher = PeakSnapshotWatcher()
+            watcher.start()
+            profiler = cProfile.Profile()
+            profiler.enable()
+        start_time, start_cpu = time.perf_counter(), time.process_time()
+        try:
+            yield record
+        except BaseException:
+            record['status'] = 'error'
+            raise
+        finally:
+            record['wall_s'] = time.perf_counter() - start_time
+            record['cpu_s'] = time.process_time() - start_cpu
+            if profiler is not None:
+                profiler.disable()
+                self._save_profile(name, profiler, watcher, record)
+            record['process_peak_rss_mb'] = peak_rss_mb()
+            if record['process_peak_rss_mb'] is not None and record['process_peak_rss_start_mb'] is not None:
+                record['peak_rss_growth_mb'] = record['process_peak_rss_mb'] - record['process_peak_rss_start_mb']
+            self.stages.append(record)
+            print(f"[{self.job}] {name}: {record['wall_s']:.2f}s ({record['status']})")
+
+    def _top_allocators(self, snapshot):
+        snapshot = snapshot.filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+        ])
+        return [
+            {'location': f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+             'size_kb': stat.size / 1024, 'count': stat.count}
+            for stat in snapshot.statistics('lineno')[:self.top]
+        ]
+
+    def _save_profile(self, name, profiler, watcher, record):
+        watcher.stop()
+        current, peak = tracemalloc.get_traced_memory()
+        end_snapshot = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+        peak_snapshot, peak_snapshot_size = watcher.snapshot, watcher.snapshot_size
+        if peak_snapshot is None or current >= peak_snapshot_size:
+            peak_snapshot, peak_snapshot_size = end_snapshot, current
+        record['traced_peak_mb'] = peak / (1024 * 1024)
+        record['traced_at_snapshot_mb'] = peak_snapshot_size / (1024 * 1024)
+        record['top_allocators_near_peak'] = self._top_allocators(peak_snapshot)
+        record['top_allocators_live_at_end'] = self._top_allocators(end_snapshot)
+
+        prefix = os.path.join(self.output_dir, f"{self.job}_{name}")
+        profiler.dump_stats(f"{prefix}.prof")
+        stream = io.StringIO()
+        pstats.Stats(profiler, stream=stream).sort_stats('cumulative').print_stats(self.top)
+        with open(f"{prefix}.txt", 'w', encoding='utf-8') as f:
+            f.write(stream.getvalue())
+        record['profile_file'] = f"{prefix}.prof"
+
+    def report(self):
+        def mb(value):
+            return '-' if value is None else f"{value:.1f}"
+
+        print(f"\n=== Báo cáo job {self.job} ===")
+        print(f"{'giai đoạn':<24}{'thời gian (s)':>15}{'CPU (s)':>10}{'RSS đỉnh tiến trình tới lúc này (MB)':>38}"
+              f"{'tăng trong giai đoạn (MB)':>27}{'tracemalloc đỉnh (MB)':>24}")
+        for record in self.stages:
+            print(f"{record['stage']:<24}{record['wall_s']:>15.2f}{record['cpu_s']:>10.2f}"
+                  f"{mb(record['process_peak_rss_mb']):>38}{mb(record.get('peak_rss_growth_mb')):>27}"
+                  f"{mb(record.get('traced_peak_mb')):>24}")
+        for record in self.stages:
+            if record.get('top_allocators_near_peak'):
+                print(f"\nTop vị trí cấp phát gần đỉnh tracemalloc ({record['traced_at_snapshot_mb']:.1f} / "
+                      f"{record['traced_peak_mb']:.1f} MB) - {record['stage']}:")
+                for allocator in record['top_allocators_near_peak'][:5]:
+                    print(f"  {allocator['size_kb']:>10.1f} KB  {allocator['count']:>8}  {allocator['location']}")
+        if self.profile:
+            report_file = os.path.join(self.output_dir, f"{self.job}_report.json")
+            with open(report_file, 'w', encoding='utf-8') as f:
+                json.dump({'job': self.job, 'created_at': datetime.now().isoformat(timespec='seconds'),
+                           'argv': sys.argv[1:], 'stages': self.stages}, f, ensure_ascii=False, indent=2)
+            print(f"\nĐã lưu báo cáo profile vào {report_file}")
+
+class PeakSnapshotWatcher:
+    """Luồng nền theo dõi mức cấp phát tracemalloc, chụp snapshot mỗi khi vượt snapshot trước đủ nhiều."""
+
+    def __init__(self, interval=PEAK_POLL_INTERVAL, growth=PEAK_SNAPSHOT_GROWTH):
+        self.interval = interval
+        self.growth = growth
+        self.snapshot = None
+        self.snapshot_size = tracemalloc.get_traced_memory()[0] + PEAK_SNAPSHOT_MIN_BYTES
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+
+    def _run(self):
+        while not self.stopped.wait(self.interval):
+            current, _ = tracemalloc.get_traced_memory()
+            if current > self.snapshot_size * self.growth:
+                self.snapshot = tracemalloc.take_snapshot()
+                self.snapshot_size = current
+
+def forwarded(argv):
+    """Tham số chuyển tiếp cho main(argv) của module (bỏ dấu '--' phân tách nếu có)."""
+    return argv[1:] if argv and argv[0] == '--' else argv
+
+# Các job; mỗi hàm nhận args và profiler, chia công việc thành các giai đoạn bằng profiler.stage
+def run_import(args, profiler):
+    from import_mongodb import BULK_BATCH_SIZE, REFERENCE_TTL, process_excel, bulk_import_to_mongodb
+
+    # Nguồn mongo đọc thương hiệu/danh mục từ cùng database đích; nguồn api dùng --api-base-url nếu có
+    reference_options = {}
+    if args.reference_source == 'mongo':
+        reference_options = {'mongo_uri': args.mongo_uri, 'db_name': args.db}
+    elif args.reference_source == 'api' and args.api_base_url:
+        reference_options = {'api_base_url': args.api_base_url}
+    reference_ttl = 0 if args.refresh_reference_data else args.reference_ttl
+    if reference_ttl is None:
+        reference_ttl = REFERENCE_TTL
+    with profiler.stage('process_excel'):
+        products = process_excel(args.input, output_file=args.output_file, audit_file=args.audit_file,
+                                 manifest_file=args.manifest, revalidate=args.revalidate,
+                                 reference_source=args.reference_source, chunksize=args.chunksize,
+                                 derivatives=not args.no_derivatives, reference_ttl=reference_ttl,
+                                 reference_options=reference_options)
+    if args.skip_db:
+        return
+    with profiler.stage('bulk_import'):
+        bulk_import_to_mongodb(products, mongo_uri=args.mongo_uri, db_name=args.db,
+                               collection_name=args.collection, batch_size=args.batch_size or BULK_BATCH_SIZE)
+
+def run_fp_growth(args, profiler):
+    from fp_growth import MIN_SUPPORT_VALUES, MIN_THRESHOLD_VALUES, main as fp_growth_main
+
+    min_supports = parse_floats(args.min_supports) if args.min_supports else MIN_SUPPORT_VALUES
+    min_thresholds = parse_floats(args.min_thresholds) if args.min_thresholds else MIN_THRESHOLD_VALUES
+    with profiler.stage('fp_growth'):
+        fp_growth_main(args.input, args.output, min_supports, min_thresholds)
+
+def run_apriori(args, profiler):
+    from apriori.apriori import main as apriori_main
+
+    with profiler.stage('apriori'):
+        apriori_main(args.input, args.min_support, args.min_confidence, args.min_lift, args.max_len)
+
+def run_eclat(args, profiler):
+    from eclat.eclat import main as eclat_main
+
+    with profiler.stage('eclat'):
+        eclat_main(args.input, args.min_support, args.min_confidence)
+
+def run_pairwise(args, profiler):
+    from pairwise import main as pairwise_main
+
+    with profiler.stage('pairwise'):
+        pairwise_main(forwarded(args.args))
+
+def run_multilevel(args, profiler):
+    from multilevel import main as multilevel_main
+
+    with profiler.stage('multilevel'):
+        multilevel_main(forwarded(args.args))
+
+def run_index_features(args, profiler):
+    import train_features
+
+    with profiler.stage('load_model'):
+        model = train_features.init_feature_extractor()
+    options = {'n_components': args.components, 'quantize': args.quantize, 'mongo_uri': args.mongo_uri}
+    if args.dedup_distance is not None:
+        options['dedup_max_distance'] = args.dedup_distance if args.dedup_distance > 0 else None
+    image_folder = args.image_folder or train_features.IMAGE_FOLDER
+    with profiler.stage('build_features'):
+        nbrs, paths_list, product_info = train_features.build_feature_database(model, image_folder, **options)
+    with profiler.stage('save'):
+        train_features.save_trained_data(nbrs, paths_list, product_info, args.saved_dir or train_features.SAVED_DIR)
+
+def run_index_recommendations(args, profiler):
+    from recommendations import main as recommendations_main
+
+    with profiler.stage('recommendations'):
+        recommendations_main(forwarded(args.args))
+
+def run_index_shards(args, profiler):
+    from sharded_index import main as sharded_index_main
+
+    with profiler.stage('shards'):
+        sharded_index_main(forwarded(args.args))
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Chạy các job offline (import, khai thác luật, dựng index ảnh)")
+    parser.add_argument('--profile', action='store_true', help="Ghi báo cáo cProfile/tracemalloc cho từng giai đoạn")
+    parser.add_argument('--profile-dir', default=PROFILE_DIR)
+    parser.add_argument('--profile-top', type=int, default=TOP_ENTRIES)
+    jobs = parser.add_subparsers(dest='job', required=True)
+
+    import_parser = jobs.add_parser('import', help="Xử lý file Excel sản phẩm và import vào MongoDB")
+    import_parser.add_argument('--input', default=os.path.join(PROCESS_DATA_DIR, 'list_products.xlsx'))
+    import_parser.add_argument('--audit-file', default=os.path.join(PROCESS_DATA_DIR, 'processed_products.jsonl'))
+    import_parser.add_argument('--output-file', help="Báo cáo Excel (tùy chọn)")
+    import_parser.add_argument('--manifest', default=os.path.join(PROCESS_DATA_DIR, 'import_manifest.json'))
+    import_parser.add_argument('--revalidate', action='store_true')
+    import_parser.add_argument('--reference-source', choices=['api', 'dump', 'mongo'], default='api')
+    import_parser.add_argument('--api-base-url', help="API backend cho --reference-source api")
+    import_parser.add_argument('--reference-ttl', type=int,
+                               help="Tuổi tối đa (giây) của cache thương hiệu/danh mục (mặc định 1 giờ)")
+    import_parser.add_argument('--refresh-reference-data', action='store_true',
+                               help="Bỏ qua cache, đọc lại thương hiệu/danh mục từ nguồn")
+    import_parser.add_argument('--chunksize', type=int)
+    import_parser.add_argument('--no-derivatives', action='store_true')
+    import_parser.add_argument('--skip-db', action='store_true', help="Chỉ xử lý file, không ghi MongoDB")
+    import_parser.add_argument('--mongo-uri', default="mongodb://localhost:27017")
+    import_parser.add_argument('--db', default="ecommerce")
+    import_parser.add_argument('--collection', default="products")
+    import_parser.add_argument('--batch-size', type=int)
+    import_parser.set_defaults(handler=run_import)
+
+    mine_parser = jobs.add_parser('mine', help="Khai thác luật kết hợp")
+    engines = mine_parser.add_subparsers(dest='engine', required=True)
+
+    fp_growth_parser = engines.add_parser('fp_growth', help="FP-Growth trên lưới ngưỡng, ghi rules.json")
+    fp_growth_parser.add_argument('--input', default=DATASET_FILE)
+    fp_growth_parser.add_argument('--output', default=RULES_FILE)
+    fp_growth_parser.add_argument('--min-supports', help="Danh sách min_support, ví dụ 0.001,0.002 (mặc định lưới của fp_growth.py)")
+    fp_growth_parser.add_argument('--min-thresholds', help="Danh sách min_threshold (confidence)")
+    fp_growth_parser.set_defaults(handler=run_fp_growth)
+
+    apriori_parser = engines.add_parser('apriori', help="Apriori (bitmap)")
+    apriori_parser.add_argument('--input', default=DATASET_FILE)
+    apriori_parser.add_argument('--min-support', type=float, default=0.001)
+    apriori_parser.add_argument('--min-confidence', type=float, default=0.8)
+    apriori_parser.add_argument('--min-lift', type=float, default=5.0)
+    apriori_parser.add_argument('--max-len', type=int, default=3)
+    apriori_parser.set_defaults(handler=run_apriori)
+
+    eclat_parser = engines.add_parser('eclat', help="ECLAT")
+    eclat_parser.add_argument('--input', default=DATASET_FILE)
+    eclat_parser.add_argument('--min-support', type=float, default=0.004)
+    eclat_parser.add_argument('--min-confidence', type=float, default=0.8)
+    eclat_parser.set_defaults(handler=run_eclat)
+
+    # Các module đã có argparse riêng: tham số sau '--' được chuyển nguyên cho main(argv) của module
+    # (mặc định đường dẫn của các module này đều theo thư mục module, không theo thư mục đang chạy)
+    for name, handler, help_text in (
+        ('pairwise', run_pairwise, "Luật 1 -> 1 từ ma trận đồng xuất hiện (tham số của pairwise.py)"),
+        ('multilevel', run_multilevel, "Luật đa mức danh mục -> sản phẩm (tham số của multilevel.py)"),
+    ):
+        engine_parser = engines.add_parser(name, help=help_text)
+        engine_parser.add_argument('args', nargs=argparse.REMAINDER)
+        engine_parser.set_defaults(handler=handler)
+
+    index_parser = jobs.add_parser('index', help="Dựng index ảnh và dữ liệu đi kèm")
+    steps = index_parser.add_subparsers(dest='step', required=True)
+
+    features_parser = steps.add_parser('features', help="Trích đặc trưng EfficientNetB4 và lưu index")
+    # Mặc định giống service Flask: train_features.IMAGE_FOLDER / SAVED_DIR / MONGO_URI (image-based/..., biến môi trường)
+    features_parser.add_argument('--image-folder')
+    features_parser.add_argument('--saved-dir')
+    features_parser.add_argument('--mongo-uri')
+    features_parser.add_argument('--dedup-distance', type=int,
+                                 help="Khoảng cách Hamming gộp ảnh gần trùng; 0 hoặc số âm để tắt gom nhóm")
+    features_parser.add_argument('--components', type=int, help="Số chiều PCA (mặc định giữ vector gốc)")
+    features_parser.add_argument('--quantize', action='store_true', help="Lượng tử hóa int8")
+    features_parser.set_defaults(handler=run_index_features)
+
+    for name, handler, help_text in (
+        ('recommendations', run_index_recommendations, "Bảng gợi ý (tham số của recommendations.py)"),
+        ('shards', run_index_shards, "Chia/chạy shard index (tham số của sharded_index.py)"),
+    ):
+        step_parser = steps.add_parser(name, help=help_text)
+        step_parser.add_argument('args', nargs=argparse.REMAINDER)
+        step_parser.set_defaults(handler=handler)
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    job = '_'.join(part for part in (args.job, getattr(args, 'engine', None), getattr(args, 'step', None)) if part)
+    profiler = StageProfiler(job, args.profile, args.profile_dir, args.profile_top)
+    try:
+        args.handler(args, profiler)
+    finally:
+        profiler.report()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+import logging
+import os
+import posixpath
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image
+
+# Ảnh dẫn xuất kích thước cố định cho mỗi ảnh sản phẩm đã tải, lưu tại <root>/derivatives/<tên>/<tên file>.<định dạng>
+# và ghi vào p_image_derivatives dưới dạng URL cùng tiền tố với p_images (/uploads/product/derivatives/<tên>/...).
+# "index" khớp đúng đầu vào 380x380 của preprocess_image (resize LANCZOS, không giữ tỷ lệ) nên index ảnh
+# chỉ cần giải mã file nhỏ; "thumb" và "medium" giữ tỷ lệ, dùng cho danh sách và trang sản phẩm.
+
+DERIVATIVE_SIZES = {
+    "thumb": {"size": (160, 160), "fit": "contain", "format": "webp", "quality": 80},
+    "medium": {"size": (480, 480), "fit": "contain", "format": "webp", "quality": 85},
+    "index": {"size": (380, 380), "fit": "exact", "format": "jpeg", "quality": 95},
+}
+MAX_DERIVATIVE_WORKERS = os.cpu_count() or 1
+DERIVATIVE_EXTENSIONS = {"webp": ".webp", "jpeg": ".jpg"}
+
+def derivative_path(image_path, name, root, spec):
+    stem = os.path.splitext(os.path.basename(image_path))[0]
+    return os.path.join(root, "derivatives", name, stem + DERIVATIVE_EXTENSIONS[spec["format"]])
+
+def is_fresh(target_path, source_path):
+    """Ảnh dẫn xuất đã có và mới hơn ảnh gốc thì không tạo lại."""
+    return os.path.exists(target_path) and os.path.getmtime(target_path) >= os.path.getmtime(source_path)
+
+def make_derivatives(image_path, root, sizes=DERIVATIVE_SIZES):
+    """Tạo các ảnh dẫn xuất cho một ảnh (chạy trong tiến trình con); trả về {tên: đường dẫn} hoặc None nếu lỗi."""
+    try:
+        targets = {name: derivative_path(image_path, name, root, spec) for name, spec in sizes.items()}
+        missing = [name for name, path in targets.items() if not is_fresh(path, image_path)]
+        if not missing:
+            return targets
+        with Image.open(image_path) as img:
+            # JPEG được giải mã ở tỷ lệ thu nhỏ (1/2, 1/4, 1/8) đủ cho kích thước lớn nhất cần tạo
+            largest = max(max(sizes[name]["size"]) for name in missing)
+            img.draft("RGB", (largest, largest))
+            img = img.convert("RGB")
+            for name in missing:
+                spec = sizes[name]
+                if spec["fit"] == "exact":
+                    resized = img.resize(spec["size"], Image.Resampling.LANCZOS)
+                else:
+                    resized = img.copy()
+                    resized.thumbnail(spec["size"], Image.Resampling.LANCZOS)
+                os.makedirs(os.path.dirname(targets[name]), exist_ok=True)
+                tmp_path = targets[name] + ".tmp"
+                resized.save(tmp_path, format=spec["format"].upper(), quality=spec["quality"])
+                os.replace(tmp_path, targets[name])
+        return targets
+    except Exception as e:
+        logging.error(f"Lỗi khi tạo ảnh dẫn xuất cho {image_path}: {e}")
+        return None
+
+def derivative_url(image_url, target_path, root):
+    """Đường dẫn file ảnh dẫn xuất -> URL cùng thư mục gốc với ảnh gốc trong p_images."""
+    relative = os.path.relpath(target_path, root).replace(os.sep, "/")
+    return posixpath.join(posixpath.dirname(image_url), relative)
+
+def generate_derivatives(products, root, sizes=DERIVATIVE_SIZES, max_workers=MAX_DERIVATIVE_WORKERS):
+    """Tạo ảnh dẫn xuất cho p_images của mọi sản phẩm bằng process pool.
+
+    p_images là URL (/uploads/product/<tên file>); file gốc được đọc tại root/<tên file>.
+    Ghi product["p_image_derivatives"]: list cùng thứ tự p_images, mỗi phần tử là {tên: URL}
+    (dict rỗng nếu ảnh đó lỗi). Trả về số ảnh đã xử lý thành công.
+    """
+    image_urls = list(dict.fromkeys(url for product in products for url in product["p_images"]))
+    if not image_urls:
+        return 0
+    image_paths = [os.path.join(root, posixpath.basename(url)) for url in image_urls]
+    results = {}
+    chunksize = max(1, len(image_paths) // (max_workers * 4))
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        outputs = executor.map(make_derivatives, image_paths, [root] * len(image_paths), [sizes] * len(image_paths),
+                               chunksize=chunksize)
+        for url, targets in zip(image_urls, outputs):
+            results[url] = {name: derivative_url(url, path, root) for name, path in targets.items()} if targets else {}
+    for product in products:
+        product["p_image_derivatives"] = [results.get(url) or {} for url in product["p_images"]]
+    succeeded = sum(1 for targets in results.values() if targets)
+    logging.info(f"Đã tạo ảnh dẫn xuất ({', '.join(sizes)}) cho {succeeded}/{len(image_urls)} ảnh")
+    return succeeded
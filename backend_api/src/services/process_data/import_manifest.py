@@ -0,0 +1,123 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import uuid
+
+class ImportManifest:
+    """Manifest JSON lưu checkpoint của từng sản phẩm và từng ảnh để chạy lại import có thể tiếp tục.
+
+    images:   url -> {"sha256", "blob", "etag", "last_modified"}
+    products: product_id -> {"fingerprint", "p_images"} khi toàn bộ ảnh của sản phẩm đã tải xong
+    """
+
+    def __init__(self, path, flush_every=50):
+        self.path = path
+        self.flush_every = flush_every
+        self.lock = threading.Lock()
+        self.pending = 0
+        self.data = {"images": {}, "products": {}}
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    loaded = json.load(f)
+                self.data["images"].update(loaded.get("images", {}))
+                self.data["products"].update(loaded.get("products", {}))
+                logging.info(f"Đã đọc manifest {path}: {len(self.data['products'])} sản phẩm, "
+                             f"{len(self.data['images'])} ảnh đã có")
+            except (OSError, json.JSONDecodeError) as e:
+                logging.warning(f"Không đọc được manifest {path}, bắt đầu lại từ đầu: {e}")
+
+    @staticmethod
+    def fingerprint(image_urls):
+        """Dấu vân tay danh sách URL ảnh của sản phẩm; đổi URL thì sản phẩm phải xử lý lại."""
+        return hashlib.sha256("\n".join(image_urls).encode("utf-8")).hexdigest()
+
+    def get_image(self, url):
+        with self.lock:
+            return self.data["images"].get(url)
+
+    def set_image(self, url, entry):
+        with self.lock:
+            self.data["images"][url] = entry
+            self._touch()
+
+    def get_product(self, product_id, fingerprint):
+        """Trả về p_images đã lưu nếu sản phẩm đã hoàn tất với cùng danh sách URL, ngược lại None."""
+        with self.lock:
+            entry = self.data["products"].get(product_id)
+        if entry and entry.get("fingerprint") == fingerprint:
+            return entry.get("p_images")
+        return None
+
+    def set_product(self, product_id, fingerprint, p_images):
+        with self.lock:
+            self.data["products"][product_id] = {"fingerprint": fingerprint, "p_images": p_images}
+            self._touch()
+
+    def _touch(self):
+        self.pending += 1
+        if self.pending >= self.flush_every:
+            self._write()
+
+    def flush(self):
+        with self.lock:
+            self._write()
+
+    def _write(self):
+        # Ghi ra file tạm rồi os.replace để manifest không bị hỏng nếu tiến trình dừng giữa chừng
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.data, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+        self.pending = 0
+
+class ImageStore:
+    """Kho ảnh định địa chỉ theo nội dung: mỗi nội dung lưu một lần tại .store/<sha256><ext>,
+    các tên file của sản phẩm là hard link tới blob (sao chép nếu hệ thống không hỗ trợ link)."""
+
+    def __init__(self, root):
+        self.root = root
+        self.blob_dir = os.path.join(root, ".store")
+        os.makedirs(self.blob_dir, exist_ok=True)
+
+    def write(self, chunks, extension):
+        """Ghi luồng dữ liệu vào kho, trả về (sha256, đường dẫn blob)."""
+        digest = hashlib.sha256()
+        tmp_path = os.path.join(self.blob_dir, f"tmp-{uuid.uuid4().hex}")
+        try:
+            with open(tmp_path, "wb") as f:
+                for chunk in chunks:
+                    if chunk:
+                        digest.update(chunk)
+                        f.write(chunk)
+            sha256 = digest.hexdigest()
+            blob_path = os.path.join(self.blob_dir, f"{sha256}{extension}")
+            if os.path.exists(blob_path):
+                os.remove(tmp_path)
+            else:
+                os.replace(tmp_path, blob_path)
+            return sha256, blob_path
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def link(self, blob_path, target_path):
+        """Tạo file đích trỏ tới blob (bỏ qua nếu đã trỏ đúng)."""
+        if os.path.exists(target_path):
+            if os.path.samefile(blob_path, target_path):
+                return
+            os.remove(target_path)
+        try:
+            os.link(blob_path, target_path)
+        except OSError:
+            shutil.copyfile(blob_path, target_path)
+
+    def has(self, entry, target_path=None):
+        """Blob của entry còn trong kho (và file đích, nếu có, vẫn tồn tại)."""
+        if not entry or not os.path.exists(entry.get("blob", "")):
+            return False
+        return target_path is None or os.path.exists(target_path)
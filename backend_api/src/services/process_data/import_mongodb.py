@@ -6,13 +6,22 @@ from urllib.parse import urlparse
 import xlsxwriter
 import logging
 from bson import ObjectId
-from pymongo import MongoClient
+from pymongo import MongoClient, UpdateOne, ASCENDING
+from pymongo.errors import BulkWriteError, OperationFailure
 import json
+import ast
+import math
 import unicodedata
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from import_manifest import ImportManifest, ImageStore
+from reference_data import DEFAULT_TTL as REFERENCE_TTL, load_reference_data
+from image_derivatives import generate_derivatives
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-API_BASE_URL = "http://localhost:5000/api"
 BACKEND_UPLOAD_DIR = os.path.join("./downloaded_images")
 if not os.path.exists(BACKEND_UPLOAD_DIR):
     try:
@@ -22,6 +31,45 @@ if not os.path.exists(BACKEND_UPLOAD_DIR):
         raise
 
 VALID_IMAGE_EXTENSIONS = ['.jpg', '.jpeg', '.png']
+MAX_IMAGES_PER_PRODUCT = 5
+MAX_DOWNLOAD_WORKERS = 16
+DOWNLOAD_RETRIES = 3
+BULK_BATCH_SIZE = 1000
+PRODUCT_UNIQUE_KEYS = ["p_name", "p_category", "p_brand"]
+MANIFEST_FILE = "import_manifest.json"
+EXCEL_CHUNK_SIZE = 50000
+# Cột Excel -> trường sản phẩm (lấy từ dòng đầu tiên của mỗi Product_id)
+PRODUCT_COLUMNS = {
+    "Product": "p_name",
+    "Quantity": "p_stock_quantity",
+    "Price": "p_price",
+    "Description": "p_description",
+    "Parent_category": "p_category",
+    "Category": "p_subcategory",
+    "Brand": "p_brand",
+    "Specifications": "p_specifications"
+}
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+def get_session(host):
+    """Lấy session dùng chung cho mỗi host (giữ kết nối, tự retry với backoff)."""
+    with _sessions_lock:
+        session = _sessions.get(host)
+        if session is None:
+            retry = Retry(
+                total=DOWNLOAD_RETRIES,
+                backoff_factor=0.5,
+                status_forcelist=[429, 500, 502, 503, 504],
+                allowed_methods=["GET"]
+            )
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=MAX_DOWNLOAD_WORKERS, max_retries=retry)
+            session = requests.Session()
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _sessions[host] = session
+        return session
 
 def is_valid_objectid(oid):
     """Kiểm tra xem chuỗi có phải là ObjectId hợp lệ không."""
@@ -31,40 +79,14 @@ def is_valid_objectid(oid):
     except Exception:
         return False
 
-def fetch_brands():
-    """Lấy danh sách thương hiệu từ API."""
-    try:
-        response = requests.get(f"{API_BASE_URL}/brand")
-        response.raise_for_status()
-        brands_data = response.json().get("brands", [])
-        return {brand["br_name"]: ObjectId(brand["_id"]) for brand in brands_data if is_valid_objectid(brand["_id"])}
-    except requests.RequestException as e:
-        logging.error(f"Lỗi khi lấy danh sách thương hiệu: {e}")
-        return {}
+def fetch_brands(source="api"):
+    """Lấy danh sách thương hiệu (tên -> ObjectId) từ dữ liệu tham chiếu đã cache."""
+    return load_reference_data(source)[0]
 
-def fetch_categories():
-    """Lấy danh sách danh mục và danh mục con từ API."""
-    try:
-        response = requests.get(f"{API_BASE_URL}/category/parents")
-        response.raise_for_status()
-        categories_data = response.json().get("data", [])
-        
-        parent_category_map = {cat["cate_name"]: ObjectId(cat["_id"]) for cat in categories_data if is_valid_objectid(cat["_id"])}
-        sub_category_map = {}
-        
-        for cat in categories_data:
-            cat_id = cat["_id"]
-            sub_response = requests.get(f"{API_BASE_URL}/category/by-parent/{cat_id}")
-            sub_response.raise_for_status()
-            sub_categories = sub_response.json().get("data", [])
-            sub_category_map.update({
-                sub["cate_name"]: ObjectId(sub["_id"]) for sub in sub_categories if is_valid_objectid(sub["_id"])
-            })
-        
-        return parent_category_map, sub_category_map
-    except requests.RequestException as e:
-        logging.error(f"Lỗi khi lấy danh sách danh mục: {e}")
-        return {}, {}
+def fetch_categories(source="api"):
+    """Lấy danh sách danh mục và danh mục con (tên -> ObjectId) từ dữ liệu tham chiếu đã cache."""
+    _, parent_category_map, sub_category_map = load_reference_data(source)
+    return parent_category_map, sub_category_map
 
 def clean_filename(filename):
     """Làm sạch tên file, thay thế các ký tự không hợp lệ và loại bỏ dấu tiếng Việt."""
@@ -87,16 +109,18 @@ def parse_specifications(spec_str):
         logging.warning(f"Lỗi khi parse specifications: {spec_str}")
         return []
 
-def download_image(url, product_id, image_index):
-    """Tải ảnh từ URL và lưu với định dạng {cleaned_product_id}_{image_index}_{cleaned_image_name}."""
+def download_image(url, product_id, image_index, manifest=None, store=None):
+    """Tải ảnh từ URL và lưu với định dạng {cleaned_product_id}_{image_index}_{cleaned_image_name}.
+
+    Nếu có store (ImageStore), nội dung ảnh được lưu một lần trong kho theo sha256 và file ảnh
+    là link tới blob. Ảnh đã có trong manifest được kiểm tra bằng request có điều kiện
+    (ETag/Last-Modified) và dùng lại khi server trả 304, hoặc dùng lại luôn nếu server không có validator.
+    """
     try:
         if not url or not url.startswith(('http://', 'https://')):
             logging.warning(f"URL không hợp lệ: {url}")
             return None
         
-        response = requests.get(url, stream=True, timeout=10)
-        response.raise_for_status()
-        
         parsed_url = urlparse(url)
         original_name = os.path.basename(parsed_url.path).split("?")[0]
         
@@ -110,100 +134,338 @@ def download_image(url, product_id, image_index):
         new_image_name = f"{cleaned_product_id}_{image_index}_{cleaned_name}{file_extension}"
         image_path = os.path.join(BACKEND_UPLOAD_DIR, new_image_name)
         
-        with open(image_path, "wb") as f:
-            for chunk in response.iter_content(chunk_size=8192):
-                f.write(chunk)
+        if store is None:
+            response = get_session(parsed_url.netloc).get(url, stream=True, timeout=10)
+            response.raise_for_status()
+            with open(image_path, "wb") as f:
+                for chunk in response.iter_content(chunk_size=8192):
+                    f.write(chunk)
+            logging.info(f"Đã tải và lưu ảnh: {image_path}")
+            return f"/uploads/product/{new_image_name}"
         
+        cached = manifest.get_image(url) if manifest else None
+        headers = {}
+        if store.has(cached):
+            if cached.get("etag"):
+                headers["If-None-Match"] = cached["etag"]
+            if cached.get("last_modified"):
+                headers["If-Modified-Since"] = cached["last_modified"]
+            if not headers:
+                store.link(cached["blob"], image_path)
+                logging.info(f"Dùng lại ảnh đã có trong kho: {image_path}")
+                return f"/uploads/product/{new_image_name}"
+        
+        response = get_session(parsed_url.netloc).get(url, stream=True, timeout=10, headers=headers)
+        if headers and response.status_code == 304:
+            store.link(cached["blob"], image_path)
+            logging.info(f"Ảnh không thay đổi, dùng lại từ kho: {image_path}")
+            return f"/uploads/product/{new_image_name}"
+        response.raise_for_status()
+        
+        sha256, blob_path = store.write(response.iter_content(chunk_size=8192), file_extension)
+        store.link(blob_path, image_path)
+        if manifest:
+            manifest.set_image(url, {
+                "sha256": sha256,
+                "blob": blob_path,
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified")
+            })
         logging.info(f"Đã tải và lưu ảnh: {image_path}")
         return f"/uploads/product/{new_image_name}"
     except requests.RequestException as e:
         logging.warning(f"Lỗi khi tải ảnh {url}: {e}")
         return None
 
-def process_excel(input_file, output_file):
+def download_product_images(grouped_data, max_workers=MAX_DOWNLOAD_WORKERS, manifest=None, store=None, revalidate=False):
+    """Tải ảnh của tất cả sản phẩm song song, mỗi sản phẩm giữ tối đa MAX_IMAGES_PER_PRODUCT ảnh.
+
+    Ảnh được đặt tên theo vị trí URL trong file Excel (image_1, image_2, ...). Nếu có ảnh lỗi,
+    các URL còn lại của sản phẩm được tải ở lượt tiếp theo cho tới khi đủ ảnh hoặc hết URL.
+    Với manifest, sản phẩm đã hoàn tất ở lần chạy trước (cùng danh sách URL, file còn đủ) được bỏ qua,
+    trừ khi revalidate=True.
+    """
+    fingerprints = {}
+    pending = {}
+    for product_id, product in grouped_data.items():
+        if manifest is not None:
+            fingerprints[product_id] = manifest.fingerprint(product["image_urls"])
+            saved = None if revalidate else manifest.get_product(product_id, fingerprints[product_id])
+            if saved and all(os.path.exists(os.path.join(BACKEND_UPLOAD_DIR, os.path.basename(p))) for p in saved):
+                product["p_images"] = list(saved)
+                product["has_valid_image"] = True
+                continue
+        pending[product_id] = product
+    if len(pending) < len(grouped_data):
+        logging.info(f"Bỏ qua {len(grouped_data) - len(pending)} sản phẩm đã tải đủ ảnh ở lần chạy trước")
+    
+    next_url = {product_id: 0 for product_id in pending}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while True:
+            jobs = []
+            for product_id, product in pending.items():
+                needed = MAX_IMAGES_PER_PRODUCT - len(product["p_images"])
+                start = next_url[product_id]
+                for position in range(start, min(start + needed, len(product["image_urls"]))):
+                    jobs.append((product_id, position))
+                next_url[product_id] = start + max(needed, 0)
+            if not jobs:
+                break
+            futures = [
+                executor.submit(download_image, pending[product_id]["image_urls"][position],
+                                product_id, f"image_{position + 1}", manifest, store)
+                for product_id, position in jobs
+            ]
+            for (product_id, _), future in zip(jobs, futures):
+                image_path = future.result()
+                if image_path:
+                    pending[product_id]["p_images"].append(image_path)
+                    pending[product_id]["has_valid_image"] = True
+    
+    if manifest is not None:
+        # Chỉ checkpoint sản phẩm đã đủ ảnh; sản phẩm thiếu ảnh sẽ được thử lại ở lần chạy sau
+        for product_id, product in pending.items():
+            if len(product["p_images"]) == min(MAX_IMAGES_PER_PRODUCT, len(product["image_urls"])) and product["p_images"]:
+                manifest.set_product(product_id, fingerprints[product_id], product["p_images"])
+        manifest.flush()
+
+def to_python(value):
+    """Chuyển giá trị numpy/pandas về kiểu Python (NaN thành None) để ghi JSON/BSON."""
+    if hasattr(value, "item"):
+        value = value.item()
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value
+
+def is_missing(value):
+    return value is None or (isinstance(value, float) and math.isnan(value))
+
+def as_list(value, separator=None):
+    """Đọc lại trường dạng list từ mọi định dạng trung gian (list, mảng Parquet, chuỗi Excel)."""
+    if is_missing(value):
+        return []
+    if isinstance(value, str):
+        if not value.strip():
+            return []
+        if separator:
+            return value.split(separator)
+        # Excel lưu list dưới dạng chuỗi repr của Python
+        try:
+            parsed = json.loads(value)
+        except json.JSONDecodeError:
+            try:
+                parsed = ast.literal_eval(value)
+            except (ValueError, SyntaxError):
+                logging.warning(f"Không đọc được danh sách: {value}")
+                return []
+        return parsed if isinstance(parsed, list) else []
+    return [dict(item) if isinstance(item, dict) else item for item in value]
+
+def write_excel_report(output_data, output_file):
+    """Ghi báo cáo Excel (tùy chọn) để xem lại kết quả xử lý."""
+    output_df = pd.DataFrame([
+        dict(product,
+             p_images="|".join(product["p_images"]),
+             p_image_derivatives=json.dumps(product.get("p_image_derivatives", []), ensure_ascii=False),
+             p_specifications=json.dumps(product["p_specifications"], ensure_ascii=False))
+        for product in output_data
+    ])
+    with pd.ExcelWriter(output_file, engine="xlsxwriter") as writer:
+        output_df.to_excel(writer, index=False, sheet_name="Products")
+        worksheet = writer.sheets["Products"]
+        for col_num, col_name in enumerate(output_df.columns):
+            max_len = max(
+                output_df[col_name].astype(str).map(len).max(),
+                len(col_name)
+            )
+            worksheet.set_column(col_num, col_num, max_len)
+    logging.info(f"File Excel mới đã được tạo tại: {output_file}")
+
+def save_processed_products(output_data, audit_file):
+    """Lưu bản trung gian gọn để đối soát: .parquet (cần pyarrow) hoặc JSON Lines."""
+    if audit_file.endswith(".parquet"):
+        pd.DataFrame(output_data).to_parquet(audit_file, index=False)
+    else:
+        with open(audit_file, "w", encoding="utf-8") as f:
+            for product in output_data:
+                f.write(json.dumps(product, ensure_ascii=False) + "\n")
+    logging.info(f"Đã lưu {len(output_data)} sản phẩm đã xử lý vào: {audit_file}")
+
+def load_processed_products(source):
+    """Đọc sản phẩm đã xử lý từ list có sẵn hoặc file .jsonl / .parquet / .xlsx."""
+    if not isinstance(source, str):
+        return list(source)
+    if source.endswith(".jsonl"):
+        with open(source, "r", encoding="utf-8") as f:
+            return [json.loads(line) for line in f if line.strip()]
+    if source.endswith(".parquet"):
+        return pd.read_parquet(source).to_dict("records")
+    return pd.read_excel(source).to_dict("records")
+
+def read_excel_chunks(input_file, chunksize=EXCEL_CHUNK_SIZE):
+    """Đọc sheet đầu tiên theo từng khối chunksize dòng (openpyxl read-only) để không phải nạp cả file lớn vào bộ nhớ."""
+    from openpyxl import load_workbook
+    workbook = load_workbook(input_file, read_only=True, data_only=True)
     try:
-        df = pd.read_excel(input_file)
-        
-        required_columns = ["Product_id", "Product", "Quantity", "Price", "Parent_category", "Brand"]
-        missing_columns = [col for col in required_columns if col not in df.columns]
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = [str(col) if col is not None else f"Unnamed: {i}" for i, col in enumerate(header)]
+        width = len(columns)
+        chunk = []
+        for row in rows:
+            chunk.append(tuple(row[:width]) + (None,) * (width - len(row)))
+            if len(chunk) >= chunksize:
+                yield pd.DataFrame(chunk, columns=columns)
+                chunk = []
+        if chunk:
+            yield pd.DataFrame(chunk, columns=columns)
+    finally:
+        workbook.close()
+
+def group_products(chunks):
+    """Gom các dòng theo Product_id bằng thao tác theo cột.
+
+    Thông tin sản phẩm lấy từ dòng đầu tiên của mỗi Product_id, image_urls giữ đúng thứ tự xuất hiện.
+    chunks là các DataFrame liên tiếp của cùng một sheet (một sản phẩm có thể nằm vắt qua nhiều khối).
+    Trả về DataFrame đánh index theo Product_id với các cột p_* và image_urls.
+    """
+    required_columns = ["Product_id", "Product", "Quantity", "Price", "Parent_category", "Brand"]
+    firsts, urls = [], []
+    for chunk in chunks:
+        missing_columns = [col for col in required_columns if col not in chunk.columns]
         if missing_columns:
             raise ValueError(f"File Excel thiếu các cột: {', '.join(missing_columns)}")
+        chunk = chunk.assign(Product_id=chunk["Product_id"].astype(str))
+        for col in ("Description", "Category", "Specifications"):
+            if col not in chunk.columns:
+                chunk[col] = ""
+        firsts.append(chunk.drop_duplicates("Product_id")[["Product_id", *PRODUCT_COLUMNS]])
+        if "Image_url" in chunk.columns:
+            urls.append(chunk.loc[chunk["Image_url"].notna(), ["Product_id", "Image_url"]])
+    if not firsts:
+        raise ValueError("File Excel không có dữ liệu")
+    
+    products = (pd.concat(firsts, ignore_index=True)
+                .drop_duplicates("Product_id")
+                .set_index("Product_id")
+                .rename(columns=PRODUCT_COLUMNS))
+    image_urls = (pd.concat(urls).groupby("Product_id", sort=False)["Image_url"].agg(list)
+                  if urls else pd.Series(dtype=object))
+    products["image_urls"] = image_urls.reindex(products.index).map(lambda v: v if isinstance(v, list) else [])
+    products["p_specifications"] = products["p_specifications"].map(parse_specifications)
+    return products
+
+def resolve_references(products, brand_map, parent_category_map, sub_category_map):
+    """Ánh xạ tên thương hiệu/danh mục sang ObjectId theo cột, ghi cảnh báo và bỏ các sản phẩm không hợp lệ."""
+    products = products.assign(
+        brand_id=products["p_brand"].map(brand_map),
+        category_id=products["p_category"].map(parent_category_map),
+        subcategory_id=products["p_subcategory"].map(sub_category_map)
+    )
+    invalid_brand = products["brand_id"].isna()
+    invalid_category = ~invalid_brand & products["category_id"].isna()
+    for name, brand in products.loc[invalid_brand, ["p_name", "p_brand"]].itertuples(index=False):
+        logging.warning(f"Thương hiệu '{brand}' không tồn tại, bỏ qua sản phẩm {name}")
+    for name, category in products.loc[invalid_category, ["p_name", "p_category"]].itertuples(index=False):
+        logging.warning(f"Danh mục '{category}' không tồn tại, bỏ qua sản phẩm {name}")
+    return products[~(invalid_brand | invalid_category)]
+
+def process_excel(input_file, output_file=None, audit_file=None, manifest_file=MANIFEST_FILE, revalidate=False,
+                  reference_source="api", chunksize=None, derivatives=True, reference_ttl=REFERENCE_TTL,
+                  reference_options=None):
+    """Xử lý file Excel đầu vào và trả về danh sách sản phẩm (p_images, p_specifications giữ dạng list).
+
+    output_file: (tùy chọn) báo cáo Excel để xem lại; audit_file: (tùy chọn) bản lưu .jsonl/.parquet.
+    manifest_file: checkpoint để chạy lại chỉ tải ảnh còn thiếu/đã đổi (None để tắt kho ảnh và checkpoint).
+    reference_source: nguồn thương hiệu/danh mục cho load_reference_data ("api", "dump" hoặc "mongo").
+    reference_ttl: tuổi tối đa (giây) của cache dữ liệu tham chiếu, 0 để đọc lại từ nguồn.
+    reference_options: tham số cho hàm đọc của nguồn (api_base_url, mongo_uri, db_name, ...).
+    chunksize: đọc file .xlsx theo từng khối dòng cho sheet rất lớn (None để đọc cả sheet một lần).
+    derivatives: tạo ảnh dẫn xuất (thumbnail/WebP, ảnh 380x380 cho index) và ghi vào p_image_derivatives.
+    Kết quả trả về có thể truyền thẳng cho import_to_mongodb / bulk_import_to_mongodb.
+    """
+    try:
+        chunks = read_excel_chunks(input_file, chunksize) if chunksize else [pd.read_excel(input_file)]
+        products = group_products(chunks)
         
-        brand_map = fetch_brands()
-        parent_category_map, sub_category_map = fetch_categories()
+        brand_map, parent_category_map, sub_category_map = load_reference_data(
+            reference_source, ttl=reference_ttl, **(reference_options or {})
+        )
+        # Kiểm tra thương hiệu/danh mục trước để không tải ảnh của sản phẩm sẽ bị bỏ qua
+        products = resolve_references(products, brand_map, parent_category_map, sub_category_map)
         
-        grouped_data = {}
-        for _, row in df.iterrows():
-            product_id = str(row["Product_id"])
-            if product_id not in grouped_data:
-                grouped_data[product_id] = {
-                    "p_name": row["Product"],
-                    "p_images": [],
-                    "p_stock_quantity": row["Quantity"],
-                    "p_price": row["Price"],
-                    "p_description": row.get("Description", ""),
-                    "p_category": row["Parent_category"],
-                    "p_subcategory": row.get("Category", ""),
-                    "p_brand": row["Brand"],
-                    "p_specifications": parse_specifications(row.get("Specifications", "")),
-                    "has_valid_image": False
-                }
-            
-            if pd.notna(row.get("Image_url")) and len(grouped_data[product_id]["p_images"]) < 5:
-                image_path = download_image(row["Image_url"], product_id, f"image_{len(grouped_data[product_id]['p_images']) + 1}")
-                if image_path:
-                    grouped_data[product_id]["p_images"].append(image_path)
-                    grouped_data[product_id]["has_valid_image"] = True
+        grouped_data = products.to_dict("index")
+        for product in grouped_data.values():
+            product["p_images"] = []
+            product["has_valid_image"] = False
         
-        output_data = []
-        for product_id, product in grouped_data.items():
-            brand = brand_map.get(product["p_brand"], "")
-            category = parent_category_map.get(product["p_category"], "")
-            subcategory = sub_category_map.get(product["p_subcategory"], "") if product["p_subcategory"] else ""
-            
-            if not brand:
-                logging.warning(f"Thương hiệu '{product['p_brand']}' không tồn tại, bỏ qua sản phẩm {product['p_name']}")
-                continue
-            if not category:
-                logging.warning(f"Danh mục '{product['p_category']}' không tồn tại, bỏ qua sản phẩm {product['p_name']}")
-                continue
+        manifest = ImportManifest(manifest_file) if manifest_file else None
+        store = ImageStore(BACKEND_UPLOAD_DIR) if manifest_file else None
+        download_product_images(grouped_data, manifest=manifest, store=store, revalidate=revalidate)
+        
+        valid_products = []
+        for product in grouped_data.values():
             if not product["has_valid_image"]:
                 logging.warning(f"Sản phẩm {product['p_name']} không có ảnh hợp lệ, bỏ qua")
                 continue
-            
+            valid_products.append(product)
+        if derivatives:
+            generate_derivatives(valid_products, BACKEND_UPLOAD_DIR)
+        
+        output_data = []
+        for product in valid_products:
+            subcategory = product["subcategory_id"]
             output_data.append({
                 "p_name": product["p_name"],
-                "p_images": "|".join(product["p_images"]),
-                "p_stock_quantity": product["p_stock_quantity"],
-                "p_price": product["p_price"],
-                "p_description": product["p_description"],
-                "p_category": str(category),
-                "p_subcategory": str(subcategory) if subcategory else "",
-                "p_brand": str(brand),
+                "p_images": product["p_images"],
+                "p_image_derivatives": product.get("p_image_derivatives", []),
+                "p_stock_quantity": to_python(product["p_stock_quantity"]),
+                "p_price": to_python(product["p_price"]),
+                "p_description": to_python(product["p_description"]),
+                "p_category": str(product["category_id"]),
+                "p_subcategory": "" if is_missing(subcategory) else str(subcategory),
+                "p_brand": str(product["brand_id"]),
                 "p_specifications": product["p_specifications"]
             })
         
-        output_df = pd.DataFrame(output_data)
-        with pd.ExcelWriter(output_file, engine="xlsxwriter") as writer:
-            output_df.to_excel(writer, index=False, sheet_name="Products")
-            workbook = writer.book
-            worksheet = writer.sheets["Products"]
-            for col_num, col_name in enumerate(output_df.columns):
-                max_len = max(
-                    output_df[col_name].astype(str).map(len).max(),
-                    len(col_name)
-                )
-                worksheet.set_column(col_num, col_num, max_len)
-        
-        logging.info(f"File Excel mới đã được tạo tại: {output_file}")
+        if audit_file:
+            save_processed_products(output_data, audit_file)
+        if output_file:
+            write_excel_report(output_data, output_file)
         return output_data
     
     except Exception as e:
         logging.error(f"Lỗi khi xử lý file Excel: {e}")
         raise
 
-def import_to_mongodb(output_file, mongo_uri="mongodb://localhost:27017", db_name="ecommerce", collection_name="products"):
-    """Import dữ liệu từ file Excel vào MongoDB với các trường ID được chuyển thành ObjectId."""
+def build_product_document(row):
+    """Tạo document sản phẩm từ một sản phẩm đã xử lý; trả về None nếu category/brand không hợp lệ."""
+    product_data = {
+        "_id": ObjectId(), 
+        "p_name": row["p_name"],
+        "p_images": as_list(row["p_images"], separator="|"),
+        "p_image_derivatives": as_list(row.get("p_image_derivatives", [])),
+        "p_stock_quantity": to_python(row["p_stock_quantity"]),
+        "p_price": to_python(row["p_price"]),
+        "p_description": to_python(row["p_description"]),
+        "p_category": ObjectId(row["p_category"]) if is_valid_objectid(row["p_category"]) else None,
+        "p_subcategory": ObjectId(row["p_subcategory"]) if not is_missing(row["p_subcategory"]) and is_valid_objectid(row["p_subcategory"]) else None,
+        "p_brand": ObjectId(row["p_brand"]) if is_valid_objectid(row["p_brand"]) else None,
+        "p_specifications": as_list(row["p_specifications"])
+    }
+    
+    if product_data["p_category"] is None:
+        logging.warning(f"Sản phẩm {row['p_name']} có p_category không hợp lệ, bỏ qua")
+        return None
+    if product_data["p_brand"] is None:
+        logging.warning(f"Sản phẩm {row['p_name']} có p_brand không hợp lệ, bỏ qua")
+        return None
+    return product_data
+
+def import_to_mongodb(source, mongo_uri="mongodb://localhost:27017", db_name="ecommerce", collection_name="products"):
+    """Import sản phẩm (list từ process_excel hoặc file .jsonl/.parquet/.xlsx) vào MongoDB với các trường ID được chuyển thành ObjectId."""
     try:
         client = MongoClient(mongo_uri)
         db = client[db_name]
@@ -212,28 +474,12 @@ def import_to_mongodb(output_file, mongo_uri="mongodb://localhost:27017", db_nam
         if db_name not in client.list_database_names():
             logging.info(f"Database '{db_name}' chưa tồn tại, sẽ được tạo tự động khi chèn dữ liệu")
         
-        df = pd.read_excel(output_file)
+        products = load_processed_products(source)
         
-        for _, row in df.iterrows():
+        for row in products:
             try:
-                product_data = {
-                    "_id": ObjectId(), 
-                    "p_name": row["p_name"],
-                    "p_images": row["p_images"].split("|") if pd.notna(row["p_images"]) else [],
-                    "p_stock_quantity": row["p_stock_quantity"],
-                    "p_price": row["p_price"],
-                    "p_description": row["p_description"],
-                    "p_category": ObjectId(row["p_category"]) if is_valid_objectid(row["p_category"]) else None,
-                    "p_subcategory": ObjectId(row["p_subcategory"]) if pd.notna(row["p_subcategory"]) and is_valid_objectid(row["p_subcategory"]) else None,
-                    "p_brand": ObjectId(row["p_brand"]) if is_valid_objectid(row["p_brand"]) else None,
-                    "p_specifications": row["p_specifications"] if pd.notna(row["p_specifications"]) else []
-                }
-                
-                if product_data["p_category"] is None:
-                    logging.warning(f"Sản phẩm {row['p_name']} có p_category không hợp lệ, bỏ qua")
-                    continue
-                if product_data["p_brand"] is None:
-                    logging.warning(f"Sản phẩm {row['p_name']} có p_brand không hợp lệ, bỏ qua")
+                product_data = build_product_document(row)
+                if product_data is None:
                     continue
                 
                 existing_product = collection.find_one({
@@ -260,14 +506,94 @@ def import_to_mongodb(output_file, mongo_uri="mongodb://localhost:27017", db_nam
         logging.error(f"Lỗi khi import dữ liệu vào MongoDB: {e}")
         raise
 
+def ensure_product_index(collection):
+    """Đảm bảo có unique index trên (p_name, p_category, p_brand) để upsert không phải quét collection."""
+    try:
+        collection.create_index(
+            [(key, ASCENDING) for key in PRODUCT_UNIQUE_KEYS],
+            unique=True,
+            name="_".join(PRODUCT_UNIQUE_KEYS) + "_unique"
+        )
+        return True
+    except OperationFailure as e:
+        logging.warning(f"Không tạo được unique index {PRODUCT_UNIQUE_KEYS} (có thể đang có sản phẩm trùng): {e}")
+        return False
+
+def flush_bulk(collection, operations, counts):
+    """Gửi một batch UpdateOne(upsert) không theo thứ tự và cộng dồn kết quả vào counts."""
+    if not operations:
+        return
+    try:
+        result = collection.bulk_write(operations, ordered=False)
+        counts["inserted"] += result.upserted_count
+        counts["matched"] += result.matched_count
+    except BulkWriteError as e:
+        details = e.details
+        counts["inserted"] += details.get("nUpserted", 0)
+        counts["matched"] += details.get("nMatched", 0)
+        for error in details.get("writeErrors", []):
+            # Trùng khóa: hai dòng cùng sản phẩm upsert đồng thời, coi như đã tồn tại
+            if error.get("code") == 11000:
+                counts["matched"] += 1
+            else:
+                counts["errors"] += 1
+                logging.error(f"Lỗi khi import sản phẩm: {error.get('errmsg')}")
+
+def bulk_import_to_mongodb(source, mongo_uri="mongodb://localhost:27017", db_name="ecommerce",
+                           collection_name="products", batch_size=BULK_BATCH_SIZE):
+    """Import theo lô bằng bulk_write UpdateOne(upsert=True, ordered=False).
+
+    Sản phẩm đã tồn tại (cùng p_name, p_category, p_brand) được giữ nguyên nhờ $setOnInsert.
+    Trả về dict số lượng: inserted, matched (đã tồn tại), skipped (dòng không hợp lệ), errors.
+    """
+    counts = {"inserted": 0, "matched": 0, "skipped": 0, "errors": 0}
+    client = MongoClient(mongo_uri)
+    try:
+        collection = client[db_name][collection_name]
+        ensure_product_index(collection)
+        
+        products = load_processed_products(source)
+        operations = []
+        for row in products:
+            try:
+                product_data = build_product_document(row)
+            except Exception as e:
+                logging.error(f"Lỗi khi đọc sản phẩm {row['p_name']}: {e}")
+                product_data = None
+            if product_data is None:
+                counts["skipped"] += 1
+                continue
+            
+            operations.append(UpdateOne(
+                {key: product_data[key] for key in PRODUCT_UNIQUE_KEYS},
+                {"$setOnInsert": product_data},
+                upsert=True
+            ))
+            if len(operations) >= batch_size:
+                flush_bulk(collection, operations, counts)
+                operations = []
+        flush_bulk(collection, operations, counts)
+        
+        logging.info(
+            f"Hoàn tất import dữ liệu vào MongoDB: {counts['inserted']} thêm mới, "
+            f"{counts['matched']} đã tồn tại, {counts['skipped']} bỏ qua, {counts['errors']} lỗi"
+        )
+        return counts
+    except Exception as e:
+        logging.error(f"Lỗi khi import dữ liệu vào MongoDB: {e}")
+        raise
+    finally:
+        client.close()
+
 if __name__ == "__main__":
     input_file = "./list_products.xlsx"
-    output_file = "processed_products.xlsx"
+    audit_file = "processed_products.jsonl"
     
-    process_excel(input_file, output_file)
+    # Truyền trực tiếp kết quả xử lý sang bước import; thêm output_file="processed_products.xlsx" nếu cần báo cáo Excel
+    products = process_excel(input_file, audit_file=audit_file)
     
-    import_to_mongodb(
-        output_file,
+    bulk_import_to_mongodb(
+        products,
         mongo_uri="mongodb://localhost:27017",
         db_name="ecommerce",
         collection_name="products"
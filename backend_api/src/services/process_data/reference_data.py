@@ -0,0 +1,165 @@
+import inspect
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from bson import ObjectId
+from requests.adapters import HTTPAdapter
+
+# Dữ liệu tham chiếu cho importer: tên thương hiệu / danh mục cha / danh mục con -> ObjectId.
+# Nguồn: API backend, file dump ecommerce.*.json hoặc truy vấn thẳng MongoDB; kết quả được cache có TTL
+# theo nguồn và tham số của nguồn (api_base_url, mongo_uri, ...), nên đổi máy đích không dùng nhầm cache cũ.
+
+API_BASE_URL = "http://localhost:5000/api"
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..', '..'))
+BRANDS_FILE = os.path.join(PROJECT_ROOT, "ecommerce.brands.json")
+CATEGORIES_FILE = os.path.join(PROJECT_ROOT, "ecommerce.categories.json")
+CACHE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "reference_cache.json")
+DEFAULT_TTL = 3600
+MAX_WORKERS = 8
+
+_memory_cache = {}
+
+def _ref_id(value):
+    """Lấy chuỗi id từ ObjectId, {"$oid": ...}, document đã populate ({"_id": ...}) hoặc chuỗi."""
+    if value is None:
+        return None
+    if isinstance(value, dict):
+        return _ref_id(value.get("$oid") or value.get("_id"))
+    value = str(value)
+    return value if ObjectId.is_valid(value) else None
+
+def build_maps(brands, categories):
+    """Tạo (brand_map, parent_category_map, sub_category_map) dạng tên -> id chuỗi."""
+    brand_map = {}
+    for brand in brands:
+        brand_id = _ref_id(brand.get("_id"))
+        if brand_id:
+            brand_map[brand["br_name"]] = brand_id
+    parent_category_map, sub_category_map = {}, {}
+    for cat in categories:
+        cat_id = _ref_id(cat.get("_id"))
+        if not cat_id:
+            continue
+        if _ref_id(cat.get("parent_category_id")):
+            sub_category_map[cat["cate_name"]] = cat_id
+        else:
+            parent_category_map[cat["cate_name"]] = cat_id
+    return brand_map, parent_category_map, sub_category_map
+
+def _new_session(max_workers):
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+def _get_json(session, url):
+    response = session.get(url, timeout=10)
+    response.raise_for_status()
+    return response.json()
+
+def fetch_from_api(api_base_url=API_BASE_URL, max_workers=MAX_WORKERS):
+    """Lấy thương hiệu và toàn bộ danh mục song song qua một session dùng chung.
+
+    Dùng /category (trả về mọi danh mục trong một request); nếu không được thì lấy /category/parents
+    rồi tải song song tất cả các trang /category/by-parent/{id}.
+    """
+    with _new_session(max_workers) as session, ThreadPoolExecutor(max_workers=max_workers) as executor:
+        brands_future = executor.submit(_get_json, session, f"{api_base_url}/brand")
+        categories_future = executor.submit(_get_json, session, f"{api_base_url}/category")
+        try:
+            categories = categories_future.result().get("data", [])
+        except requests.RequestException as e:
+            logging.warning(f"Không lấy được /category, chuyển sang lấy theo danh mục cha: {e}")
+            parents = _get_json(session, f"{api_base_url}/category/parents").get("data", [])
+            pages = executor.map(
+                lambda cat: _get_json(session, f"{api_base_url}/category/by-parent/{cat['_id']}").get("data", []),
+                parents
+            )
+            categories = parents + [sub for page in pages for sub in page]
+        brands = brands_future.result().get("brands", [])
+    return brands, categories
+
+def load_from_dumps(brands_file=BRANDS_FILE, categories_file=CATEGORIES_FILE):
+    """Đọc thương hiệu và danh mục từ file dump ecommerce.brands.json / ecommerce.categories.json."""
+    with open(brands_file, "r", encoding="utf-8") as f:
+        brands = json.load(f)
+    with open(categories_file, "r", encoding="utf-8") as f:
+        categories = json.load(f)
+    return brands, categories
+
+def load_from_mongo(mongo_uri="mongodb://localhost:27017", db_name="ecommerce"):
+    """Truy vấn thẳng collection brands và categories trong MongoDB."""
+    from pymongo import MongoClient
+    client = MongoClient(mongo_uri)
+    try:
+        db = client[db_name]
+        brands = list(db["brands"].find({}, {"br_name": 1}))
+        categories = list(db["categories"].find({}, {"cate_name": 1, "parent_category_id": 1}))
+        return brands, categories
+    finally:
+        client.close()
+
+def _to_object_ids(maps):
+    return tuple({name: ObjectId(oid) for name, oid in m.items()} for m in maps)
+
+def _cache_key(source, loader, kwargs):
+    """Khóa cache gồm nguồn và đầy đủ tham số của hàm đọc (kể cả giá trị mặc định), ví dụ
+    'api {"api_base_url": "http://localhost:5000/api", "max_workers": 8}'."""
+    arguments = inspect.signature(loader).bind(**kwargs)
+    arguments.apply_defaults()
+    return f"{source} {json.dumps(arguments.arguments, sort_keys=True, default=str)}"
+
+def load_reference_data(source="api", cache_file=CACHE_FILE, ttl=DEFAULT_TTL, **kwargs):
+    """Trả về (brand_map, parent_category_map, sub_category_map) dạng tên -> ObjectId.
+
+    source: "api", "dump" hoặc "mongo"; kwargs được truyền cho hàm đọc tương ứng.
+    Kết quả được cache trong bộ nhớ và trong cache_file (None để tắt) trong ttl giây, theo nguồn và kwargs;
+    ttl=0 để luôn đọc lại (ví dụ vừa thêm thương hiệu / danh mục mới).
+    """
+    loaders = {"api": fetch_from_api, "dump": load_from_dumps, "mongo": load_from_mongo}
+    if source not in loaders:
+        raise ValueError(f"Nguồn dữ liệu tham chiếu không hợp lệ: {source}")
+    key = _cache_key(source, loaders[source], kwargs)
+    now = time.time()
+
+    cached = _memory_cache.get(key)
+    if cached is None and cache_file and os.path.exists(cache_file):
+        try:
+            with open(cache_file, "r", encoding="utf-8") as f:
+                cached = json.load(f).get(key)
+        except (OSError, json.JSONDecodeError) as e:
+            logging.warning(f"Không đọc được cache {cache_file}: {e}")
+    if cached and now - cached["fetched_at"] < ttl:
+        _memory_cache[key] = cached
+        return _to_object_ids(cached["maps"])
+
+    try:
+        brands, categories = loaders[source](**kwargs)
+    except Exception as e:
+        logging.error(f"Lỗi khi lấy dữ liệu thương hiệu/danh mục ({source}): {e}")
+        return {}, {}, {}
+
+    maps = build_maps(brands, categories)
+    entry = {"fetched_at": now, "maps": maps}
+    _memory_cache[key] = entry
+    if cache_file:
+        try:
+            content = {}
+            if os.path.exists(cache_file):
+                with open(cache_file, "r", encoding="utf-8") as f:
+                    content = json.load(f)
+            content[key] = entry
+            tmp_path = f"{cache_file}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(content, f, ensure_ascii=False)
+            os.replace(tmp_path, cache_file)
+        except (OSError, json.JSONDecodeError) as e:
+            logging.warning(f"Không ghi được cache {cache_file}: {e}")
+    logging.info(f"Đã tải {len(maps[0])} thương hiệu, {len(maps[1])} danh mục cha, "
+                 f"{len(maps[2])} danh mục con từ {source}")
+    return _to_object_ids(maps)
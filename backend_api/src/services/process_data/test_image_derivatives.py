@@ -0,0 +1,57 @@
+import os
+import threading
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+from bson import ObjectId
+from PIL import Image
+
+import import_mongodb
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+def test_process_excel_records_derivatives(tmp_path, monkeypatch):
+    served_dir = tmp_path / "served"
+    served_dir.mkdir()
+    pixels = (np.random.default_rng(0).random((900, 1200, 3)) * 255).astype(np.uint8)
+    Image.fromarray(pixels).save(served_dir / "tivi.jpg", quality=90)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), partial(QuietHandler, directory=str(served_dir)))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    upload_dir = tmp_path / "downloaded_images"
+    upload_dir.mkdir()
+    monkeypatch.setattr(import_mongodb, "BACKEND_UPLOAD_DIR", str(upload_dir))
+    brand_id, category_id = ObjectId(), ObjectId()
+    monkeypatch.setattr(import_mongodb, "load_reference_data",
+                        lambda source, **kwargs: ({"Sony": brand_id}, {"Điện tử": category_id}, {}))
+
+    input_file = tmp_path / "list_products.xlsx"
+    pd.DataFrame([{
+        "Product_id": 1, "Product": "Tivi Sony", "Quantity": 3, "Price": 1000, "Description": "",
+        "Parent_category": "Điện tử", "Category": "", "Brand": "Sony", "Specifications": "[]",
+        "Image_url": f"http://127.0.0.1:{server.server_address[1]}/tivi.jpg"
+    }]).to_excel(input_file, index=False)
+
+    try:
+        products = import_mongodb.process_excel(str(input_file), manifest_file=str(tmp_path / "manifest.json"))
+    finally:
+        server.shutdown()
+
+    assert len(products) == 1
+    product = products[0]
+    assert len(product["p_image_derivatives"]) == len(product["p_images"]) == 1
+    derivatives = product["p_image_derivatives"][0]
+    assert set(derivatives) == {"thumb", "medium", "index"}
+    for url in derivatives.values():
+        assert url.startswith("/uploads/product/derivatives/")
+        assert os.path.exists(os.path.join(upload_dir, *url[len("/uploads/product/"):].split("/")))
+
+    index_file = os.path.join(upload_dir, *derivatives["index"][len("/uploads/product/"):].split("/"))
+    with Image.open(index_file) as img:
+        assert img.size == (380, 380)
+    document = import_mongodb.build_product_document(product)
+    assert document["p_image_derivatives"] == product["p_image_derivatives"]
@@ -11,6 +11,21 @@ async function createProduct(data) {
   return product;
 }
 
+// Tên file bỏ đuôi: ảnh dẫn xuất được lưu tại derivatives/<tên>/<tên file ảnh gốc>.<định dạng>
+function fileStem(imgPath) {
+  return path.parse(imgPath || "").name.toLowerCase();
+}
+
+// Ghép lại p_image_derivatives theo tên file của p_images mới (ảnh bị xóa/đổi thứ tự/ảnh mới tải lên)
+function alignImageDerivatives(images, derivatives) {
+  return images.map((img) => {
+    const match = (derivatives || []).find(
+      (item) => item && fileStem(item.index || item.medium || item.thumb) === fileStem(img)
+    );
+    return match ? { thumb: match.thumb, medium: match.medium, index: match.index } : {};
+  });
+}
+
 async function updateProduct(id, data) {
   const product = await Product.findById(id);
   if (!product) {
@@ -18,11 +33,21 @@ async function updateProduct(id, data) {
   }
 
   const oldImages = product.p_images || [];
+  const oldDerivatives = (product.p_image_derivatives || []).map((item) =>
+    item.toObject ? item.toObject() : item
+  );
   Object.assign(product, data);
+  const newImages = data.p_images || [];
+  if (data.p_images) {
+    product.p_image_derivatives = alignImageDerivatives(newImages, oldDerivatives);
+  }
   await product.save();
 
-  const newImages = data.p_images || [];
-  const imagesToDelete = oldImages.filter((img) => !newImages.includes(img));
+  const removedImages = oldImages.filter((img) => !newImages.includes(img));
+  const imagesToDelete = [...removedImages];
+  for (const item of alignImageDerivatives(removedImages, oldDerivatives)) {
+    imagesToDelete.push(...Object.values(item).filter(Boolean));
+  }
 
   for (const imgPath of imagesToDelete) {
     try {